@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from models.schemas import ChatRequest, ChatResponse, ResetRequest, StatusResponse
-from services.ai_analyzer import chat, reset_session, sessions_count
+from services.ai_analyzer import chat, reset_session, session_stats
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
@@ -13,7 +13,9 @@ def chat_endpoint(req: ChatRequest):
             context_override=req.context_override,
             use_kb=req.use_kb,          
             collection=req.collection,
-            k=req.k
+            k=req.k,
+            retrieval_mode=req.retrieval_mode,
+            stateless=req.stateless
         )
         return ChatResponse(
             session_id=req.session_id,
@@ -36,7 +38,7 @@ def reset(req: ResetRequest):
     "/status",
     response_model=StatusResponse,
     summary="Ver sesiones activas en memoria",
-    description="Devuelve el número de sesiones actualmente almacenadas en el servidor.",
+    description="Sesiones retenidas, bytes que ocupan y desalojos (LRU) / expiraciones (TTL) del almacén de sesiones.",
 )
 def status():
-    return StatusResponse(sessions=sessions_count())
\ No newline at end of file
+    return StatusResponse(**session_stats())
\ No newline at end of file
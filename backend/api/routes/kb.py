@@ -1,7 +1,17 @@
-from typing import List, Optional
+from typing import Iterator, List, Literal, Optional
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.responses import StreamingResponse
+from langchain_core.documents import Document
 from pydantic import BaseModel, Field
-from services.knowledge_base import ingest_texts, ingest_text_files, ingest_pdf_bytes, query
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from services.knowledge_base import (
+    ingest_texts, ingest_text_files, ingest_pdf_bytes, ingest_documents, query, embedding_cache_stats,
+    query_cache_stats, migrate_to_shared, content_source,
+)
 
 router = APIRouter(prefix="/kb", tags=["knowledge-base"])
 
@@ -9,11 +19,21 @@ class IngestTextsBody(BaseModel):
     collection: str = Field("cursos", description="Nombre de la colección en Chroma", examples=["cursos"])
     texts: List[str] = Field(..., description="Lista de documentos en texto plano")
     sources: Optional[List[str]] = Field(None, description="Nombres/paths de referencia")
+    company: Optional[str] = Field(None, description="Empresa dueña de los textos (colección compartida)")
 
 class QueryBody(BaseModel):
     collection: str = Field("cursos", description="Colección a consultar", examples=["cursos"])
     q: str = Field(..., description="Consulta en lenguaje natural", examples=["¿Tienen el curso de IA en AWS?"])
     k: int = Field(3, ge=1, le=10, description="Top-k resultados", examples=[2])
+    mode: Optional[Literal["vector", "lexical", "hybrid"]] = Field(
+        None, description="vector (embeddings), lexical (BM25 local, sin red) o hybrid (RRF de ambos)"
+    )
+    company: Optional[str] = Field(None, description="Filtra por empresa (colección compartida)", examples=["alfanet-s-a"])
+
+class MigrateTenantsBody(BaseModel):
+    base: str = Field("empresas", description="Nombre base de las colecciones por empresa (`<base>.<empresa>`)")
+    target: Optional[str] = Field(None, description="Colección compartida de destino (por defecto `<base>`)")
+    drop_source: bool = Field(False, description="Borrar cada colección por empresa una vez copiada")
 
 @router.post(
     "/ingest-texts",
@@ -22,7 +42,7 @@ class QueryBody(BaseModel):
 )
 def kb_ingest_texts(body: IngestTextsBody):
     try:
-        return ingest_texts(body.collection, body.texts, body.sources)
+        return ingest_texts(body.collection, body.texts, body.sources, tenant=body.company)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -44,6 +64,69 @@ async def kb_ingest_files(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _jsonl_documents(fh) -> Iterator[Document]:
+    """
+    Lee el .jsonl línea a línea (sin cargarlo entero): {"text": ..., "source": ..., "meta": {...}}.
+    Las filas sin `source` toman un origen derivado de su texto (`content_source`): un número de línea
+    se repetiría entre archivos y la re-ingesta de uno borraría los chunks del otro.
+    """
+    for line in fh:
+        line = line.strip()
+        if not line:
+            continue
+        row = json.loads(line)
+        if not row.get("text"):
+            continue
+        metadata = dict(row.get("meta") or {})
+        metadata["source"] = row.get("source") or content_source(row["text"])
+        yield Document(page_content=row["text"], metadata=metadata)
+
+@router.post(
+    "/ingest-jsonl",
+    summary="Ingesta masiva desde .jsonl con progreso",
+    description=(
+        "Sube un corpus grande como .jsonl (una línea `{\"text\", \"source\", \"meta\"}` por documento). "
+        "Re-ingestar un `source` reemplaza sus chunks; las filas sin `source` se identifican por su contenido. "
+        "Se trocea y embebe por lotes mientras se lee; la respuesta es NDJSON con eventos `progress` "
+        "(`docs`, `chunks`, `batches`) y un evento final `done` (o `error`)."
+    ),
+)
+async def kb_ingest_jsonl(
+    collection: str = Form("cursos"),
+    file: UploadFile = File(...),
+):
+    # copia a disco por bloques: el upload se cierra al terminar el endpoint y la ingesta sigue en streaming
+    tmp = tempfile.NamedTemporaryFile(suffix=".jsonl", delete=False)
+    with tmp:
+        await asyncio.to_thread(shutil.copyfileobj, file.file, tmp, 1024 * 1024)
+
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def _run():
+        try:
+            with open(tmp.name, encoding="utf-8", errors="replace") as fh:
+                result = ingest_documents(
+                    collection, _jsonl_documents(fh),
+                    progress=lambda p: loop.call_soon_threadsafe(events.put_nowait, ("progress", p))
+                )
+            loop.call_soon_threadsafe(events.put_nowait, ("done", result))
+        except Exception as e:
+            loop.call_soon_threadsafe(events.put_nowait, ("error", {"detail": str(e)}))
+        finally:
+            os.unlink(tmp.name)
+
+    async def stream():
+        task = asyncio.ensure_future(asyncio.to_thread(_run))
+        while True:
+            event, data = await events.get()
+            yield json.dumps({"event": event, "data": data}, ensure_ascii=False) + "\n"
+            if event != "progress":
+                break
+        await task
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 @router.post(
     "/ingest-pdf",
     summary="Ingestar PDF (texto nativo + OCR visión) a la base vectorial",
@@ -73,6 +156,33 @@ async def kb_ingest_pdf(
 )
 def kb_query(body: QueryBody):
     try:
-        return query(body.collection, body.q, k=body.k)
+        return query(body.collection, body.q, k=body.k, mode=body.mode, tenant=body.company)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post(
+    "/migrate-tenants",
+    summary="Migrar colecciones por empresa a una colección compartida",
+    description="Copia `<base>.<empresa>` a `<base>` con metadata `company` (sin re-embeber). Idempotente.",
+)
+def kb_migrate_tenants(body: MigrateTenantsBody):
+    try:
+        return migrate_to_shared(body.base, target=body.target, drop_source=body.drop_source)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get(
+    "/embedding-cache",
+    summary="Estadísticas de la caché de embeddings",
+    description="Entradas, aciertos/fallos y tasa de aciertos de la caché persistente de embeddings.",
+)
+def kb_embedding_cache():
+    return embedding_cache_stats()
+
+@router.get(
+    "/query-cache",
+    summary="Estadísticas de la caché de consultas",
+    description="Aciertos de la caché de recuperación y generación actual de cada colección (se incrementa en cada ingesta).",
+)
+def kb_query_cache():
+    return query_cache_stats()
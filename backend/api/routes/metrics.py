@@ -0,0 +1,30 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from services.timing import render_prometheus, stage_percentiles
+from services.serpapi_client import get_client
+
+router = APIRouter(tags=["metrics"])
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    summary="Histogramas de latencia por etapa (formato Prometheus)",
+)
+def metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@router.get(
+    "/metrics/stages",
+    summary="p50/p95 por etapa",
+    description="Percentiles estimados a partir de los histogramas del proceso (en milisegundos).",
+)
+def metrics_stages():
+    return stage_percentiles()
+
+@router.get(
+    "/metrics/upstreams",
+    summary="Estado de los clientes de upstream",
+    description="Contadores del cliente de SerpAPI (rate limit, circuit breaker, coalescing).",
+)
+def metrics_upstreams():
+    return {"serpapi": get_client().snapshot()}
@@ -0,0 +1,64 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+from services.signal_cache import get_cache
+from services.signal_scheduler import get_scheduler, refresh_company
+
+router = APIRouter(prefix="/monitoring", tags=["monitoring"])
+
+class MonitoredCompany(BaseModel):
+    company_id: str = Field(..., description="Identificador de la empresa en la cartera", examples=["alfanet-sa"])
+    business_name: Optional[str] = Field(None, description="Nombre comercial (búsqueda en Google Maps)")
+    city: Optional[str] = None
+    country: Optional[str] = Field(None, examples=["Ecuador"])
+    instagram: Optional[str] = Field(None, description="Usuario o URL de Instagram")
+    facebook: Optional[str] = Field(None, description="Usuario o URL de Facebook")
+    tiktok: Optional[str] = Field(None, description="Usuario o URL de TikTok")
+    google_maps_url: Optional[str] = None
+
+@router.post(
+    "/companies",
+    summary="Agregar (o actualizar) una empresa a la cartera monitoreada",
+    description="Sus señales digitales se refrescan en segundo plano; las evaluaciones las leen de la caché.",
+)
+def add_company(body: MonitoredCompany):
+    params = body.model_dump(exclude={"company_id"})
+    get_cache().add_monitored(body.company_id, params)
+    return {"company_id": body.company_id, "params": params}
+
+@router.get(
+    "/companies",
+    summary="Cartera monitoreada con su último refresco",
+)
+def list_companies():
+    return {"companies": get_cache().list_monitored()}
+
+@router.get("/companies/{company_id}", summary="Señales precalculadas de una empresa")
+def get_company(company_id: str):
+    entry = get_cache().get_monitored(company_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Empresa no monitoreada")
+    return entry
+
+@router.delete("/companies/{company_id}", summary="Quitar una empresa de la cartera monitoreada")
+def remove_company(company_id: str):
+    if not get_cache().remove_monitored(company_id):
+        raise HTTPException(status_code=404, detail="Empresa no monitoreada")
+    return {"company_id": company_id, "removed": True}
+
+@router.post(
+    "/companies/{company_id}/refresh",
+    summary="Refrescar ya las señales de una empresa",
+    description="Scrapea sin caché (bloqueante) y guarda el resultado.",
+)
+def refresh(company_id: str):
+    try:
+        return refresh_company(company_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Empresa no monitoreada")
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+@router.get("/scheduler", summary="Estado del scheduler de refresco de señales")
+def scheduler_status():
+    return get_scheduler().snapshot()
@@ -1,15 +1,10 @@
 from typing import List, Optional
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-import re
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import StreamingResponse
 import json 
 
-from services.document_processor import pdf_to_rich_text
-from services.financial_extractor import extract_financial_metrics_from_text
 from services.scoring_service import FinanceMetrics, Reference, ScorePayload, compute_score
-from services.knowledge_base import ingest_pdf_bytes
-from services.ai_analyzer import chat as chat_with_kb
-from services.scraping_service import collect_public_signals_existing
-from services.risk_llm import llm_assessment_with_ai_analyzer
+from services.risk_pipeline import evaluate_stages
 
 router = APIRouter(prefix="/risk", tags=["risk"])
 
@@ -99,22 +94,12 @@ def _resumen_corto(empresa, finanzas, scoring, signals):
     return " ".join(p1.split()), " ".join(p2.split())
 
 
-def _slug(s: str) -> str:
-    s = s.lower()
-    s = re.sub(r"[^a-z0-9]+", "-", s)
-    return re.sub(r"-+", "-", s).strip("-")
-
-def _safe_collection_name(base: str, slug: str) -> str:
-    name = f"{base}.{slug}"
-    # Solo [a-z0-9._-]
-    name = re.sub(r"[^a-z0-9._-]", "-", name.lower())
-    # Quita separadores al inicio/fin para cumplir “start/end alnum”
-    name = re.sub(r"^[^a-z0-9]+", "", name)
-    name = re.sub(r"[^a-z0-9]+$", "", name)
-    # Asegura longitud mínima
-    if len(name) < 3:
-        name = (name + "-xxx")[:3]
-    return name
+async def _read_uploads(files: Optional[List[UploadFile]], limit: Optional[int] = None) -> List[tuple]:
+    # Se leen antes de responder: en streaming los UploadFile pueden cerrarse al retornar el endpoint
+    out = []
+    for f in (files or [])[:limit]:
+        out.append((f.filename, await f.read()))
+    return out
 
 
 @router.post("/evaluate", summary="Evaluación de riesgo (extracción + scraping + KB opcional)")
@@ -155,214 +140,24 @@ async def evaluate_risk_endpoint(
         "financieros_files": [f.filename for f in financieros_files] if financieros_files else []
     }, indent=2, ensure_ascii=False))
     try:
-        # Optimización: Procesamiento paralelo de señales digitales y archivos financieros
-        # 1) Recolectar señales digitales (reputación)
-        signals = collect_public_signals_existing(
-            business_name=nombre_comercial or razon_social,
-            city=ciudad,
-            instagram=instagram_url,
-            facebook=facebook_url,
-            tiktok=tiktok_url,
-            google_maps_url=None,
-            country=pais
-        )
-        digital_rating = signals.get("digital_rating")
-
-        # 2) Procesar archivos financieros (optimizado)
-        extraction_debug = {"confidence": 0.0, "per_file": [], "notes": []}
-        fin_metrics = None
-        combined_text = ""
-        all_metrics = []
-
-        if financieros_files:
-            # Procesar todos los archivos financieros
-            combined_parts = []
-            processed_files = []
-            
-            # Primero procesamos todos los archivos y extraemos el texto
-            for f in financieros_files:
-                try:
-                    file_bytes = await f.read()
-                    parsed = pdf_to_rich_text(file_bytes)
-                    text_i = parsed.get("combined_text", "")
-                    combined_parts.append(text_i)
-                    processed_files.append({"filename": f.filename, "chars": len(text_i)})
-
-                    # Metadatos por archivo
-                    extraction_debug["per_file"].append({
-                        "filename": f.filename,
-                        "native_chars": parsed.get("native_chars"),
-                        "ocr_chars": parsed.get("ocr_chars")
-                    })
-
-                    # Ingesta opcional a KB (solo si es necesario)
-                    if kb_ingest:
-                        company_collection = f"{collection}.{_slug(razon_social)}"
-                        ingest_pdf_bytes(company_collection, file_bytes, source_name=f.filename)
-                    
-                    # Extraer métricas de cada archivo individualmente
-                    print(f"\n[LOG] Procesando archivo: {f.filename}")
-                    file_metrics, file_debug = extract_financial_metrics_from_text(text_i)
-                    all_metrics.append((file_metrics, file_debug))
-
-                except Exception as fe:
-                    print(f"[LOG] Error al procesar archivo {f.filename}: {str(fe)}")
-                    extraction_debug.setdefault("per_file", []).append({
-                        "filename": f.filename,
-                        "error": str(fe)
-                    })
-
-            # Combinar todo el texto para un análisis completo
-            combined_text = "\n\n".join(combined_parts)
-            print("\n[LOG] Procesando texto combinado de todos los archivos")
-            
-            # Extracción de métricas financieras del texto combinado
-            fin_metrics, extraction_debug_all = extract_financial_metrics_from_text(combined_text)
-            
-            # Si no se encontraron métricas en el texto combinado, usar las mejores métricas individuales
-            if fin_metrics.ventas_anuales == 0 and fin_metrics.razon_corriente == 1.2 and len(all_metrics) > 0:
-                print("\n[LOG] Usando las mejores métricas individuales de los archivos")
-                # Seleccionar las mejores métricas basadas en confianza
-                best_metrics = None
-                best_confidence = -1
-                
-                for metrics, debug in all_metrics:
-                    confidence = debug.get("confidence", 0)
-                    if confidence > best_confidence:
-                        best_confidence = confidence
-                        best_metrics = metrics
-                        best_debug = debug
-                
-                if best_metrics is not None:
-                    fin_metrics = best_metrics
-                    extraction_debug_all = best_debug
-
-            # Merge de información de debug
-            extraction_debug["confidence"] = extraction_debug_all.get("confidence", 0.0)
-            extraction_debug["log"] = extraction_debug_all.get("log", {})
-            extraction_debug["raw_values"] = extraction_debug_all.get("raw_values", {})
-            extraction_debug["notes"].append(extraction_debug_all.get("notes"))
-            extraction_debug["processed_files"] = processed_files
-
-        # Valores por defecto si no hay métricas extraídas
-        if not fin_metrics:
-            fin_metrics = FinanceMetrics(
-                ventas_anuales=0.0,
-                margen_bruto=0.22,
-                razon_corriente=1.2,
-                deuda_total_activos=0.6,
-                flujo_caja_operativo=0.0
-            )
-
-        # 3) Referencias (simplificado)
-        refs: List[Reference] = []
-        if referencias_files:
-            for f in referencias_files[:3]:
-                _ = await f.read()
-                refs.append(Reference(
-                    nombre=f.filename, tipo="proveedor",
-                    antiguedad_meses=18, pago_prom_dias=7, monto_prom_mensual=1200.0
-                ))
-
-        # 4) Cálculo de score
-        payload = ScorePayload(
-            sector="Comercio",
-            antiguedad_meses=36,
-            digital_rating=digital_rating,
-            referencias=refs or None,
-            finanzas=fin_metrics
-        )
-        scoring = compute_score(payload)
-
-        session_id = f"risk:{_slug(razon_social)}"
-        company_collection = _safe_collection_name(collection, _slug(razon_social)) if use_kb else None
-
-        # 5) Explicación con KB (opcional - solo si es necesario)
-        kb = {"used": False}
-        if use_kb and kb_ingest:  # Solo si se ingestan documentos y se solicita explicación
-            company_collection = _safe_collection_name(collection, _slug(razon_social))
-            q = (
-                f"Con el contexto disponible y estas métricas extraídas: "
-                f"ventas={fin_metrics.ventas_anuales}, margen={fin_metrics.margen_bruto}, "
-                f"razon_corriente={fin_metrics.razon_corriente}, deuda_activos={fin_metrics.deuda_total_activos}, "
-                f"flujo_operativo={fin_metrics.flujo_caja_operativo}. "
-                "Justifica el riesgo en bullets, cita discrepancias entre métricas y contexto."
-            )
-            session_id = f"risk:{_slug(razon_social)}"
-            res = chat_with_kb(
-                session_id=session_id,
-                message=q,
-                use_kb=True,
-                collection=company_collection,
-                k=k
-            )
-            kb = {
-                "used": True,
-                "collection": company_collection,
-                "explanation": res["answer"],
-                "sources": res["sources"]
-            }
-        
-        # 6) Preparación de la respuesta
-        factores_top5 = _top5_factores(scoring.get("factores", []))
-        monto_max = scoring.get("monto_sugerido", {}).get("max", 0)
-        llm_out = llm_assessment_with_ai_analyzer(
-            empresa={"razon_social": razon_social, "nombre_comercial": nombre_comercial},
-            finanzas=fin_metrics,
-            signals=signals,
-            scoring=scoring,                 # <--- pásale el score
-            session_id=f"risk:{_slug(razon_social)}",
-            collection=_safe_collection_name(collection, _slug(razon_social)) if use_kb else None,
+        financieros = await _read_uploads(financieros_files)
+        referencias = await _read_uploads(referencias_files, limit=3)
+        decision = None
+        async for event, data in evaluate_stages(
+            {"razon_social": razon_social, "nombre_comercial": nombre_comercial,
+             "pais": pais, "ciudad": ciudad, "direccion": direccion},
+            instagram_url=instagram_url,
+            facebook_url=facebook_url,
+            tiktok_url=tiktok_url,
+            financieros=financieros,
+            referencias=[name for name, _ in referencias],
+            kb_ingest=kb_ingest,
             use_kb=use_kb,
+            collection=collection,
             k=k
-        )
-
-        valores_maximos_ref = {
-            "ventas_anuales": 50_000_000.0,        # máximo esperado anual en USD
-            "margen_bruto": 1.0,                   # 100%
-            "razon_corriente": 5.0,                # ratio máximo razonable
-            "deuda_total_activos": 1.0,            # 100%
-            "flujo_caja_operativo": 10_000_000.0   # máximo esperado anual en USD
-        }
-
-        # --- Extraer métricas con valor y máximo
-        estadisticas = {
-            k: {
-                "value": getattr(fin_metrics, k, None),
-                "max": valores_maximos_ref.get(k)
-            }
-            for k in valores_maximos_ref.keys()
-        }
-
-        top5 = llm_out.get("top_5", [])
-
-        # Normalización a lista plana de strings
-        if isinstance(top5, str):
-            # separa por saltos de línea o comas, limpia bullets
-            top5 = [s.strip(" -•\t") for s in re.split(r"[\n,]+", top5) if s.strip()]
-        elif isinstance(top5, dict):
-            top5 = list(top5.values())
-        elif top5 and isinstance(top5[0], list):
-            # si ya viene [[...]], toma la primera
-            top5 = top5[0]
-        
-        top5 = top5[:5]
-
-        decision = {
-            "empresa": {"razon_social": razon_social, "nombre_comercial": nombre_comercial},
-            "credito_sugerido": {
-                "monto": scoring.get("monto_sugerido", {}).get("max", 0),
-                "moneda": "USD"
-            },
-            "estadisticas": estadisticas,
-            "nivel_riesgo": scoring.get("riesgo"),
-            "factores_clave_riesgo": {
-                "top_5": [top5]   
-            },
-            "resumen": llm_out.get("resumen", {
-                "parrafo_1": "", "parrafo_2": ""
-            })
-        }
+        ):
+            if event == "decision":
+                decision = data["decision"]
 
         return {
             "decision": decision
@@ -370,6 +165,67 @@ async def evaluate_risk_endpoint(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.post(
+    "/evaluate/stream",
+    summary="Evaluación de riesgo con progreso (NDJSON)",
+    description=(
+        "Mismos campos que `/risk/evaluate`. Devuelve `application/x-ndjson`: una línea JSON por etapa "
+        "(`signals`, `file_parsed`, `metrics`, `score`, `narrative`, `decision`). El score y las "
+        "`estadisticas` llegan antes que la narrativa del LLM. Si el cliente se desconecta, se cancelan "
+        "las etapas pendientes. Ante un fallo se emite un evento `error`."
+    ),
+)
+async def evaluate_risk_stream_endpoint(
+    request: Request,
+    razon_social: str = Form(...),
+    nombre_comercial: str = Form(...),
+    pais: str = Form(...),
+    ciudad: str = Form(...),
+    direccion: str = Form(...),
+
+    instagram_url: Optional[str] = Form(None),
+    facebook_url: Optional[str] = Form(None),
+    tiktok_url: Optional[str] = Form(None),
+
+    referencias_files: Optional[List[UploadFile]] = File(None, description="Hasta 3 PDFs"),
+    financieros_files: Optional[List[UploadFile]] = File(None, description="Hasta 3 PDFs o CSV"),
+
+    kb_ingest: bool = Form(False, description="Si true, ingesta los PDFs a la colección"),
+    use_kb: bool = Form(False, description="Si true, genera explicación usando KB"),
+    collection: str = Form("empresas", description="Nombre base de la colección"),
+    k: int = Form(3, description="Top‑k para retrieval")
+):
+    financieros = await _read_uploads(financieros_files)
+    referencias = await _read_uploads(referencias_files, limit=3)
+
+    async def events():
+        stages = evaluate_stages(
+            {"razon_social": razon_social, "nombre_comercial": nombre_comercial,
+             "pais": pais, "ciudad": ciudad, "direccion": direccion},
+            instagram_url=instagram_url,
+            facebook_url=facebook_url,
+            tiktok_url=tiktok_url,
+            financieros=financieros,
+            referencias=[name for name, _ in referencias],
+            kb_ingest=kb_ingest,
+            use_kb=use_kb,
+            collection=collection,
+            k=k
+        )
+        try:
+            async for event, data in stages:
+                yield json.dumps({"event": event, "data": data}, ensure_ascii=False, default=str) + "\n"
+                if await request.is_disconnected():
+                    print(f"[LOG] Cliente desconectado; se cancela la evaluación de {razon_social}")
+                    break
+        except Exception as e:
+            yield json.dumps({"event": "error", "data": {"detail": str(e)}}, ensure_ascii=False) + "\n"
+        finally:
+            await stages.aclose()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 @router.post("/simulate", summary="Simulación de score con 3 parámetros")
 async def simulate_score_endpoint(data: dict):
     ingresos = data.get("ingresos")
@@ -1,5 +1,9 @@
+import os
+import threading
+import time
 import uvicorn
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
 
@@ -7,6 +11,11 @@ from api.routes.chat import router as chat_router
 from api.routes.documents import router as documents_router
 from api.routes.kb import router as kb_router
 from api.routes.risk import router as risk_router
+from api.routes.metrics import router as metrics_router
+from api.routes.monitoring import router as monitoring_router
+from services import timing
+from services.scraping_service import get_tiktok_pool, close_tiktok_pools
+from services.signal_scheduler import get_scheduler, stop_scheduler
 
 app = FastAPI(title="AlfaTech API", version="1.0.0")
 
@@ -14,8 +23,24 @@ tags_metadata = [
     {"name": "chat", "description": "Asistente AlfaTech con memoria por sesión."},
     {"name": "documents", "description": "Carga y análisis de archivos (PDF, imágenes)."},
     {"name": "knowledge-base", "description": "Ingesta y consulta de la base vectorial (Chroma)."},
+    {"name": "metrics", "description": "Latencias por etapa (Server-Timing / Prometheus)."},
+    {"name": "monitoring", "description": "Cartera monitoreada y refresco de señales en segundo plano."},
 ]
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pre-calienta el pool de Chrome para TikTok en segundo plano (opcional)
+    if os.getenv("WEBDRIVER_WARM_ON_START", "false").lower() == "true":
+        threading.Thread(target=get_tiktok_pool(headless=True).warm, daemon=True).start()
+    # Refresco periódico de señales de la cartera monitoreada (opcional)
+    if os.getenv("SIGNAL_REFRESH_ON_START", "false").lower() == "true":
+        get_scheduler().start()
+    try:
+        yield
+    finally:
+        stop_scheduler()
+        close_tiktok_pools()
+
 app = FastAPI(
     title="AlfaTech API",
     version="1.0.0",
@@ -23,6 +48,7 @@ app = FastAPI(
     openapi_tags=tags_metadata,
     contact={"name": "Equipo AlfaTech", "email": "equipo@alfatech.local"},
     license_info={"name": "MIT"},
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -31,12 +57,54 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+@app.middleware("http")
+async def server_timing_middleware(request: Request, call_next):
+    # Colector por request: los servicios registran sus etapas y se devuelven en `Server-Timing`
+    collector, token = timing.begin_request()
+    t0 = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        timing.end_request(token)
+
+    def finish() -> float:
+        elapsed = time.perf_counter() - t0
+        route = getattr(request.scope.get("route"), "path", None)
+        if not route:
+            route = request.url.path if response.status_code != 404 else "unmatched"
+        timing.record(f"http:{route}", elapsed)
+        collector.add("total", elapsed)
+        return elapsed
+
+    if "content-length" in response.headers:
+        finish()
+        response.headers["Server-Timing"] = collector.server_timing()
+        return response
+
+    # Respuesta en streaming (sin Content-Length: NDJSON de /risk/evaluate/stream, /kb/ingest-jsonl):
+    # las cabeceras salen antes de que corra el trabajo, así que no llevan Server-Timing; la latencia
+    # se registra en /metrics cuando termina de enviarse el cuerpo.
+    body = response.body_iterator
+
+    async def timed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            finish()
+
+    response.body_iterator = timed_body()
+    return response
+
 app.include_router(chat_router)
 app.include_router(documents_router)
 app.include_router(kb_router)
 app.include_router(risk_router)
+app.include_router(metrics_router)
+app.include_router(monitoring_router)
 
 
 
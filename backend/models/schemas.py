@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 
 # Chat
 class ChatRequest(BaseModel):
@@ -10,6 +10,10 @@ class ChatRequest(BaseModel):
     use_kb: Optional[bool] = Field(None, description="None=auto, True=forzar KB, False=sin KB")
     collection: str = Field("cursos", description="Colección de Chroma")
     k: int = Field(3, ge=1, le=10, description="Top‑k para retrieval")
+    retrieval_mode: Optional[Literal["vector", "lexical", "hybrid"]] = Field(
+        None, description="vector, lexical (BM25, sin embeddings) o hybrid (RRF); None=por defecto del servidor"
+    )
+    stateless: bool = Field(False, description="True: turno aislado, sin leer ni guardar el historial de la sesión")
 class ChatResponse(BaseModel):
     session_id: str
     answer: str
@@ -21,3 +25,12 @@ class ResetRequest(BaseModel):
 
 class StatusResponse(BaseModel):
     sessions: int
+    bytes: int = Field(0, description="Tamaño serializado del estado de las sesiones retenidas")
+    evicted: int = Field(0, description="Sesiones desalojadas por LRU (límite SESSION_MAX); con SQLite, total de todos los workers")
+    expired: int = Field(0, description="Sesiones expiradas por inactividad (SESSION_TTL); con SQLite, total de todos los workers")
+    max_sessions: Optional[int] = None
+    ttl_s: Optional[float] = None
+    backend: Optional[str] = None
+    memory_tokens: Optional[int] = Field(None, description="Presupuesto de tokens de historial por turno")
+    summaries: int = Field(0, description="Resúmenes incrementales aplicados")
+    summary_errors: int = 0
@@ -1,12 +1,14 @@
-from typing import Dict, Optional, List, Tuple
+from typing import Any, Dict, Optional, List, Tuple
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
-from langchain.memory import ConversationBufferMemory
 
 from config.settings import settings
-from services.knowledge_base import _get_vs
+from services.knowledge_base import KB_RETRIEVAL_MODE, SNIPPET_KEYS, THRESHOLD_MODES, chunk_preview, search_with_scores
+from services.chat_memory import TokenBudgetMemory
+from services.session_store import get_store
+from services.timing import stage
 
 RSP_CONTEXT = """
     Eres un asistente virtual llamado "AlfaTech", especializado en apoyar el análisis de riesgo financiero
@@ -41,43 +43,27 @@ chat_prompt = ChatPromptTemplate.from_messages([
     ("human", "CONTEXTO (si hay):\n{context}\n\nPregunta:\n{input}")
 ])
 
-# Estado por sesión
-_session_llm: Dict[str, ChatOpenAI] = {}
-_session_memory: Dict[str, ConversationBufferMemory] = {}
-
-def _get_llm(session_id: str) -> ChatOpenAI:
-    if session_id not in _session_llm:
-        _session_llm[session_id] = ChatOpenAI(
-            model=settings.MODEL_NAME,
-            openai_api_key=settings.OPENAI_API_KEY,
-            temperature=settings.TEMPERATURE,
-        )
-    return _session_llm[session_id]
-
-def _get_memory(session_id: str) -> ConversationBufferMemory:
-    if session_id not in _session_memory:
-        _session_memory[session_id] = ConversationBufferMemory(
-            memory_key="history",
-            return_messages=True
-        )
-    return _session_memory[session_id]
-
-def _retrieve_with_scores(question: str, collection: str, k: int):
-    vs = _get_vs(collection)
-    try:
-        results = vs.similarity_search_with_relevance_scores(question, k=k)
-        docs_scores = [(doc, float(score)) for (doc, score) in results]
-    except Exception:
-        docs = vs.similarity_search(question, k=k)
-        docs_scores = [(d, 0.0) for d in docs]
+# Un solo cliente LLM (la configuración es la misma para todas las sesiones); el historial de cada
+# sesión vive en el almacén acotado de sesiones (LRU + TTL; en memoria o SQLite, ver session_store)
+# con presupuesto de tokens: resumen + ventana reciente (ver chat_memory)
+_llm = ChatOpenAI(
+    model=settings.MODEL_NAME,
+    openai_api_key=settings.OPENAI_API_KEY,
+    temperature=settings.TEMPERATURE,
+)
+_sessions = get_store("chat")
+_memory = TokenBudgetMemory(_sessions, summarizer=_llm)
+
+def _retrieve_with_scores(question: str, collection: str, k: int, mode: Optional[str] = None, tenant: Optional[str] = None):
+    docs_scores = search_with_scores(collection, question, k=k, mode=mode, tenant=tenant)
 
     parts, sources = [], []
     best = 0.0
     for i, (d, score) in enumerate(docs_scores, start=1):
         src = d.metadata.get("source", f"doc_{i}")
-        preview = d.page_content[:900] + ("..." if len(d.page_content) > 900 else "")
+        preview = chunk_preview(d)
         parts.append(f"[Fuente: {src} | score={round(score,3)}]\n{preview}")
-        sources.append({"source": src, "metadata": {k:v for k,v in d.metadata.items() if k!='source'}, "preview": preview, "score": score})
+        sources.append({"source": src, "metadata": {k:v for k,v in d.metadata.items() if k!='source' and k not in SNIPPET_KEYS}, "preview": preview, "score": score})
         best = max(best, score)
     return "\n\n".join(parts), sources, best
 
@@ -90,14 +76,15 @@ def chat(
     use_kb: Optional[bool] = None,            # None=AUTO; True/False para forzar
     collection: str = "cursos",
     k: int = 3,
-    threshold: float = DEFAULT_THRESHOLD
+    threshold: float = DEFAULT_THRESHOLD,
+    retrieval_mode: Optional[str] = None,     # vector | lexical | hybrid (None = KB_RETRIEVAL_MODE)
+    stateless: bool = False                   # True: ni lee ni guarda historial (evaluaciones puntuales)
 ):
-    llm = _get_llm(session_id)
-    memory = _get_memory(session_id)
+    history = [] if stateless else _memory.history(session_id)
 
     # Construimos la “cadena” con LCEL (passthroughs para input/context)
     def get_history(_: dict):
-        return memory.load_memory_variables({})["history"]
+        return history
 
     chain = (
         {
@@ -106,7 +93,7 @@ def chat(
             "context": RunnablePassthrough()
         }
         | chat_prompt
-        | llm
+        | _llm
         | StrOutputParser()
     )
 
@@ -115,18 +102,25 @@ def chat(
     rationale = "no_kb"
 
     if use_kb is None or use_kb is True:
-        ctx, srcs, best = _retrieve_with_scores(message or "", collection, k)
-        if use_kb is True or (srcs and best >= threshold):
+        ctx, srcs, best = _retrieve_with_scores(message or "", collection, k, retrieval_mode)
+        mode = retrieval_mode or KB_RETRIEVAL_MODE
+        # BM25/RRF no son relevancias calibradas: en lexical/hybrid basta con que haya coincidencias
+        calibrated = mode in THRESHOLD_MODES
+        if use_kb is True or (srcs and (not calibrated or best >= threshold)):
             context_block, sources = ctx, srcs
-            rationale = f"kb_used (best_score={round(best,3)} >= {threshold})"
+            rationale = (f"kb_used (best_score={round(best,3)} >= {threshold})" if calibrated
+                         else f"kb_used ({mode}: {len(srcs)} coincidencias, sin umbral)")
         else:
-            rationale = f"kb_skipped (best_score={round(best,3)} < {threshold})"
+            rationale = (f"kb_skipped (best_score={round(best,3)} < {threshold})" if calibrated
+                         else f"kb_skipped ({mode}: sin coincidencias)")
 
     # 👉 Ahora sí: invocamos con DOS variables sin error
-    answer = chain.invoke({"input": message or "", "context": context_block})
+    with stage("llm.chat"):
+        answer = chain.invoke({"input": message or "", "context": context_block})
 
-    # Guardar en memoria
-    memory.save_context({"input": message or ""}, {"output": answer})
+    # Guardar en memoria (el resumen de lo que exceda el presupuesto se calcula en segundo plano)
+    if not stateless:
+        _memory.record(session_id, message or "", answer)
 
     return {
         "answer": answer,
@@ -136,8 +130,10 @@ def chat(
     }
 
 def reset_session(session_id: str) -> None:
-    _session_llm.pop(session_id, None)
-    _session_memory.pop(session_id, None)
+    _sessions.delete(session_id)
 
 def sessions_count() -> int:
-    return len(_session_memory)
+    return _sessions.stats()["sessions"]
+
+def session_stats() -> Dict[str, Any]:
+    return {**_sessions.stats(), **_memory.stats(), "memory_tokens": _memory.budget}
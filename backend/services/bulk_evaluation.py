@@ -0,0 +1,269 @@
+# services/bulk_evaluation.py
+"""
+Evaluación masiva de un portafolio de PYMEs a partir de un manifiesto CSV.
+
+Uso:
+    python -m services.bulk_evaluation manifiesto.csv --uploads ./uploads --out resultados.jsonl --concurrency 8
+
+Columnas del manifiesto (cabecera obligatoria; vacías permitidas salvo razon_social):
+    razon_social, nombre_comercial, pais, ciudad, direccion,
+    instagram_url, facebook_url, tiktok_url,
+    financieros   -> rutas relativas a --uploads separadas por ';'
+    referencias   -> rutas relativas a --uploads separadas por ';'
+`--uploads` puede ser un directorio o un archivo .zip.
+
+- Corre el mismo pipeline que /risk/evaluate (`evaluate_stages`) en un único proceso, de modo que
+  clientes LLM/HTTP y pools de conexiones se comparten entre empresas.
+- Paralelismo acotado: `--concurrency` empresas en vuelo; los archivos se leen al tomar cada fila.
+- Scraping deduplicado: empresas con los mismos identificadores públicos comparten una sola recolección.
+- Resultados incrementales en JSONL (una línea por empresa, flush inmediato). Al relanzar con el mismo
+  `--out` se saltan las empresas ya evaluadas con éxito, así un backfill interrumpido se reanuda.
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import argparse
+import asyncio
+import csv
+import json
+import os
+import threading
+import time
+import zipfile
+
+from services.risk_pipeline import evaluate_stages
+from services.scraping_service import collect_public_signals_existing
+
+BULK_SIGNALS_MEMO_SIZE = int(os.getenv("BULK_SIGNALS_MEMO_SIZE", "2048"))
+
+
+# -------------------- Fuentes de archivos --------------------
+
+class UploadSource:
+    """Lee archivos referenciados por el manifiesto desde un directorio o un .zip."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._lock = threading.Lock()   # ZipFile no es seguro para lecturas concurrentes
+        if path and zipfile.is_zipfile(path):
+            self._zip = zipfile.ZipFile(path)
+
+    def read(self, ref: str) -> bytes:
+        ref = ref.strip().replace("\\", "/")
+        if self._zip is not None:
+            with self._lock:
+                return self._zip.read(ref)
+        root = os.path.abspath(self.path)
+        full = os.path.abspath(os.path.join(root, ref))
+        if not full.startswith(root + os.sep):
+            raise ValueError(f"Ruta fuera del directorio de uploads: {ref}")
+        with open(full, "rb") as f:
+            return f.read()
+
+    def close(self) -> None:
+        if self._zip is not None:
+            self._zip.close()
+
+
+# -------------------- Scraping deduplicado --------------------
+
+class SignalsMemo:
+    """
+    Coalesce/memoiza `collect_public_signals_existing` por identificadores públicos normalizados:
+    si dos filas apuntan al mismo negocio, la segunda espera (o reutiliza) la primera recolección.
+    Acotado a `max_entries` negocios (LRU). Una recolección fallida no se memoiza (la próxima fila la
+    reintenta): la que lanza una excepción y también la que vuelve sin excepción pero con plataformas
+    que no respondieron (`missing_platforms`) o sin ninguna plataforma `ok`. Las filas que ya la
+    esperaban reciben ese mismo resultado.
+    """
+
+    def __init__(self, max_entries: int = BULK_SIGNALS_MEMO_SIZE):
+        self._lock = threading.Lock()
+        self._futures: "OrderedDict[Tuple, Future]" = OrderedDict()
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+
+    @staticmethod
+    def _key(kwargs: Dict[str, Any]) -> Tuple:
+        norm = lambda v: (v or "").strip().lower().rstrip("/")
+        return tuple(norm(kwargs.get(k)) for k in
+                     ("business_name", "country", "instagram", "facebook", "tiktok", "google_maps_url"))
+
+    def __call__(self, **kwargs) -> Dict[str, Any]:
+        key = self._key(kwargs)
+        with self._lock:
+            fut = self._futures.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._futures[key] = Future()
+                while len(self._futures) > self.max_entries:
+                    self._futures.popitem(last=False)     # quien ya tiene el future lo sigue esperando
+            else:
+                self._futures.move_to_end(key)
+                self.hits += 1
+        if owner:
+            try:
+                result = collect_public_signals_existing(**kwargs)
+            except Exception as e:
+                self._evict(key, fut)
+                fut.set_exception(e)
+            else:
+                if self._failed(result):
+                    self._evict(key, fut)
+                fut.set_result(result)
+        return fut.result()
+
+    @staticmethod
+    def _failed(result: Dict[str, Any]) -> bool:
+        # collect_public_signals_existing no lanza: reporta los fallos por plataforma
+        platforms = result.get("platforms") or {}
+        if result.get("missing_platforms"):
+            return True
+        return bool(platforms) and not any((p or {}).get("ok") for p in platforms.values())
+
+    def _evict(self, key: Tuple, fut: Future) -> None:
+        with self._lock:
+            if self._futures.get(key) is fut:
+                del self._futures[key]
+
+
+# -------------------- Manifiesto / resultados --------------------
+
+def _split_refs(value: Optional[str]) -> List[str]:
+    return [r.strip() for r in (value or "").split(";") if r.strip()]
+
+def read_manifest(path: str) -> Iterator[Dict[str, str]]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+            if row.get("razon_social"):
+                yield row
+
+def _completed(out_path: str) -> set:
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue     # línea truncada por una interrupción
+            if rec.get("status") == "ok":
+                done.add(rec.get("razon_social"))
+    return done
+
+
+# -------------------- Orquestación --------------------
+
+async def _evaluate_row(
+    row: Dict[str, str],
+    uploads: UploadSource,
+    signals: SignalsMemo,
+    opts: Dict[str, Any]
+) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    razon_social = row["razon_social"]
+    try:
+        financieros = []
+        for ref in _split_refs(row.get("financieros")):
+            financieros.append((os.path.basename(ref), await asyncio.to_thread(uploads.read, ref)))
+        referencias = [os.path.basename(r) for r in _split_refs(row.get("referencias"))]
+
+        decision = None
+        async for event, data in evaluate_stages(
+            {
+                "razon_social": razon_social,
+                "nombre_comercial": row.get("nombre_comercial") or razon_social,
+                "pais": row.get("pais"),
+                "ciudad": row.get("ciudad"),
+                "direccion": row.get("direccion"),
+            },
+            instagram_url=row.get("instagram_url") or None,
+            facebook_url=row.get("facebook_url") or None,
+            tiktok_url=row.get("tiktok_url") or None,
+            financieros=financieros,
+            referencias=referencias,
+            kb_ingest=opts["kb_ingest"],
+            use_kb=opts["use_kb"],
+            collection=opts["collection"],
+            k=opts["k"],
+            collect_signals=signals
+        ):
+            if event == "decision":
+                decision = data["decision"]
+        return {"razon_social": razon_social, "status": "ok", "decision": decision,
+                "elapsed_s": round(time.perf_counter() - t0, 2)}
+    except Exception as e:
+        return {"razon_social": razon_social, "status": "error", "error": str(e),
+                "elapsed_s": round(time.perf_counter() - t0, 2)}
+
+async def run_bulk(
+    manifest: str,
+    uploads: str,
+    out: str,
+    concurrency: int = 8,
+    kb_ingest: bool = False,
+    use_kb: bool = False,
+    collection: str = "empresas",
+    k: int = 3
+) -> Dict[str, Any]:
+    # Hilos suficientes para las etapas bloqueantes de `concurrency` evaluaciones (scraping + archivos + LLM)
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=max(4, concurrency * 4), thread_name_prefix="bulk"))
+
+    done = _completed(out)
+    source = UploadSource(uploads)
+    memo = SignalsMemo()
+    opts = {"kb_ingest": kb_ingest, "use_kb": use_kb, "collection": collection, "k": k}
+    stats = {"ok": 0, "error": 0, "skipped": 0}
+    rows = read_manifest(manifest)
+    t0 = time.perf_counter()
+
+    with open(out, "a", encoding="utf-8") as fout:
+        async def worker():
+            # Los workers consumen el iterador perezosamente: nunca hay más de `concurrency` filas en memoria
+            for row in rows:
+                if row["razon_social"] in done:
+                    stats["skipped"] += 1
+                    continue
+                rec = await _evaluate_row(row, source, memo, opts)
+                fout.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+                fout.flush()
+                stats[rec["status"]] += 1
+                n = stats["ok"] + stats["error"]
+                if n % 25 == 0:
+                    rate = n / max(time.perf_counter() - t0, 1e-6)
+                    print(f"[LOG] Bulk: {n} evaluadas ({stats['error']} errores, {rate:.2f}/s)")
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        finally:
+            source.close()
+
+    stats["signals_dedup_hits"] = memo.hits
+    stats["elapsed_s"] = round(time.perf_counter() - t0, 1)
+    return stats
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Evaluación masiva de riesgo desde un manifiesto CSV")
+    ap.add_argument("manifest", help="CSV con una empresa por fila")
+    ap.add_argument("--uploads", default=".", help="Directorio o .zip con los archivos referenciados")
+    ap.add_argument("--out", default="resultados.jsonl", help="Salida JSONL (se anexa y permite reanudar)")
+    ap.add_argument("--concurrency", type=int, default=8, help="Empresas evaluadas en paralelo")
+    ap.add_argument("--kb-ingest", action="store_true", help="Ingresar los PDFs a la KB por empresa")
+    ap.add_argument("--use-kb", action="store_true", help="Justificar la narrativa con la KB")
+    ap.add_argument("--collection", default="empresas", help="Nombre base de la colección")
+    ap.add_argument("--k", type=int, default=3, help="Top-k para retrieval")
+    args = ap.parse_args(argv)
+
+    stats = asyncio.run(run_bulk(
+        args.manifest, args.uploads, args.out,
+        concurrency=args.concurrency, kb_ingest=args.kb_ingest, use_kb=args.use_kb,
+        collection=args.collection, k=args.k
+    ))
+    print(json.dumps(stats, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# services/chat_memory.py
+"""
+Memoria de conversación con presupuesto de tokens (reemplaza a ConversationBufferMemory, que re-enviaba
+todo el historial en cada turno).
+
+- Al prompt va, como máximo, `CHAT_MEMORY_TOKENS` de historial: el resumen de la conversación previa
+  más la ventana de mensajes recientes que quepa. El tamaño del prompt por turno no crece con la sesión.
+- Cuando los mensajes guardados superan el presupuesto, los más antiguos se integran al resumen
+  (resumen incremental, acotado a `CHAT_SUMMARY_WORDS` palabras) en un hilo aparte, fuera del request.
+  Mientras el resumen no está listo, la ventana deslizante mantiene el prompt dentro del presupuesto.
+- El estado (`{"summary", "messages"}`) vive en el almacén de sesiones (LRU/TTL, memoria o SQLite) y se
+  modifica solo con `store.update` (atómico también entre workers con SQLite).
+- El último turno siempre llega al prompt: si por sí solo excede el presupuesto, va recortado.
+"""
+from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import threading
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, AIMessage, messages_from_dict, messages_to_dict
+
+from services.session_store import SessionStore
+from services.timing import stage
+
+logger = logging.getLogger(__name__)
+
+CHAT_MEMORY_TOKENS = int(os.getenv("CHAT_MEMORY_TOKENS", "1500"))
+CHAT_SUMMARY_WORDS = int(os.getenv("CHAT_SUMMARY_WORDS", "200"))
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+def count_tokens(text: str) -> int:
+    """Tokens según tiktoken (cl100k_base); si el encoding no está disponible, ~4 caracteres por token."""
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+def _text(m: BaseMessage) -> str:
+    return m.content if isinstance(m.content, str) else str(m.content)
+
+def _message_tokens(m: BaseMessage) -> int:
+    return count_tokens(_text(m)) + 4   # + rol/separadores
+
+def truncate_tokens(text: str, tokens: int) -> str:
+    """Primeros `tokens` tokens de `text` (misma cuenta que `count_tokens`), con "…" si se recortó."""
+    if count_tokens(text) <= tokens:
+        return text
+    if _encoding:
+        return _encoding.decode(_encoding.encode(text)[:max(tokens - 1, 0)]) + "…"
+    return text[:max(tokens - 1, 0) * 4] + "…"
+
+SUMMARY_PROMPT = """Mantienes el resumen de una conversación entre un usuario y "AlfaTech", asistente de análisis
+de riesgo de PYMEs. Integra los mensajes nuevos al resumen actual conservando datos concretos (empresa,
+cifras, documentos entregados, pendientes). Responde solo con el resumen actualizado, en español y en
+máximo {words} palabras."""
+
+
+class TokenBudgetMemory:
+    def __init__(self, store: SessionStore, summarizer, budget: int = CHAT_MEMORY_TOKENS,
+                 summary_words: int = CHAT_SUMMARY_WORDS):
+        self.store = store
+        self.summarizer = summarizer
+        self.budget = budget
+        self.summary_words = summary_words
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-summary")
+        self._pending: set = set()
+        self._pending_lock = threading.Lock()       # también protege `_stats`
+        self._stats = {"summaries": 0, "summary_errors": 0}
+
+    def stats(self) -> Dict[str, int]:
+        with self._pending_lock:
+            return dict(self._stats)
+
+    def _count(self, key: str) -> None:
+        with self._pending_lock:
+            self._stats[key] += 1
+
+    def _state(self, session_id: str) -> Dict[str, Any]:
+        return self.store.load(session_id) or {"summary": "", "messages": []}
+
+    def history(self, session_id: str) -> List[BaseMessage]:
+        """Resumen + ventana de mensajes recientes, dentro del presupuesto de tokens."""
+        state = self._state(session_id)
+        used = 0
+        summary = state.get("summary")
+        if summary:
+            used = count_tokens(summary) + 4
+        messages = messages_from_dict(state["messages"])
+        # el último turno (pregunta + respuesta) no se descarta nunca: si no cabe, va recortado
+        latest, older = messages[-2:], messages[:-2]
+        if sum(_message_tokens(m) for m in latest) > self.budget - used:
+            share = max(self.budget - used, self.budget // 4) // max(len(latest), 1) - 4
+            latest = [m.model_copy(update={"content": truncate_tokens(_text(m), share)}) for m in latest]
+        used += sum(_message_tokens(m) for m in latest)
+        window = list(reversed(latest))
+        for m in reversed(older):
+            used += _message_tokens(m)
+            if used > self.budget:
+                break
+            window.append(m)
+        window.reverse()
+        if summary:
+            return [SystemMessage(content=f"Resumen de la conversación previa:\n{summary}")] + window
+        return window
+
+    def record(self, session_id: str, message: str, answer: str) -> None:
+        """Agrega el turno al estado vigente y, si se pasó del presupuesto, agenda el resumen."""
+        turn = messages_to_dict([HumanMessage(content=message), AIMessage(content=answer)])
+
+        def _append(current: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            current = current or {"summary": "", "messages": []}
+            return {**current, "messages": current["messages"] + turn}
+
+        state = self.store.update(session_id, _append)
+        if self._overflow(state) > 0:
+            with self._pending_lock:
+                if session_id in self._pending:
+                    return
+                self._pending.add(session_id)
+            self._executor.submit(self._summarize, session_id)
+
+    def _overflow(self, state: Dict[str, Any]) -> int:
+        """Cuántos mensajes antiguos pasar al resumen (los que dejan el resto en la mitad del presupuesto)."""
+        messages = messages_from_dict(state["messages"])
+        total = sum(_message_tokens(m) for m in messages)
+        if total <= self.budget:
+            return 0
+        n = 0
+        while n < len(messages) - 2 and total > self.budget // 2:
+            total -= _message_tokens(messages[n])
+            n += 1
+        return n
+
+    def _summarize(self, session_id: str) -> None:
+        try:
+            state = self._state(session_id)
+            n = self._overflow(state)
+            if not n:
+                return
+            folded = state["messages"][:n]
+            transcript = "\n".join(
+                f"{'Usuario' if m.type == 'human' else 'Asistente'}: {m.content}" for m in messages_from_dict(folded)
+            )
+            with stage("llm.summary"):
+                summary = self.summarizer.invoke([
+                    SystemMessage(content=SUMMARY_PROMPT.format(words=self.summary_words)),
+                    HumanMessage(content=f"Resumen actual:\n{state.get('summary') or '(vacío)'}\n\nMensajes nuevos:\n{transcript}"),
+                ]).content
+
+            def _apply(latest: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+                # la sesión pudo reiniciarse o resumirse mientras tanto (en este u otro worker):
+                # solo se aplica si sigue igual
+                if not latest or latest["messages"][:n] != folded or latest.get("summary", "") != state.get("summary", ""):
+                    return None
+                return {"summary": summary, "messages": latest["messages"][n:]}
+
+            if self.store.update(session_id, _apply) is not None:
+                self._count("summaries")
+        except Exception as e:
+            self._count("summary_errors")
+            logger.error(f"Error resumiendo la sesión {session_id}: {e}")
+        finally:
+            with self._pending_lock:
+                self._pending.discard(session_id)
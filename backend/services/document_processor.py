@@ -4,6 +4,8 @@ import io, os
 
 import fitz  # PyMuPDF
 
+from services.timing import stage, timed
+
 # --- Umbrales ajustables ---
 MIN_CHARS_PER_PAGE = 80         # si la extracción nativa de una página trae <80 chars => se intenta OCR
 ZOOM = 2.0                      # 2.0 ~ 288 dpi aprox (buena para OCR)
@@ -48,6 +50,7 @@ def _ocr_image(img_bytes: bytes) -> str:
     text = _try_openai_vision_ocr(img_bytes)
     return text or ""
 
+@timed("pdf.parse")
 def pdf_to_rich_text(pdf_bytes: bytes, force_ocr: bool = False) -> Dict[str, Any]:
     """
     Extrae texto de un PDF - OPTIMIZADO para velocidad y extracción de campos financieros:
@@ -84,8 +87,10 @@ def pdf_to_rich_text(pdf_bytes: bytes, force_ocr: bool = False) -> Dict[str, Any
         ocr_used = False
         if need_ocr:
             try:
-                img_bytes = _page_to_png_bytes(page)
-                ocr_text = _ocr_image(img_bytes)
+                with stage("pdf.render"):
+                    img_bytes = _page_to_png_bytes(page)
+                with stage("pdf.ocr"):
+                    ocr_text = _ocr_image(img_bytes)
                 ocr_used = len(ocr_text.strip()) > 0
             except Exception:
                 ocr_text = ""
@@ -0,0 +1,140 @@
+# services/embedding_cache.py
+"""
+Caché persistente (SQLite) de embeddings, por contenido.
+
+- Clave: sha256(modelo + texto). El mismo chunk re-subido, o el mismo documento ingestado en
+  varias colecciones, se embebe una sola vez; lo mismo para preguntas repetidas.
+- Solo los textos que faltan van a la API de embeddings (en un único lote por llamada).
+- Tamaño acotado (`EMBEDDING_CACHE_MAX_ENTRIES`): se desalojan las entradas usadas hace más tiempo.
+- Estadísticas de aciertos en `stats()`.
+"""
+from typing import Dict, List, Optional
+from array import array
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+_EVICT_EVERY = 500     # inserciones entre chequeos de tamaño
+
+
+def _key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+def _pack(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+def _unpack(blob: bytes) -> List[float]:
+    a = array("f")
+    a.frombytes(blob)
+    return a.tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, inner: Embeddings, model: str, path: str = EMBEDDING_CACHE_PATH,
+                 max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.inner = inner
+        self.model = model
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_used_at ON embeddings (used_at)")
+        self._conn.commit()
+        self._inserts = 0
+        self._stats = {"hits": 0, "misses": 0, "evicted": 0}
+
+    # ---------- almacenamiento ----------
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for i in range(0, len(unique), 500):      # límite de parámetros de SQLite
+                batch = unique[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update({k: _unpack(v) for k, v in rows})
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET used_at=? WHERE key=?", [(now, k) for k in found])
+                self._conn.commit()
+        return found
+
+    def _store(self, items: Dict[str, List[float]]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, used_at) VALUES (?, ?, ?)",
+                [(k, _pack(v), now) for k, v in items.items()]
+            )
+            self._inserts += len(items)
+            if self._inserts >= _EVICT_EVERY:
+                self._inserts = 0
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY used_at LIMIT ?)",
+                (excess,)
+            )
+            self._stats["evicted"] += excess
+
+    # ---------- interfaz Embeddings ----------
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [_key(self.model, t) for t in texts]
+        cached = self._lookup(keys)
+        missing: Dict[str, str] = {}
+        for k, t in zip(keys, texts):
+            if k not in cached:
+                missing.setdefault(k, t)
+
+        with self._lock:
+            self._stats["hits"] += len(texts) - sum(1 for k in keys if k in missing)
+            self._stats["misses"] += len(missing)
+
+        if missing:
+            vectors = self.inner.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self._store(fresh)
+            cached.update(fresh)
+        return [cached[k] for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        k = _key(self.model, text)
+        cached = self._lookup([k])
+        if k in cached:
+            with self._lock:
+                self._stats["hits"] += 1
+            return cached[k]
+        with self._lock:
+            self._stats["misses"] += 1
+        vector = self.inner.embed_query(text)
+        self._store({k: vector})
+        return vector
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            total = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hit_rate": round(self._stats["hits"] / total, 4) if total else None,
+            }
@@ -0,0 +1,83 @@
+# services/embeddings.py
+"""
+Backends de embeddings seleccionables con `EMBEDDING_MODEL`:
+
+- `text-embedding-3-small` (o cualquier nombre sin prefijo, o `openai:<modelo>`): API de OpenAI.
+- `hashing:<dim>`: vectorizador por hashing en el proceso (sin red ni modelo; para pruebas y modo offline).
+- `sentence-transformers:<modelo>` (alias `st:<modelo>`): modelo local en CPU, inferencia por lotes.
+  Requiere el paquete opcional `sentence-transformers`.
+
+`build_embeddings` devuelve también la etiqueta del modelo, que `knowledge_base` guarda en cada colección
+para no mezclar vectores de modelos distintos.
+"""
+from typing import List, Tuple
+import hashlib
+import math
+import os
+import re
+
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+_TOKEN_RX = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbeddings(Embeddings):
+    """Feature hashing con signo de palabras y bigramas, normalizado L2. Determinista y sin dependencias."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vec = [0.0] * self.dim
+        words = _TOKEN_RX.findall(text.lower())
+        for tok in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            h = int.from_bytes(hashlib.blake2b(tok.encode("utf-8"), digest_size=8).digest(), "little")
+            vec[h % self.dim] += 1.0 if h >> 63 else -1.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    def __init__(self, model_name: str, batch_size: int = EMBEDDING_BATCH_SIZE):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError(
+                "EMBEDDING_MODEL=sentence-transformers:... requiere `pip install sentence-transformers`"
+            ) from e
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.encode(
+            texts, batch_size=self.batch_size, normalize_embeddings=True, show_progress_bar=False
+        ).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def build_embeddings(spec: str, openai_api_key: str = "") -> Tuple[Embeddings, str]:
+    """`EMBEDDING_MODEL` -> (embeddings, etiqueta del modelo)."""
+    backend, _, name = spec.partition(":")
+    if not name:
+        backend, name = "openai", spec
+    backend = backend.strip().lower()
+
+    if backend == "hashing":
+        dim = int(name or 384)
+        return HashingEmbeddings(dim), f"hashing:{dim}"
+    if backend in ("sentence-transformers", "st"):
+        return SentenceTransformerEmbeddings(name), f"sentence-transformers:{name}"
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        # etiqueta = nombre del modelo a secas (compatible con colecciones y caché previas)
+        return OpenAIEmbeddings(model=name, openai_api_key=openai_api_key), name
+    raise ValueError(f"EMBEDDING_MODEL no soportado: {spec}")
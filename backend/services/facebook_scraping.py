@@ -1,9 +1,12 @@
-import requests
-from bs4 import BeautifulSoup
 import re
 import os
 from dotenv import load_dotenv
 
+from services import http_client
+from services.html_stream import scan_html_stream
+
+_FOLLOWERS_RX = re.compile(r'([\d,.]+) seguidores', re.IGNORECASE)
+
 load_dotenv()
 
 def get_facebook_stats(business_name):
@@ -18,34 +21,35 @@ def get_facebook_stats(business_name):
     """
     base_url = os.getenv("FACEBOOK_BASE_URL", "https://www.facebook.com")
     url = f"{base_url}/{business_name}/?__a=1"
-    response = requests.get(url)
-    
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        metadata = soup.find('meta', property='og:description')
-        if metadata:
-            metadata_content = metadata['content']
-            
-            stats = {}
-
-            liked_match = re.search(r'([\d,.]+) Me gusta', metadata_content)
-            if liked_match:
-                stats['likes'] = int(liked_match.group(1).replace('.', '').replace(',', ''))
-
-            posts_match = re.search(r'(\d+) publicaciones', metadata_content)
-            if posts_match:
-                stats['posts'] = int(posts_match.group(1))
-
-            body_content = str(soup.find('body'))
-            followers_match = re.search(r'([\d,.]+) seguidores', body_content, re.IGNORECASE)
-            if followers_match:
-                stats['followers'] = int(followers_match.group(1).replace('.', '').replace(',', ''))
-
-            return {
-                "source": "facebook",
-                "business_name": business_name,
-                "stats": stats
-            }
+    with http_client.stream_get(url) as response:
+        if response.status_code == 200:
+            # Lectura por streaming: se corta apenas aparecen og:description y el contador de seguidores
+            meta, found, _ = scan_html_stream(
+                response, meta_keys=("og:description",), body_patterns={"followers": _FOLLOWERS_RX}
+            )
+        else:
+            meta, found = {}, {}
+
+    metadata_content = meta.get('og:description')
+    if metadata_content:
+        stats = {}
+
+        liked_match = re.search(r'([\d,.]+) Me gusta', metadata_content)
+        if liked_match:
+            stats['likes'] = int(liked_match.group(1).replace('.', '').replace(',', ''))
+
+        posts_match = re.search(r'(\d+) publicaciones', metadata_content)
+        if posts_match:
+            stats['posts'] = int(posts_match.group(1))
+
+        if found.get('followers'):
+            stats['followers'] = int(found['followers'].replace('.', '').replace(',', ''))
+
+        return {
+            "source": "facebook",
+            "business_name": business_name,
+            "stats": stats
+        }
     return {
         "source": "facebook",
         "business_name": business_name,
@@ -0,0 +1,172 @@
+# services/fake_upstream.py
+"""
+Servidor HTTP local que imita las páginas/APIs que consumen los scrapers (Facebook, Instagram,
+TikTok y SerpAPI), para probar la capa HTTP sin salir a internet.
+
+Uso manual:
+    python -m services.fake_upstream --port 8765
+    FACEBOOK_BASE_URL=http://127.0.0.1:8765/facebook \\
+    INSTAGRAM_BASE_URL=http://127.0.0.1:8765/instagram \\
+    TIKTOK_BASE_URL=http://127.0.0.1:8765/tiktok \\
+    SERPAPI_URL=http://127.0.0.1:8765/serpapi/search  python main.py
+
+Desde código (pruebas):
+    server, base = start_fake_upstream()      # puerto libre, hilo en segundo plano
+    server.delay = 2.0                         # latencia artificial por request
+    server.fail_status = 503                   # fuerza errores HTTP (None para desactivar)
+    server.retry_after = "30"                  # cabecera Retry-After de esas respuestas (None = sin cabecera)
+    server.hits["/serpapi/search"]             # nº de requests recibidos por ruta
+    server.shutdown()
+
+Perfiles cuyo nombre empieza con `missing` devuelven 404.
+"""
+from typing import Dict, Optional, Tuple
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import threading
+import time
+import urllib.parse
+
+# Relleno para imitar el tamaño real de una página de perfil (~200 KB después de los datos útiles)
+_FILLER = "<div class='x1n2onr6'>" + ("<span>lorem ipsum</span>" * 8000) + "</div>"
+
+
+def _facebook_page(name: str) -> str:
+    return (
+        "<!DOCTYPE html><html><head>"
+        f"<title>{name} | Facebook</title>"
+        f'<meta property="og:title" content="{name}" />'
+        f'<meta property="og:description" content="{name}. 1.234 Me gusta · 56 publicaciones · Comercio" />'
+        "</head><body>"
+        f"<div><h1>{name}</h1><a href='/{name}/followers'>5.678 seguidores</a></div>"
+        f"{_FILLER}</body></html>"
+    )
+
+def _instagram_page(name: str) -> str:
+    return (
+        "<!DOCTYPE html><html><head>"
+        f'<meta property="og:description" content="2,345 Followers, 120 Following, 78 Posts - See Instagram photos and videos from {name}" />'
+        f"</head><body>{_FILLER}</body></html>"
+    )
+
+def _tiktok_page(name: str) -> str:
+    state = {"__DEFAULT_SCOPE__": {"webapp.user-detail": {"userInfo": {
+        "user": {"uniqueId": name, "signature": "Bio de prueba"},
+        "stats": {"followerCount": 3456, "followingCount": 12, "heartCount": 78901},
+    }}}}
+    return (
+        "<!DOCTYPE html><html><head><title>TikTok</title></head><body>"
+        f'<script id="__UNIVERSAL_DATA_FOR_REHYDRATION__" type="application/json">{json.dumps(state)}</script>'
+        "<strong data-e2e='followers-count'>3456</strong>"
+        "<strong data-e2e='following-count'>12</strong>"
+        "<strong data-e2e='likes-count'>78.9K</strong>"
+        f"{_FILLER}</body></html>"
+    )
+
+def _serpapi_result(query: str) -> Dict:
+    return {
+        "search_parameters": {"q": query},
+        "place_results": {
+            "title": query,
+            "rating": 4.4,
+            "reviews": 87,
+            "user_reviews": {"most_relevant": [
+                {"username": "Cliente 1", "rating": 5, "description": "Excelente atención", "date": "hace 1 mes"},
+                {"username": "Cliente 2", "rating": 4, "description": "Buen servicio", "date": "hace 2 meses"},
+            ]},
+        },
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "FakeUpstreamServer"
+
+    def log_message(self, *args):     # silencioso
+        pass
+
+    def _send(self, status: int, body: str, content_type: str, headers: Optional[Dict[str, str]] = None) -> None:
+        data = body.encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass      # el cliente cortó la descarga (lectura por streaming)
+
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        parts = [urllib.parse.unquote(p) for p in parsed.path.split("/") if p]
+        route = "/" + "/".join(parts[:2]) if parts and parts[0] == "serpapi" else "/" + (parts[0] if parts else "")
+        with self.server.lock:
+            self.server.hits[route] += 1
+            delay, fail, retry_after = self.server.delay, self.server.fail_status, self.server.retry_after
+        if delay:
+            time.sleep(delay)
+        if fail:
+            headers = {"Retry-After": retry_after} if retry_after is not None else None
+            return self._send(fail, "upstream error", "text/plain", headers)
+
+        if len(parts) < 2:
+            return self._send(404, "not found", "text/plain")
+        platform, name = parts[0], parts[1]
+
+        if platform == "serpapi":
+            q = urllib.parse.parse_qs(parsed.query).get("q", [""])[0]
+            return self._send(200, json.dumps(_serpapi_result(q)), "application/json")
+        if name.lstrip("@").startswith("missing"):
+            return self._send(404, "<html><body>Página no disponible</body></html>", "text/html")
+        if platform == "facebook":
+            return self._send(200, _facebook_page(name), "text/html; charset=utf-8")
+        if platform == "instagram":
+            return self._send(200, _instagram_page(name), "text/html; charset=utf-8")
+        if platform == "tiktok":
+            return self._send(200, _tiktok_page(name.lstrip("@")), "text/html; charset=utf-8")
+        return self._send(404, "not found", "text/plain")
+
+
+class FakeUpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr: Tuple[str, int]):
+        super().__init__(addr, _Handler)
+        self.lock = threading.Lock()
+        self.hits: Counter = Counter()
+        self.delay: float = 0.0
+        self.fail_status: Optional[int] = None
+        self.retry_after: Optional[str] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_fake_upstream(host: str = "127.0.0.1", port: int = 0) -> Tuple[FakeUpstreamServer, str]:
+    server = FakeUpstreamServer((host, port))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.base_url
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Servidor falso de plataformas para pruebas de scraping")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--delay", type=float, default=0.0, help="Latencia artificial por request (s)")
+    args = ap.parse_args()
+
+    srv = FakeUpstreamServer((args.host, args.port))
+    srv.delay = args.delay
+    base = srv.base_url
+    print(f"FACEBOOK_BASE_URL={base}/facebook")
+    print(f"INSTAGRAM_BASE_URL={base}/instagram")
+    print(f"TIKTOK_BASE_URL={base}/tiktok")
+    print(f"SERPAPI_URL={base}/serpapi/search")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        srv.shutdown()
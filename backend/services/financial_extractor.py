@@ -3,6 +3,7 @@ from typing import Optional, Tuple, Dict, Any
 import re
 
 from services.scoring_service import FinanceMetrics
+from services.timing import timed
 
 _NUM = r"[-+]?\d+(?:[\.,]\d+)?(?:\.\d+)?|[-+]?\d{1,3}(?:[\.,]\d{3})*(?:[\.,]\d+)?"
 
@@ -70,6 +71,7 @@ def _search_first(text: str, patterns, field_name="") -> Optional[float]:
     print(f"[LOG] Campo NO encontrado: {field_name}")
     return None
 
+@timed("extract.metrics")
 def extract_financial_metrics_from_text(text: str) -> Tuple[FinanceMetrics, Dict[str, Any]]:
     tx = re.sub(r"\u00A0", " ", text)
 
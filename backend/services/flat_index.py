@@ -0,0 +1,345 @@
+# services/flat_index.py
+"""
+Backend vectorial "flat" para colecciones chicas (decenas/cientos de chunks, p. ej. una por empresa).
+
+Cada escritura publica una versión inmutable en su propio directorio y la activa cambiando un único
+puntero (`CURRENT`, reemplazado con `os.replace`), así ningún lector ve una versión a medias:
+- `<versión>/vectors.f32`: matriz float32 (N x dim) de vectores normalizados, abierta con `np.memmap`
+  (abrir la colección no lee nada del disco y las búsquedas operan directo sobre el mapa, sin copias).
+- `<versión>/rows.json`: ids, documentos, metadatas, forma de la matriz y metadata de la colección.
+- Las escrituras toman un lock de archivo (`fcntl.flock` sobre `.lock`), releen la versión vigente y
+  recién ahí la modifican: varios procesos (workers de uvicorn) pueden escribir la misma colección.
+- Cada proceso revisa el puntero (un `stat`) antes de usar su caché y recarga si otro lo movió.
+- Un upsert que solo agrega filas no copia la matriz: la nueva versión enlaza (hard link) el archivo
+  de vectores de la anterior y le agrega las filas al final; las versiones viejas solo leen sus N
+  primeras filas. Actualizar o borrar filas reescribe la matriz en un archivo nuevo.
+- Búsqueda exacta top-k por producto punto, vectorizada; `similarity_search_batch` resuelve varias
+  consultas con una sola multiplicación de matrices.
+
+Implementa el mismo contrato que usa `knowledge_base` de Chroma: `similarity_search_with_relevance_scores`
+/ `similarity_search` (vectorstore) y `get` / `upsert` / `delete` / `count` / `metadata` / `modify`
+(colección). El formato anterior (`vectors.npy` + `rows.json` en la raíz) se sigue leyendo y se
+convierte en la primera escritura.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from contextlib import contextmanager
+import fcntl
+import json
+import math
+import os
+import shutil
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+_CURRENT = "CURRENT"
+_LOCK = ".lock"
+_VECTORS = "vectors.f32"
+_ROWS = "rows.json"
+_LEGACY_VECTORS = "vectors.npy"
+_KEEP_VERSIONS = 2     # la vigente y la anterior (lectores que leyeron el puntero justo antes del cambio)
+
+
+def _matches(meta: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Subconjunto de filtros `where` de Chroma: igualdad por campo y `$and`."""
+    if not where:
+        return True
+    if "$and" in where:
+        return all(_matches(meta, w) for w in where["$and"])
+    for key, value in where.items():
+        if isinstance(value, dict):
+            if set(value) != {"$eq"}:
+                raise ValueError(f"Filtro no soportado por el backend flat: {where}")
+            value = value["$eq"]
+        if meta.get(key) != value:
+            return False
+    return True
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+def _relevance(cosine: np.ndarray) -> np.ndarray:
+    # misma escala que Chroma (distancia L2² entre vectores unitarios = 2 - 2·cos, relevancia 1 - d/√2),
+    # para que los umbrales de relevancia valgan igual con ambos backends
+    return 1.0 - (2.0 - 2.0 * cosine) / math.sqrt(2)
+
+def _empty_rows() -> Dict[str, Any]:
+    return {"metadata": {}, "ids": [], "documents": [], "metadatas": []}
+
+def _fsync_write(path: str, data: bytes) -> None:
+    with open(path, "wb") as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+
+
+class FlatVectorStore:
+    def __init__(self, path: str, embedding_function: Embeddings):
+        self.path = path
+        self.embedding_function = embedding_function
+        self._lock = threading.RLock()
+        self._vectors: Optional[np.ndarray] = None
+        self._rows: Optional[Dict[str, Any]] = None
+        self._version: Optional[str] = None
+        self._stamp: Optional[Tuple[int, int]] = None      # (inode, mtime) del puntero ya cargado
+
+    # ---------- almacenamiento ----------
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, _CURRENT)) or os.path.exists(os.path.join(path, _ROWS))
+
+    def _pointer_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(os.path.join(self.path, _CURRENT))
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    def _read_version(self, version: Optional[str]) -> Tuple[np.ndarray, Dict[str, Any]]:
+        if version is None:
+            # formato anterior (o colección vacía)
+            try:
+                with open(os.path.join(self.path, _ROWS), encoding="utf-8") as fh:
+                    rows = json.load(fh)
+                return np.load(os.path.join(self.path, _LEGACY_VECTORS), mmap_mode="r"), rows
+            except FileNotFoundError:
+                return np.zeros((0, 0), dtype=np.float32), _empty_rows()
+        directory = os.path.join(self.path, version)
+        with open(os.path.join(directory, _ROWS), encoding="utf-8") as fh:
+            rows = json.load(fh)
+        n, dim = rows.pop("shape")
+        if not n:
+            return np.zeros((0, dim), dtype=np.float32), rows
+        return np.memmap(os.path.join(directory, _VECTORS), dtype=np.float32, mode="r", shape=(n, dim)), rows
+
+    def _load(self) -> Tuple[np.ndarray, Dict[str, Any]]:
+        with self._lock:
+            for _ in range(3):
+                stamp = self._pointer_stamp()
+                if self._rows is not None and stamp == self._stamp:
+                    return self._vectors, self._rows
+                try:
+                    version = None
+                    if stamp is not None:
+                        with open(os.path.join(self.path, _CURRENT), encoding="utf-8") as fh:
+                            version = fh.read().strip()
+                    self._vectors, self._rows = self._read_version(version)
+                    self._version, self._stamp = version, stamp
+                    return self._vectors, self._rows
+                except FileNotFoundError:
+                    continue      # otro proceso publicó y limpió entre medio: se relee el puntero
+            raise RuntimeError(f"No se pudo leer una versión estable de {self.path}")
+
+    @contextmanager
+    def _writing(self):
+        """Lock del hilo + lock de archivo entre procesos; entrega la versión vigente recién leída."""
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, _LOCK), "a") as lock_fh:
+                fcntl.flock(lock_fh, fcntl.LOCK_EX)
+                try:
+                    yield self._load()
+                finally:
+                    fcntl.flock(lock_fh, fcntl.LOCK_UN)
+
+    def _publish(self, vectors: np.ndarray, rows: Dict[str, Any], appended: Optional[np.ndarray] = None) -> None:
+        """
+        Escribe una versión nueva y mueve el puntero; se llama dentro de `_writing`. Con `appended`,
+        `vectors` es la matriz vigente sin cambios y solo se agregan esas filas al final.
+        """
+        number = int(self._version) + 1 if self._version else 1
+        version = f"{number:08d}"
+        directory = os.path.join(self.path, version)
+        shutil.rmtree(directory, ignore_errors=True)          # resto de una escritura interrumpida
+        os.makedirs(directory)
+        target = os.path.join(directory, _VECTORS)
+        if appended is not None and self._version and len(vectors):
+            previous = os.path.join(self.path, self._version, _VECTORS)
+            try:
+                os.link(previous, target)
+            except OSError:
+                shutil.copyfile(previous, target)
+            with open(target, "r+b") as fh:
+                fh.truncate(vectors.size * 4)     # descarta filas de una escritura que no llegó a publicarse
+                fh.seek(0, os.SEEK_END)
+                fh.write(np.ascontiguousarray(appended, dtype=np.float32).tobytes())
+                fh.flush()
+                os.fsync(fh.fileno())
+            shape = (len(vectors) + len(appended), vectors.shape[1])
+        else:
+            if appended is not None:
+                vectors = appended if not len(vectors) else np.vstack([vectors, appended])
+            matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+            _fsync_write(target, matrix.tobytes())
+            shape = matrix.shape if matrix.ndim == 2 else (0, 0)
+        payload = json.dumps({**rows, "shape": list(shape)}, ensure_ascii=False).encode("utf-8")
+        _fsync_write(os.path.join(directory, _ROWS), payload)
+        tmp = os.path.join(self.path, _CURRENT + ".tmp")
+        _fsync_write(tmp, version.encode("ascii"))
+        os.replace(tmp, os.path.join(self.path, _CURRENT))
+        self._load()
+        self._cleanup()
+
+    def _cleanup(self) -> None:
+        """Borra versiones viejas (los mapas abiertos siguen siendo válidos) y el formato anterior."""
+        versions = sorted(d for d in os.listdir(self.path) if d.isdigit())
+        for old in versions[:-_KEEP_VERSIONS]:
+            shutil.rmtree(os.path.join(self.path, old), ignore_errors=True)
+        for legacy in (_LEGACY_VECTORS, _ROWS):
+            try:
+                os.remove(os.path.join(self.path, legacy))
+            except FileNotFoundError:
+                pass
+
+    def drop(self) -> None:
+        with self._lock:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self._vectors, self._rows, self._version, self._stamp = None, None, None, None
+
+    # ---------- interfaz de colección (subconjunto de chromadb.Collection) ----------
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return dict(self._load()[1]["metadata"])
+
+    def modify(self, metadata: Dict[str, Any]) -> None:
+        with self._writing() as (vectors, rows):
+            self._publish(vectors, {**rows, "metadata": dict(metadata)}, appended=vectors[:0])
+
+    def count(self) -> int:
+        return len(self._load()[1]["ids"])
+
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        include: Sequence[str] = ("documents", "metadatas"),
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> Dict[str, Any]:
+        vectors, rows = self._load()
+        wanted = set(ids) if ids is not None else None
+        idx = [
+            i for i, (cid, meta) in enumerate(zip(rows["ids"], rows["metadatas"]))
+            if (wanted is None or cid in wanted) and _matches(meta, where)
+        ]
+        idx = idx[offset:offset + limit if limit is not None else None]
+        out: Dict[str, Any] = {"ids": [rows["ids"][i] for i in idx]}
+        if "documents" in include:
+            out["documents"] = [rows["documents"][i] for i in idx]
+        if "metadatas" in include:
+            out["metadatas"] = [rows["metadatas"][i] for i in idx]
+        if "embeddings" in include:
+            out["embeddings"] = vectors[idx] if idx else np.zeros((0, vectors.shape[-1]), dtype=np.float32)
+        return out
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: Sequence[str],
+        metadatas: Sequence[Dict[str, Any]],
+    ) -> None:
+        new = _normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._writing() as (vectors, rows):
+            if len(rows["ids"]) and new.shape[1] != vectors.shape[1]:
+                raise ValueError(f"Dimensión {new.shape[1]} distinta a la de la colección ({vectors.shape[1]})")
+            position = {cid: i for i, cid in enumerate(rows["ids"])}
+            out_ids, out_docs, out_metas = list(rows["ids"]), list(rows["documents"]), list(rows["metadatas"])
+            updated: Dict[int, int] = {}           # fila existente -> índice en `embeddings`
+            appended: Dict[int, int] = {}          # fila nueva -> índice en `embeddings`
+            for j, cid in enumerate(ids):
+                if cid not in position:
+                    position[cid] = len(out_ids)
+                    out_ids.append(cid)
+                    out_docs.append(None)
+                    out_metas.append(None)
+                i = position[cid]
+                if i < len(rows["ids"]):
+                    updated[i] = j
+                else:
+                    appended[i] = j
+                out_docs[i], out_metas[i] = documents[j], dict(metadatas[j] or {})
+            tail = new[[appended[i] for i in sorted(appended)]] if appended else new[:0]
+            if updated:
+                # cambian filas existentes: la matriz se reescribe completa en la versión nueva
+                vectors = np.array(vectors)
+                for i, j in updated.items():
+                    vectors[i] = new[j]
+            out_rows = {**rows, "ids": out_ids, "documents": out_docs, "metadatas": out_metas}
+            if updated:
+                self._publish(np.vstack([vectors, tail]), out_rows)
+            else:
+                self._publish(vectors, out_rows, appended=tail)
+
+    def delete(self, ids: Sequence[str]) -> None:
+        drop = set(ids)
+        with self._writing() as (vectors, rows):
+            keep = [i for i, cid in enumerate(rows["ids"]) if cid not in drop]
+            if len(keep) == len(rows["ids"]):
+                return
+            self._publish(vectors[keep], {
+                **rows,
+                "ids": [rows["ids"][i] for i in keep],
+                "documents": [rows["documents"][i] for i in keep],
+                "metadatas": [rows["metadatas"][i] for i in keep],
+            })
+
+    # ---------- búsqueda ----------
+
+    def search_vectors(
+        self, queries: np.ndarray, k: int, where: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[List[Tuple[int, float]]], Dict[str, Any]]:
+        """Top-k exacto (fila, relevancia) para cada consulta (m x dim), con una sola multiplicación.
+
+        Devuelve también las filas de la misma instantánea: los índices solo son válidos
+        contra ellas (una publicación concurrente puede cambiar la versión entre dos _load()).
+        """
+        vectors, rows = self._load()
+        if not len(rows["ids"]):
+            return [[] for _ in range(len(queries))], rows
+        candidates = None
+        if where:
+            candidates = np.array([i for i, m in enumerate(rows["metadatas"]) if _matches(m, where)], dtype=np.int64)
+            if not len(candidates):
+                return [[] for _ in range(len(queries))], rows
+        matrix = vectors if candidates is None else vectors[candidates]
+        scores = _normalize(np.asarray(queries, dtype=np.float32)) @ matrix.T      # (m x n)
+        k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, cols in zip(scores, top):
+            cols = cols[np.argsort(-row[cols])]
+            rel = _relevance(row[cols])
+            rows_idx = cols if candidates is None else candidates[cols]
+            results.append([(int(i), float(s)) for i, s in zip(rows_idx, rel)])
+        return results, rows
+
+    @staticmethod
+    def _documents(hits: List[Tuple[int, float]], rows: Dict[str, Any]) -> List[Tuple[Document, float]]:
+        return [
+            (Document(page_content=rows["documents"][i], metadata=dict(rows["metadatas"][i])), score)
+            for i, score in hits
+        ]
+
+    def similarity_search_with_relevance_scores(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Document, float]]:
+        q = np.asarray([self.embedding_function.embed_query(query)], dtype=np.float32)
+        hits, rows = self.search_vectors(q, k, filter)
+        return self._documents(hits[0], rows)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_relevance_scores(query, k=k, filter=filter)]
+
+    def similarity_search_batch(
+        self, queries: List[str], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Tuple[Document, float]]]:
+        """Varias consultas: un solo lote de embeddings y una sola multiplicación de matrices."""
+        q = np.asarray(self.embedding_function.embed_documents(queries), dtype=np.float32)
+        results, rows = self.search_vectors(q, k, filter)
+        return [self._documents(hits, rows) for hits in results]
@@ -1,8 +1,9 @@
-import requests
 import json
 import os
 from dotenv import load_dotenv
 
+from services.serpapi_client import get_client
+
 load_dotenv()
 
 def get_google_maps_rating(api_key, business_name, location=None):
@@ -25,6 +26,7 @@ def get_google_maps_rating(api_key, business_name, location=None):
         :return: The function `get_google_maps_rating` returns a tuple containing three elements: (rating,
         reviews, comments). Each element represents different information about a business on Google Maps.
         Here is what each element represents:
+        :raises SerpApiError: If SerpAPI fails, is rate limited or its circuit breaker is open.
     """
     params = {
         "engine": "google_maps",
@@ -37,22 +39,35 @@ def get_google_maps_rating(api_key, business_name, location=None):
     if location:
         params["ll"] = f"@{location}"
     
-    try:
-        serpapi_url = os.getenv("SERPAPI_URL", 'https://serpapi.com/search')
-        response = requests.get(serpapi_url, params=params)
-        data = response.json()
-        
-        
-        # Extraer información de calificación y comentarios
-        if 'place_results' in data:
-            place_data = data['place_results']
-            rating = place_data.get('rating')
-            reviews = place_data.get('reviews')
-            
-            # Obtener comentarios relevantes si existen
+    # Rate limit, circuit breaker y coalescing de consultas idénticas en el cliente compartido
+    data = get_client().search(params)
+
+    # Extraer información de calificación y comentarios
+    if 'place_results' in data:
+        place_data = data['place_results']
+        rating = place_data.get('rating')
+        reviews = place_data.get('reviews')
+
+        # Obtener comentarios relevantes si existen
+        comments = []
+        if 'user_reviews' in place_data and 'most_relevant' in place_data['user_reviews']:
+            for review in place_data['user_reviews']['most_relevant']:
+                comment = {
+                    'username': review.get('username'),
+                    'rating': review.get('rating'),
+                    'text': review.get('description'),
+                    'date': review.get('date')
+                }
+                comments.append(comment)
+
+        return rating, reviews, comments if comments else None
+
+    # Buscar en resultados orgánicos si no está en place_results
+    for result in data.get('local_results', []):
+        if 'rating' in result:
             comments = []
-            if 'user_reviews' in place_data and 'most_relevant' in place_data['user_reviews']:
-                for review in place_data['user_reviews']['most_relevant']:
+            if 'user_reviews' in result and 'most_relevant' in result['user_reviews']:
+                for review in result['user_reviews']['most_relevant']:
                     comment = {
                         'username': review.get('username'),
                         'rating': review.get('rating'),
@@ -60,31 +75,11 @@ def get_google_maps_rating(api_key, business_name, location=None):
                         'date': review.get('date')
                     }
                     comments.append(comment)
-            
-            return rating, reviews, comments if comments else None
-        
-        # Buscar en resultados orgánicos si no está en place_results
-        for result in data.get('local_results', []):
-            if 'rating' in result:
-                comments = []
-                if 'user_reviews' in result and 'most_relevant' in result['user_reviews']:
-                    for review in result['user_reviews']['most_relevant']:
-                        comment = {
-                            'username': review.get('username'),
-                            'rating': review.get('rating'),
-                            'text': review.get('description'),
-                            'date': review.get('date')
-                        }
-                        comments.append(comment)
-                
-                return result['rating'], result.get('reviews'), comments if comments else None
-        
-        print("No se encontró la calificación en la respuesta. Revisa el archivo serpapi_response.json")
-        return None, None, None
-    
-    except Exception as e:
-        print(f"Error al realizar la solicitud: {str(e)}")
-        return None, None, None
+
+            return result['rating'], result.get('reviews'), comments if comments else None
+
+    print("No se encontró la calificación en la respuesta. Revisa el archivo serpapi_response.json")
+    return None, None, None
 
 def print_comments(comments):
     
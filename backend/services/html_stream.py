@@ -0,0 +1,92 @@
+# services/html_stream.py
+"""
+Lectura de perfiles HTML por streaming con corte temprano.
+
+En lugar de descargar la página completa y construir un árbol DOM para luego buscar un par de valores,
+se lee la respuesta por chunks y:
+- un parser incremental tipo SAX (`html.parser.HTMLParser`, sin DOM) recoge solo los <meta> pedidos;
+  deja de alimentarse apenas los tiene (normalmente al terminar el <head>);
+- las expresiones regulares pedidas se evalúan sobre el texto del <body> que va llegando
+  (con solapamiento entre chunks para no perder coincidencias partidas);
+- la descarga se corta en cuanto se encontró todo o se alcanza `max_bytes`.
+"""
+from typing import Dict, Iterable, Optional, Pattern, Tuple
+from html.parser import HTMLParser
+import codecs
+import re
+
+CHUNK_SIZE = 16 * 1024
+MAX_BYTES = 2 * 1024 * 1024
+_OVERLAP = 256
+_BODY_RX = re.compile(r"<body[\s>]", re.IGNORECASE)
+
+
+class _MetaCollector(HTMLParser):
+    def __init__(self, wanted: Iterable[str]):
+        super().__init__(convert_charrefs=True)
+        self.wanted = set(wanted)
+        self.meta: Dict[str, str] = {}
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "meta":
+            return
+        d = dict(attrs)
+        key = d.get("property") or d.get("name")
+        if key in self.wanted and key not in self.meta and d.get("content") is not None:
+            self.meta[key] = d["content"]
+
+    @property
+    def done(self) -> bool:
+        return len(self.meta) == len(self.wanted)
+
+
+def scan_html_stream(
+    response,
+    meta_keys: Iterable[str] = (),
+    body_patterns: Optional[Dict[str, Pattern]] = None,
+    max_bytes: int = MAX_BYTES,
+    chunk_size: int = CHUNK_SIZE,
+) -> Tuple[Dict[str, str], Dict[str, str], int]:
+    """
+    Consume `response.iter_content` hasta encontrar los <meta> (`meta_keys`) y el grupo 1 de cada
+    patrón de `body_patterns`. Devuelve (meta, coincidencias, bytes_leídos).
+    """
+    body_patterns = body_patterns or {}
+    parser = _MetaCollector(meta_keys)
+    # requests asume ISO-8859-1 para text/* sin charset; en ese caso preferimos UTF-8
+    charset_declared = "charset" in (response.headers.get("content-type") or "").lower()
+    encoding = (response.encoding if charset_declared else None) or "utf-8"
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    found: Dict[str, str] = {}
+    in_body = False
+    tail = ""
+    read = 0
+
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        if not chunk:
+            continue
+        read += len(chunk)
+        text = decoder.decode(chunk)
+
+        if not parser.done:
+            parser.feed(text)
+
+        if body_patterns and len(found) < len(body_patterns):
+            window = tail + text
+            if not in_body:
+                m = _BODY_RX.search(window)
+                if m:
+                    in_body = True
+                    window = window[m.start():]
+            if in_body:
+                for name, rx in body_patterns.items():
+                    if name not in found:
+                        m = rx.search(window)
+                        if m:
+                            found[name] = m.group(1)
+            tail = window[-_OVERLAP:]
+
+        if (parser.done and len(found) == len(body_patterns)) or read >= max_bytes:
+            break
+
+    return parser.meta, found, read
@@ -0,0 +1,179 @@
+# services/http_client.py
+"""
+Capa HTTP compartida por los scrapers.
+
+- Pool de conexiones keep-alive: un único `HTTPAdapter` (urllib3) compartido; cada hilo usa su propia
+  `requests.Session` montada sobre ese adapter (cookies aisladas por hilo, conexiones compartidas).
+- Timeouts de conexión y lectura por defecto (ninguna llamada puede colgarse indefinidamente).
+- Reintentos acotados con backoff exponencial para errores de red y 429/5xx. Retry-After se respeta
+  hasta `HTTP_RETRY_AFTER_MAX` segundos y ninguna espera sobrepasa el `deadline` del llamador.
+- Límite de concurrencia por host (semáforo), para no saturar ni ser bloqueados por una plataforma.
+  El cupo se libera durante las esperas entre reintentos.
+- Los reintentos los hace `get`/`stream_get` (el adapter no reintenta): quien necesite controlar cada
+  intento (p.ej. el rate limit de SerpAPI) pasa `retries=0`.
+
+Para pruebas locales ver `services/fake_upstream.py` (servidor falso de Facebook/Instagram/TikTok/SerpAPI).
+"""
+from typing import Any, Dict, Optional, Tuple
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+import os
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+HTTP_RETRY_AFTER_MAX = float(os.getenv("HTTP_RETRY_AFTER_MAX", "5"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+HTTP_PER_HOST_LIMIT = int(os.getenv("HTTP_PER_HOST_LIMIT", "8"))
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept-Language": "es-EC,es;q=0.9,en;q=0.5",
+}
+
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# sin reintentos en urllib3: los hace `_request`, que suelta el cupo del host mientras espera
+_adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+
+_local = threading.local()
+_host_limits: Dict[str, threading.BoundedSemaphore] = {}
+_host_limits_lock = threading.Lock()
+
+def session() -> requests.Session:
+    """Session del hilo actual, montada sobre el pool de conexiones compartido."""
+    s = getattr(_local, "session", None)
+    if s is None:
+        s = requests.Session()
+        s.mount("http://", _adapter)
+        s.mount("https://", _adapter)
+        s.headers.update(DEFAULT_HEADERS)
+        _local.session = s
+    return s
+
+def _host_semaphore(url: str) -> threading.BoundedSemaphore:
+    host = urllib.parse.urlparse(url).netloc.lower()
+    with _host_limits_lock:
+        sem = _host_limits.get(host)
+        if sem is None:
+            sem = _host_limits[host] = threading.BoundedSemaphore(HTTP_PER_HOST_LIMIT)
+    return sem
+
+def _acquire(sem: threading.BoundedSemaphore, url: str, timeout: Optional[float]) -> None:
+    if not sem.acquire(timeout=READ_TIMEOUT if timeout is None else max(timeout, 0)):
+        raise requests.Timeout(f"Límite de concurrencia alcanzado para {urllib.parse.urlparse(url).netloc}")
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    return None if deadline is None else deadline - time.monotonic()
+
+def _bounded_timeout(timeout: Optional[Any], deadline: Optional[float]) -> Any:
+    """Timeout (connect, read) del intento, recortado a lo que queda hasta `deadline`."""
+    timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+    left = _remaining(deadline)
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise requests.Timeout("Plazo agotado antes de enviar el request")
+    if isinstance(timeout, tuple):
+        return tuple(min(t, left) for t in timeout)
+    return min(timeout, left)
+
+def _backoff(attempt: int, response: Optional[requests.Response]) -> float:
+    """Espera antes del siguiente intento: Retry-After (acotado a HTTP_RETRY_AFTER_MAX) o backoff exponencial."""
+    header = response.headers.get("Retry-After") if response is not None else None
+    if header:
+        try:
+            delay = float(header)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(header).timestamp() - time.time()
+            except (TypeError, ValueError):
+                delay = 0.0
+        return min(max(delay, 0.0), HTTP_RETRY_AFTER_MAX)
+    return HTTP_BACKOFF * (2 ** attempt)
+
+def _request(
+    url: str,
+    params: Optional[Dict[str, Any]],
+    headers: Optional[Dict[str, str]],
+    timeout: Optional[Any],
+    stream: bool,
+    retries: Optional[int],
+    deadline: Optional[float],
+) -> Tuple[requests.Response, threading.BoundedSemaphore]:
+    """
+    GET con reintentos. Devuelve la respuesta con el cupo del host tomado (el llamador lo libera);
+    entre intentos el cupo se suelta, y no se reintenta si la espera no cabe antes de `deadline`.
+    """
+    retries = HTTP_RETRIES if retries is None else retries
+    sem = _host_semaphore(url)
+    attempt = 0
+    while True:
+        _acquire(sem, url, _remaining(deadline))
+        response, error = None, None
+        try:
+            response = session().get(
+                url, params=params, headers=headers, timeout=_bounded_timeout(timeout, deadline), stream=stream
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        except BaseException:
+            sem.release()
+            raise
+        if (error is not None or response.status_code in _RETRY_STATUSES) and attempt < retries:
+            delay = _backoff(attempt, response)
+            left = _remaining(deadline)
+            if left is None or delay < left:
+                if response is not None:
+                    response.close()
+                sem.release()
+                time.sleep(delay)
+                attempt += 1
+                continue
+        if error is not None:
+            sem.release()
+            raise error
+        return response, sem
+
+def get(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[Any] = None,
+    retries: Optional[int] = None,
+    deadline: Optional[float] = None,
+) -> requests.Response:
+    """
+    GET con pool, timeouts (connect, read), reintentos y límite por host. El cuerpo se lee completo.
+    `deadline` (reloj `time.monotonic()`) acota el total: timeouts por intento y esperas entre intentos.
+    """
+    response, sem = _request(url, params, headers, timeout, False, retries, deadline)
+    sem.release()
+    return response
+
+@contextmanager
+def stream_get(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[Any] = None,
+    retries: Optional[int] = None,
+    deadline: Optional[float] = None,
+):
+    """
+    GET en modo streaming: el cuerpo se lee por chunks (`response.iter_content`) y la conexión se
+    cierra al salir del bloque, aunque no se haya descargado completo. Mantiene el cupo del host
+    mientras dura la lectura.
+    """
+    response, sem = _request(url, params, headers, timeout, True, retries, deadline)
+    try:
+        yield response
+    finally:
+        response.close()
+        sem.release()
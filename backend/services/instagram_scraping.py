@@ -1,8 +1,9 @@
-import requests
-from bs4 import BeautifulSoup
 import os
 from dotenv import load_dotenv
 
+from services import http_client
+from services.html_stream import scan_html_stream
+
 load_dotenv()
 
 def get_instagram_stats(business_name):
@@ -19,27 +20,24 @@ def get_instagram_stats(business_name):
     base_url = os.getenv("INSTAGRAM_BASE_URL", "https://www.instagram.com")
     url = f"{base_url}/{business_name}/?__a=1"
     
-    response = requests.get(url)
-    
+    with http_client.stream_get(url) as response:
+        # Solo interesa el <head>: la descarga se corta al encontrar og:description
+        meta = scan_html_stream(response, meta_keys=("og:description",))[0] if response.status_code == 200 else {}
 
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        metadata = soup.find('meta', property='og:description')
+    metadata_content = meta.get('og:description')
+    if metadata_content:
+        stats = {}
 
-        if metadata:
-            metadata_content = metadata['content']
-            stats = {}
-            
-            parts = metadata_content.split(' ')
-            if len(parts) > 4:
-                stats['followers'] = parts[0]
-                stats['posts'] = parts[4]
+        parts = metadata_content.split(' ')
+        if len(parts) > 4:
+            stats['followers'] = parts[0]
+            stats['posts'] = parts[4]
 
-            return {
-                "source": "instagram",
-                "business_name": business_name,
-                "stats": stats
-            }
+        return {
+            "source": "instagram",
+            "business_name": business_name,
+            "stats": stats
+        }
     return {
         "source": "instagram", 
         "business_name": business_name, 
@@ -0,0 +1,32 @@
+# services/kb_migrate.py
+"""
+Migra las colecciones por empresa (`<base>.<empresa>`, esquema KB_TENANCY=collection) a una colección
+compartida con metadata `company` (KB_TENANCY=shared).
+
+Uso:
+    python -m services.kb_migrate --base empresas [--target empresas] [--drop-source]
+
+Reutiliza los vectores existentes (no llama a la API de embeddings) y se puede relanzar sin duplicar.
+Después de migrar, arrancar el servidor con KB_TENANCY=shared.
+"""
+from typing import List, Optional
+import argparse
+import json
+
+from services.knowledge_base import migrate_to_shared
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Migración de colecciones por empresa a una colección compartida")
+    ap.add_argument("--base", default="empresas", help="Nombre base de las colecciones por empresa")
+    ap.add_argument("--target", default=None, help="Colección compartida de destino (por defecto --base)")
+    ap.add_argument("--drop-source", action="store_true", help="Borrar cada colección por empresa ya copiada")
+    args = ap.parse_args(argv)
+
+    stats = migrate_to_shared(
+        args.base, target=args.target, drop_source=args.drop_source,
+        progress=lambda e: print(f"[LOG] {e['collection']} -> {e['company']}: {e['chunks']} chunks", flush=True)
+    )
+    print(json.dumps({k: v for k, v in stats.items() if k != "migrated"}, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
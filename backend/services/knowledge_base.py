@@ -1,51 +1,367 @@
-from typing import List, Dict, Tuple, Optional
-from langchain_openai import OpenAIEmbeddings
+from typing import Any, Callable, List, Dict, Iterable, Iterator, Tuple, Optional, Union
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from fnmatch import fnmatch
+from itertools import islice
+import contextvars
+import hashlib
+import os
+import re
+import threading
+import time
+
+import chromadb
 from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from config.settings import settings
 from services.document_processor import pdf_to_rich_text  # usamos lo que ya hiciste (PDF→texto+OCR)
+from services.timing import stage
+from services.embedding_cache import CachedEmbeddings
+from services.embeddings import build_embeddings
+from services.flat_index import FlatVectorStore
+from services.lexical_index import get_index as _get_lexical_index
 
-# Embeddings (re-usa tu API key del .env)
-_embeddings = OpenAIEmbeddings(
-    model=settings.EMBEDDING_MODEL,
-    openai_api_key=settings.OPENAI_API_KEY
-)
+class _TimedEmbeddings(Embeddings):
+    """Delegado que registra la latencia de cada llamada de embeddings (etapa `kb.embed`)."""
+
+    def __init__(self, inner: Embeddings):
+        self.inner = inner
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with stage("kb.embed"):
+            return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with stage("kb.embed"):
+            return self.inner.embed_query(text)
+
+# Embeddings según EMBEDDING_MODEL (OpenAI, hashing local o sentence-transformers; ver services/embeddings.py);
+# caché por contenido delante: solo los fallos llegan al backend
+_inner_embeddings, EMBEDDING_TAG = build_embeddings(settings.EMBEDDING_MODEL, settings.OPENAI_API_KEY)
+_embeddings = CachedEmbeddings(_TimedEmbeddings(_inner_embeddings), model=EMBEDDING_TAG)
+
+# Colecciones creadas antes del etiquetado se asumen de este modelo (el default histórico)
+LEGACY_EMBEDDING_MODEL = os.getenv("LEGACY_EMBEDDING_MODEL", "text-embedding-3-small")
+
+class EmbeddingModelMismatch(ValueError):
+    """La colección fue indexada con otro modelo de embeddings: sus vectores no son comparables."""
+
+def embedding_cache_stats() -> Dict:
+    return _embeddings.stats()
 
 # Text splitter recomendado (mejor que CharacterTextSplitter)
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 150
 _text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,
-    chunk_overlap=150,
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
     separators=["\n\n", "\n", ". ", " ", ""],
 )
+# Forma parte del ID de cada chunk: si cambian los parámetros del splitter, los IDs cambian
+_SPLITTER_SIGNATURE = f"recursive:{CHUNK_SIZE}:{CHUNK_OVERLAP}"
 
-def _get_vs(collection_name: str) -> Chroma:
-    return Chroma(
-        collection_name=collection_name,
-        persist_directory=settings.VECTOR_DIR,
-        embedding_function=_embeddings
-    )
+# Textos de presentación de cada chunk. Se calculan al leer el chunk y no se guardan en la ingesta:
+# con CHUNK_SIZE (1000) <= KB_EXCERPT_CHARS el extracto es el propio chunk y el preview es un recorte
+# del texto, así que guardarlos solo duplicaba hasta 900 caracteres por chunk en la metadata de Chroma
+# y en el índice léxico, sin ahorrar trabajo al responder (recortar un string es despreciable frente a la consulta).
+# - `chunk_preview`: fragmento para mostrar en las fuentes (KB_PREVIEW_CHARS, 900 como siempre).
+# - `chunk_excerpt`: extracto para el prompt del RAG (primeros KB_EXCERPT_PARTS sub-fragmentos de hasta
+#   KB_EXCERPT_CHARS); solo trocea chunks más largos que KB_EXCERPT_CHARS.
+KB_PREVIEW_CHARS = int(os.getenv("KB_PREVIEW_CHARS", "900"))
+KB_EXCERPT_CHARS = 1200
+KB_EXCERPT_PARTS = 2
+_excerpt_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=KB_EXCERPT_CHARS, chunk_overlap=100, separators=["\n\n", "\n", ". ", " ", ""]
+)
+
+def chunk_preview(doc: Document, chars: int = KB_PREVIEW_CHARS) -> str:
+    """Primeros `chars` caracteres del chunk (con "..." si se recortó)."""
+    text = doc.page_content
+    return text if len(text) <= chars else text[:chars] + "..."
+
+def chunk_excerpt(doc: Document) -> str:
+    """Extracto del chunk para el prompt."""
+    text = doc.page_content
+    if len(text) <= KB_EXCERPT_CHARS:
+        return text
+    return "\n".join(_excerpt_splitter.split_text(text)[:KB_EXCERPT_PARTS])
+
+# Metadata de presentación que guardaban versiones anteriores de la ingesta (no se devuelve a los clientes)
+SNIPPET_KEYS = ("preview", "excerpt")
+
+def chunk_id(source: str, text: str, tenant: Optional[str] = None) -> str:
+    """ID determinista de un chunk: mismo origen + mismo texto + mismo splitter (+ empresa) => mismo ID."""
+    key = f"{_SPLITTER_SIGNATURE}\x00{source}\x00{text}"
+    if tenant:
+        key = f"{tenant}\x00{key}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def content_source(data: Union[str, bytes], kind: str = "texto") -> str:
+    """
+    Origen derivado del contenido, para documentos sin nombre propio (filas .jsonl sin `source`, PDFs sin
+    nombre). Dos documentos distintos nunca comparten origen, así la limpieza de chunks viejos de un
+    origen re-ingestado no puede borrar los de otro documento.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return f"{kind}:{hashlib.sha256(data).hexdigest()[:16]}"
+
+# Multi-tenant: con KB_TENANCY=shared todas las empresas van a UNA colección (`<base>`) y cada chunk lleva
+# `company` en su metadata; las búsquedas filtran por ese campo. Con "collection" (legado) cada empresa
+# tiene su propia colección `<base>.<empresa>`. `migrate_to_shared` pasa del esquema legado al compartido.
+KB_TENANCY = os.getenv("KB_TENANCY", "collection")
+
+def _scope(collection: str, tenant: Optional[str]) -> str:
+    """Clave de la empresa dentro de la colección (índice léxico, generaciones, caché). '/' no es válido en Chroma."""
+    return f"{collection}/{tenant}" if tenant else collection
+
+def _where(tenant: Optional[str], **extra) -> Optional[Dict]:
+    clauses = [{k: v} for k, v in extra.items()] + ([{"company": tenant}] if tenant else [])
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+# Registro de handles de Chroma del proceso: un único PersistentClient (una sola apertura del
+# SQLite de VECTOR_DIR) y un handle por colección, creado bajo demanda y con desalojo LRU
+# (las colecciones por empresa pueden ser muchas).
+KB_MAX_OPEN_COLLECTIONS = int(os.getenv("KB_MAX_OPEN_COLLECTIONS", "64"))
+# Colecciones nuevas cuyo nombre calza con estos patrones (separados por coma, p. ej. "empresas.*") usan el
+# backend flat (services/flat_index.py): matriz mapeada en memoria + búsqueda exacta, sin abrir Chroma.
+# Las colecciones que ya existen siguen en el backend donde se crearon.
+KB_FLAT_COLLECTIONS = [p.strip() for p in os.getenv("KB_FLAT_COLLECTIONS", "").split(",") if p.strip()]
+
+_client = None
+_vs_handles: "OrderedDict[str, Union[Chroma, FlatVectorStore]]" = OrderedDict()
+_vs_lock = threading.Lock()
+
+def _get_client():
+    global _client
+    if _client is None:
+        _client = chromadb.PersistentClient(path=settings.VECTOR_DIR)
+    return _client
+
+def _flat_path(collection_name: str) -> str:
+    return os.path.join(settings.VECTOR_DIR, "flat", collection_name)
+
+def _uses_flat(collection_name: str) -> bool:
+    if FlatVectorStore.exists(_flat_path(collection_name)):
+        return True
+    if not any(fnmatch(collection_name, p) for p in KB_FLAT_COLLECTIONS):
+        return False
+    try:
+        _get_client().get_collection(collection_name)
+        return False                       # ya existe en Chroma: se queda ahí
+    except Exception:
+        return True
+
+def _check_embedding_tag(collection_name: str, collection) -> None:
+    """Etiqueta la colección con su modelo de embeddings y rechaza mezclar modelos."""
+    metadata = dict(collection.metadata or {})
+    tag = metadata.get("embedding_model")
+    if tag is None:
+        tag = LEGACY_EMBEDDING_MODEL if collection.count() else EMBEDDING_TAG
+        metadata = {k: v for k, v in metadata.items() if not k.startswith("hnsw:")}
+        collection.modify(metadata={**metadata, "embedding_model": tag})
+    if tag != EMBEDDING_TAG:
+        raise EmbeddingModelMismatch(
+            f"La colección '{collection_name}' usa embeddings '{tag}' y el servidor '{EMBEDDING_TAG}'; "
+            "re-ingesta en otra colección o ajusta EMBEDDING_MODEL"
+        )
+
+def _get_vs(collection_name: str) -> Union[Chroma, FlatVectorStore]:
+    with _vs_lock:
+        vs = _vs_handles.get(collection_name)
+        if vs is not None:
+            _vs_handles.move_to_end(collection_name)
+            return vs
+        if _uses_flat(collection_name):
+            vs = FlatVectorStore(_flat_path(collection_name), embedding_function=_embeddings)
+        else:
+            vs = Chroma(
+                client=_get_client(),
+                collection_name=collection_name,
+                embedding_function=_embeddings
+            )
+        _check_embedding_tag(collection_name, _as_store(vs))
+        _vs_handles[collection_name] = vs
+        while len(_vs_handles) > KB_MAX_OPEN_COLLECTIONS:
+            _vs_handles.popitem(last=False)
+        return vs
+
+def _as_store(vs):
+    """Colección de bajo nivel (get/upsert/delete/count): `chromadb.Collection` o el propio FlatVectorStore."""
+    return vs if isinstance(vs, FlatVectorStore) else vs._collection
+
+def _get_store(collection_name: str):
+    return _as_store(_get_vs(collection_name))
+
+# Ingesta por lotes: los chunks se generan de forma perezosa, se embeben en lotes de
+# KB_EMBED_BATCH_SIZE con hasta KB_EMBED_CONCURRENCY requests en vuelo y cada lote se escribe
+# en Chroma apenas termina (memoria acotada a unos pocos lotes, sin importar el tamaño del corpus).
+KB_EMBED_BATCH_SIZE = int(os.getenv("KB_EMBED_BATCH_SIZE", "64"))
+KB_EMBED_CONCURRENCY = int(os.getenv("KB_EMBED_CONCURRENCY", "4"))
+
+_embed_executor = ThreadPoolExecutor(max_workers=KB_EMBED_CONCURRENCY, thread_name_prefix="kb-embed")
 
-def _to_documents(texts: List[str], sources: Optional[List[str]]=None, meta: Optional[List[Dict]]=None) -> List[Document]:
-    docs: List[Document] = []
+def _to_documents(texts: Iterable[str], sources: Optional[List[str]]=None, meta: Optional[List[Dict]]=None) -> Iterator[Document]:
     for i, txt in enumerate(texts):
         metadata = {}
         if sources and i < len(sources):
             metadata["source"] = sources[i]
         if meta and i < len(meta):
             metadata.update(meta[i])
-        docs.append(Document(page_content=txt, metadata=metadata))
-    return docs
+        yield Document(page_content=txt, metadata=metadata)
 
-def ingest_texts(collection: str, texts: List[str], sources: Optional[List[str]]=None, meta: Optional[List[Dict]]=None) -> Dict:
-    vs = _get_vs(collection)
-    docs = _to_documents(texts, sources, meta)
-    # chunking
-    chunks = _text_splitter.split_documents(docs)
-    vs.add_documents(chunks)
-    vs.persist()
-    return {"ingested_docs": len(docs), "chunks": len(chunks)}
+def _iter_chunks(docs: Iterable[Document], counts: Dict[str, int], tenant: Optional[str] = None) -> Iterator[Document]:
+    for doc in docs:
+        counts["docs"] += 1
+        for i, chunk in enumerate(_text_splitter.split_documents([doc])):
+            chunk.metadata["chunk"] = i          # Chroma no acepta metadatos vacíos
+            if tenant:
+                chunk.metadata["company"] = tenant
+            yield chunk
+
+def _batches(chunks: Iterator[Document], size: int) -> Iterator[List[Document]]:
+    while True:
+        batch = list(islice(chunks, size))
+        if not batch:
+            return
+        yield batch
+
+def _embed_batch(batch: List[Tuple[str, Document]]) -> Tuple[List[Tuple[str, Document]], List[List[float]]]:
+    return batch, _embeddings.embed_documents([c.page_content for _, c in batch])
+
+def _new_chunks(store, batch: List[Document], seen: Dict[str, set], tenant: Optional[str] = None) -> List[Tuple[str, Document]]:
+    """IDs del lote; descarta los chunks que ya están en la colección (sin cambios => no se re-embeben)."""
+    by_id: Dict[str, Document] = {}
+    for c in batch:
+        source = c.metadata.get("source", "")
+        cid = chunk_id(source, c.page_content, tenant)
+        if source:
+            seen.setdefault(source, set()).add(cid)
+        by_id.setdefault(cid, c)
+    existing = set(store.get(ids=list(by_id), include=[])["ids"])
+    return [(cid, c) for cid, c in by_id.items() if cid not in existing]
+
+def _delete_stale(collection: str, store, seen: Dict[str, set], tenant: Optional[str] = None) -> int:
+    """Re-ingesta de un origen: borra los chunks que ese origen tenía (en esa empresa) y ya no produce."""
+    deleted = 0
+    for source, ids in seen.items():
+        stale = [i for i in store.get(where=_where(tenant, source=source), include=[])["ids"] if i not in ids]
+        if stale:
+            store.delete(ids=stale)
+            _lexical().delete(_scope(collection, tenant), stale)
+            deleted += len(stale)
+    return deleted
+
+# -------------------- Índice léxico (BM25) --------------------
+
+_lexical_ready: set = set()
+_lexical_ready_lock = threading.Lock()
+
+def _lexical():
+    return _get_lexical_index(settings.VECTOR_DIR)
+
+def _ensure_lexical(collection: str, store=None, tenant: Optional[str] = None) -> None:
+    """
+    Colecciones (o empresas) creadas antes del índice léxico: se indexan una vez desde Chroma. El scope
+    queda marcado como listo solo si la copia terminó (si falla, el próximo uso la reintenta).
+    """
+    scope = _scope(collection, tenant)
+    with _lexical_ready_lock:
+        if scope in _lexical_ready:
+            return
+    store = store or _get_store(collection)
+    where = _where(tenant)
+    total = len(store.get(where=where, include=[])["ids"]) if where else store.count()
+    if _lexical().count(scope) < total:
+        offset = 0
+        while True:
+            page = store.get(where=where, include=["documents", "metadatas"], limit=1000, offset=offset)
+            if not page["ids"]:
+                break
+            _lexical().upsert(scope, page["ids"], page["documents"], page["metadatas"])
+            offset += len(page["ids"])
+    with _lexical_ready_lock:
+        _lexical_ready.add(scope)
+
+def ingest_documents(
+    collection: str,
+    docs: Iterable[Document],
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    batch_size: int = KB_EMBED_BATCH_SIZE,
+    concurrency: int = KB_EMBED_CONCURRENCY,
+    tenant: Optional[str] = None,
+) -> Dict:
+    """
+    Trocea, embebe y escribe `docs` (iterable perezoso) por lotes. La ingesta es incremental:
+    los chunks tienen ID determinista (`chunk_id`), los que ya existen no se re-embeben y, al final,
+    se borran los chunks viejos de cada `source` re-ingestado que ya no aparecen. Por eso `source` debe
+    identificar al documento (nombre de archivo, URL, `content_source`), nunca un valor genérico;
+    los documentos sin `source` no participan de esa limpieza.
+    `progress`, si se entrega, recibe los contadores después de cada lote.
+    `tenant` marca los chunks con `company` (colección compartida entre empresas).
+    """
+    store = _get_store(collection)
+    scope = _scope(collection, tenant)
+    _ensure_lexical(collection, store, tenant)
+    counts = {"docs": 0, "chunks": 0, "written": 0, "skipped": 0, "deleted": 0, "batches": 0}
+    seen: Dict[str, set] = {}
+    inflight = set()
+
+    def _write(fut) -> None:
+        batch, vectors = fut.result()
+        ids = [cid for cid, _ in batch]
+        texts = [c.page_content for _, c in batch]
+        metadatas = [c.metadata for _, c in batch]
+        store.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+        _lexical().upsert(scope, ids, texts, metadatas)
+        counts["written"] += len(batch)
+        counts["batches"] += 1
+        if progress:
+            progress(dict(counts))
+
+    with stage("kb.ingest"):
+        try:
+            for batch in _batches(_iter_chunks(docs, counts, tenant), batch_size):
+                counts["chunks"] += len(batch)
+                pending = _new_chunks(store, batch, seen, tenant)
+                counts["skipped"] += len(batch) - len(pending)
+                if not pending:
+                    if progress:
+                        progress(dict(counts))
+                    continue
+                # copy_context: `kb.embed` se sigue registrando en el colector del request
+                inflight.add(_embed_executor.submit(contextvars.copy_context().run, _embed_batch, pending))
+                while len(inflight) >= max(1, concurrency):
+                    done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        _write(fut)
+            while inflight:
+                done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    _write(fut)
+        finally:
+            for fut in inflight:
+                fut.cancel()
+            _bump_generation(collection, scope)
+        counts["deleted"] = _delete_stale(collection, store, seen, tenant)
+        if counts["deleted"]:
+            _bump_generation(collection, scope)
+    return {"ingested_docs": counts["docs"], **{k: v for k, v in counts.items() if k != "docs"}}
+
+def ingest_texts(
+    collection: str,
+    texts: Iterable[str],
+    sources: Optional[List[str]]=None,
+    meta: Optional[List[Dict]]=None,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    tenant: Optional[str] = None,
+) -> Dict:
+    return ingest_documents(collection, _to_documents(texts, sources, meta), progress=progress, tenant=tenant)
 
 def ingest_text_files(collection: str, files: List[Tuple[str, bytes]]) -> Dict:
     texts, sources = [], []
@@ -58,28 +374,198 @@ def ingest_text_files(collection: str, files: List[Tuple[str, bytes]]) -> Dict:
         sources.append(path)
     return ingest_texts(collection, texts, sources)
 
-def ingest_pdf_bytes(collection: str, pdf_bytes: bytes, prompt: Optional[str]=None, source_name: str="uploaded.pdf") -> Dict:
-    """Usa tu pipeline PDF→TextoNativo+OCR y vectoriza el 'combined_text'."""
-    result = pdf_to_rich_text(pdf_bytes, prompt=prompt or
-        "Eres un OCR para documentos financieros. Extrae todo el texto visible y describe imágenes relevantes.")
+def ingest_pdf_bytes(collection: str, pdf_bytes: bytes, prompt: Optional[str]=None, source_name: Optional[str]=None) -> Dict:
+    """
+    Usa tu pipeline PDF→TextoNativo+OCR y vectoriza el 'combined_text'.
+    `prompt` se acepta por compatibilidad; el OCR de `document_processor` usa su propio prompt.
+    Sin `source_name` el origen se deriva del contenido del PDF (re-subir otro PDF no reemplaza a este).
+    """
+    result = pdf_to_rich_text(pdf_bytes)
     combined = result.get("combined_text", "")
     if not combined.strip():
         return {"ingested_docs": 0, "chunks": 0, "note": "PDF sin texto/OCR vacío"}
     return ingest_texts(
         collection,
         [combined],
-        sources=[source_name],
-        meta=[{"native_chars": result["native_text_chars"], "ocr_chars": result["ocr_text_chars"]}]
+        sources=[source_name or content_source(pdf_bytes, "pdf")],
+        meta=[{"native_chars": result["native_chars"], "ocr_chars": result["ocr_chars"]}]
     )
 
-def query(collection: str, q: str, k: int = 3) -> Dict:
+# Modos de recuperación:
+# - "vector": similaridad de embeddings en Chroma.
+# - "lexical": BM25 sobre el índice léxico local (sin embeddings ni red; ideal para códigos, RUC, nombres).
+# - "hybrid": ambos, fusionados por reciprocal rank fusion (RRF).
+# Solo el score vectorial es una relevancia calibrada (comparable entre consultas, apta para umbrales).
+# BM25 no tiene escala fija: en "lexical" el score es relativo a la mejor coincidencia de la consulta
+# (1.0 = la mejor) y en "hybrid" es el RRF normalizado (1.0 = primero en ambas listas). Esos modos
+# no se filtran por umbral: que haya coincidencias ya es la señal.
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+THRESHOLD_MODES = ("vector",)
+KB_RETRIEVAL_MODE = os.getenv("KB_RETRIEVAL_MODE", "vector")
+_RRF_K = 60
+
+def _vector_search(collection: str, q: str, k: int, tenant: Optional[str] = None) -> List[Tuple[Document, float]]:
     vs = _get_vs(collection)
-    results = vs.similarity_search_with_relevance_scores(q, k=k)
+    where = _where(tenant)
+    try:
+        return [(doc, float(score)) for doc, score in vs.similarity_search_with_relevance_scores(q, k=k, filter=where)]
+    except Exception:
+        return [(doc, 0.0) for doc in vs.similarity_search(q, k=k, filter=where)]
+
+def _lexical_search(collection: str, q: str, k: int, tenant: Optional[str] = None) -> List[Tuple[Document, float]]:
+    _ensure_lexical(collection, tenant=tenant)
+    rows = _lexical().search(_scope(collection, tenant), q, k)
+    top = rows[0][3] if rows and rows[0][3] > 0 else 1.0
+    return [(Document(page_content=text, metadata=meta), score / top) for _, text, meta, score in rows]
+
+def _hybrid_search(collection: str, q: str, k: int, tenant: Optional[str] = None) -> List[Tuple[Document, float]]:
+    n = max(k * 4, 10)
+    fused: Dict[str, List] = {}        # chunk_id -> [rrf, doc]
+    for results in (_vector_search(collection, q, n, tenant), _lexical_search(collection, q, n, tenant)):
+        for rank, (doc, _) in enumerate(results, start=1):
+            cid = chunk_id(doc.metadata.get("source", ""), doc.page_content)
+            entry = fused.setdefault(cid, [0.0, doc])
+            entry[0] += 1.0 / (_RRF_K + rank)
+    ranked = sorted(fused.values(), key=lambda e: e[0], reverse=True)[:k]
+    best = 2.0 / (_RRF_K + 1)
+    return [(doc, rrf / best) for rrf, doc in ranked]
+
+_SEARCHERS = {"vector": _vector_search, "lexical": _lexical_search, "hybrid": _hybrid_search}
+
+# Caché de recuperación (LRU + TTL) por (colección[/empresa], generación, modo, consulta normalizada, k).
+# Cada ingesta incrementa la generación de su colección: los resultados viejos dejan de coincidir
+# y salen por LRU/TTL. El contador es del proceso (ingestas hechas por otro proceso se ven al vencer el TTL).
+KB_QUERY_CACHE_SIZE = int(os.getenv("KB_QUERY_CACHE_SIZE", "1024"))
+KB_QUERY_CACHE_TTL = float(os.getenv("KB_QUERY_CACHE_TTL", "600"))
+
+_generations: Dict[str, int] = {}
+_query_cache: "OrderedDict[Tuple, Tuple[float, List[Tuple[Document, float]]]]" = OrderedDict()
+_query_lock = threading.Lock()
+_query_stats = {"hits": 0, "misses": 0}
+
+def _bump_generation(*scopes: str) -> None:
+    with _query_lock:
+        for scope in set(scopes):
+            _generations[scope] = _generations.get(scope, 0) + 1
+
+def _normalize_query(q: str) -> str:
+    return re.sub(r"\s+", " ", q or "").strip().lower()
+
+def search_with_scores(
+    collection: str, q: str, k: int = 3, mode: Optional[str] = None, tenant: Optional[str] = None
+) -> List[Tuple[Document, float]]:
+    """
+    Top-k (documento, relevancia) de la colección según `mode` (por defecto KB_RETRIEVAL_MODE),
+    servido desde la caché si la colección no cambió. Con `tenant`, solo chunks de esa empresa.
+    """
+    scope = _scope(collection, tenant)
+    mode = mode or KB_RETRIEVAL_MODE
+    if mode not in _SEARCHERS:
+        raise ValueError(f"Modo de recuperación inválido: {mode} (usa {', '.join(RETRIEVAL_MODES)})")
+    with _query_lock:
+        key = (scope, _generations.get(scope, 0), mode, _normalize_query(q), k)
+        entry = _query_cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            _query_cache.move_to_end(key)
+            _query_stats["hits"] += 1
+            return list(entry[1])
+        _query_stats["misses"] += 1
+
+    with stage("kb.query"):
+        results = _SEARCHERS[mode](collection, q, k, tenant)
+
+    with _query_lock:
+        # si hubo una ingesta mientras se buscaba, la clave ya quedó vieja y no se volverá a pedir
+        _query_cache[key] = (time.monotonic() + KB_QUERY_CACHE_TTL, results)
+        _query_cache.move_to_end(key)
+        while len(_query_cache) > KB_QUERY_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+    return list(results)
+
+def query_cache_stats() -> Dict:
+    with _query_lock:
+        total = _query_stats["hits"] + _query_stats["misses"]
+        return {
+            **_query_stats,
+            "entries": len(_query_cache),
+            "max_entries": KB_QUERY_CACHE_SIZE,
+            "ttl_s": KB_QUERY_CACHE_TTL,
+            "hit_rate": round(_query_stats["hits"] / total, 4) if total else None,
+            "generations": dict(_generations),
+        }
+
+def query(collection: str, q: str, k: int = 3, mode: Optional[str] = None, tenant: Optional[str] = None) -> Dict:
+    results = search_with_scores(collection, q, k=k, mode=mode, tenant=tenant)
     out = []
     for doc, score in results:
         out.append({
             "text": doc.page_content,
-            "metadata": doc.metadata,
+            "metadata": {k: v for k, v in doc.metadata.items() if k not in SNIPPET_KEYS},
             "score": score
         })
-    return {"matches": out, "k": k, "collection": collection, "query": q}
+    result = {"matches": out, "k": k, "collection": collection, "query": q, "mode": mode or KB_RETRIEVAL_MODE}
+    if tenant:
+        result["company"] = tenant
+    return result
+
+# -------------------- Migración a colección compartida --------------------
+
+def migrate_to_shared(
+    base: str = "empresas",
+    target: Optional[str] = None,
+    drop_source: bool = False,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict:
+    """
+    Copia cada colección por empresa `<base>.<empresa>` a la colección compartida `target` (por defecto
+    `<base>`) con `company=<empresa>`. Reutiliza los vectores ya calculados (no re-embebe: las colecciones
+    de origen deben ser del modelo actual) y es idempotente (IDs deterministas por empresa).
+    Con `drop_source` borra cada colección de origen una vez copiada.
+    """
+    target = target or base
+    prefix = f"{base}."
+    client = _get_client()
+    flat_dir = os.path.join(settings.VECTOR_DIR, "flat")
+    names = sorted(
+        n for n in {
+            *(getattr(c, "name", c) for c in client.list_collections()),
+            *(os.listdir(flat_dir) if os.path.isdir(flat_dir) else []),
+        }
+        if n.startswith(prefix) and n != target
+    )
+    dest = _get_store(target)
+    migrated = []
+    for name in names:
+        tenant = name[len(prefix):]
+        source = _get_store(name)          # valida que el modelo de embeddings coincida
+        scope = _scope(target, tenant)
+        copied, offset = 0, 0
+        while True:
+            page = source.get(
+                include=["documents", "metadatas", "embeddings"], limit=KB_EMBED_BATCH_SIZE * 8, offset=offset
+            )
+            if not len(page["ids"]):
+                break
+            metadatas = [{**(m or {}), "company": tenant} for m in page["metadatas"]]
+            ids = [chunk_id(m.get("source", ""), d, tenant) for m, d in zip(metadatas, page["documents"])]
+            dest.upsert(ids=ids, embeddings=page["embeddings"], documents=page["documents"], metadatas=metadatas)
+            _lexical().upsert(scope, ids, page["documents"], metadatas)
+            copied += len(ids)
+            offset += len(page["ids"])
+        _bump_generation(target, scope)
+        if drop_source:
+            with _vs_lock:
+                _vs_handles.pop(name, None)
+            if isinstance(source, FlatVectorStore):
+                source.drop()
+            else:
+                client.delete_collection(name)
+            _lexical().drop(name)
+            with _lexical_ready_lock:
+                _lexical_ready.discard(name)
+            _bump_generation(name)
+        entry = {"collection": name, "company": tenant, "chunks": copied, "dropped": drop_source}
+        migrated.append(entry)
+        if progress:
+            progress(entry)
+    return {"target": target, "companies": len(migrated), "chunks": sum(m["chunks"] for m in migrated), "migrated": migrated}
@@ -0,0 +1,116 @@
+# services/lexical_index.py
+"""
+Índice léxico (BM25) local de los chunks de cada colección de la KB.
+
+Usa SQLite FTS5 (índice invertido + ranking `bm25()` nativo), en un archivo junto a la base vectorial.
+`knowledge_base` lo mantiene en cada ingesta (mismos IDs de chunk que Chroma) y lo usa en los modos de
+recuperación `lexical` e `hybrid`. Útil para búsquedas exactas (códigos de cuenta del SRI, RUC, nombres
+de cursos): responde sin embeddings ni red.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import json
+import os
+import re
+import sqlite3
+import threading
+
+_TOKEN_RX = re.compile(r"\w+", re.UNICODE)
+
+
+def _match_expression(q: str) -> Optional[str]:
+    """
+    Consulta libre -> expresión FTS5. Cada término separado por espacios es una frase (así
+    '1.01.02' o 'AWS-IA' exigen sus partes contiguas); los términos se combinan con OR y BM25 ordena.
+    """
+    terms = []
+    for raw in (q or "").split():
+        tokens = _TOKEN_RX.findall(raw)
+        if tokens:
+            terms.append('"' + " ".join(tokens) + '"')
+    return " OR ".join(terms) if terms else None
+
+
+class LexicalIndex:
+    """
+    `lexical_chunks` mapea (colección, chunk_id) -> rowid; `lexical_fts` guarda el texto indexado con ese
+    mismo rowid, así altas y bajas por chunk_id van por índice y no recorren la tabla FTS.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS lexical_chunks ("
+            " id INTEGER PRIMARY KEY, collection TEXT NOT NULL, chunk_id TEXT NOT NULL, metadata TEXT NOT NULL,"
+            " UNIQUE (collection, chunk_id))"
+        )
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS lexical_fts USING fts5(text, tokenize='unicode61 remove_diacritics 2')"
+        )
+        self._conn.commit()
+
+    def _delete(self, collection: str, ids: Iterable[str]) -> None:
+        for cid in ids:
+            row = self._conn.execute(
+                "SELECT id FROM lexical_chunks WHERE collection=? AND chunk_id=?", (collection, cid)
+            ).fetchone()
+            if row:
+                self._conn.execute("DELETE FROM lexical_fts WHERE rowid=?", row)
+                self._conn.execute("DELETE FROM lexical_chunks WHERE id=?", row)
+
+    def upsert(self, collection: str, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._delete(collection, ids)
+            for cid, text, meta in zip(ids, texts, metadatas):
+                cur = self._conn.execute(
+                    "INSERT INTO lexical_chunks (collection, chunk_id, metadata) VALUES (?, ?, ?)",
+                    (collection, cid, json.dumps(meta or {}, ensure_ascii=False))
+                )
+                self._conn.execute("INSERT INTO lexical_fts (rowid, text) VALUES (?, ?)", (cur.lastrowid, text))
+            self._conn.commit()
+
+    def delete(self, collection: str, ids: Iterable[str]) -> None:
+        with self._lock:
+            self._delete(collection, ids)
+            self._conn.commit()
+
+    def drop(self, collection: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM lexical_fts WHERE rowid IN (SELECT id FROM lexical_chunks WHERE collection=?)", (collection,)
+            )
+            self._conn.execute("DELETE FROM lexical_chunks WHERE collection=?", (collection,))
+            self._conn.commit()
+
+    def count(self, collection: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM lexical_chunks WHERE collection=?", (collection,)
+            ).fetchone()[0]
+
+    def search(self, collection: str, q: str, k: int) -> List[Tuple[str, str, Dict[str, Any], float]]:
+        """Top-k (chunk_id, texto, metadata, score BM25) ordenado de mejor a peor; el score es positivo y sin escala fija."""
+        expr = _match_expression(q)
+        if not expr:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.chunk_id, f.text, c.metadata, bm25(lexical_fts) AS rank"
+                " FROM lexical_fts f JOIN lexical_chunks c ON c.id = f.rowid"
+                " WHERE lexical_fts MATCH ? AND c.collection=? ORDER BY rank LIMIT ?",
+                (expr, collection, k)
+            ).fetchall()
+        # bm25() es negativo (más negativo = mejor)
+        return [(cid, text, json.loads(meta), -rank) for cid, text, meta, rank in rows]
+
+
+_indexes: Dict[str, LexicalIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_index(vector_dir: str) -> LexicalIndex:
+    with _indexes_lock:
+        if vector_dir not in _indexes:
+            _indexes[vector_dir] = LexicalIndex(os.path.join(vector_dir, "lexical.sqlite3"))
+        return _indexes[vector_dir]
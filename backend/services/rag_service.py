@@ -1,18 +1,15 @@
-from typing import Dict, List, Optional
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from typing import Optional
+from langchain_core.messages import HumanMessage, SystemMessage, AIMessage, messages_from_dict, messages_to_dict
 
-from config.settings import settings
-from services.knowledge_base import _get_vs  # usamos tu mismo acceso a Chroma
+from services.ai_analyzer import _llm    # mismo cliente LLM (pool HTTP) que /chat
+from services.knowledge_base import SNIPPET_KEYS, chunk_excerpt, chunk_preview, search_with_scores  # usamos tu mismo acceso a Chroma (con caché)
+from services.session_store import get_store
+from services.timing import stage
 
-# Memoria simple por sesión (historial breve para el RAG)
-_rag_history: Dict[str, List] = {}
-
-# Limitamos el contexto para no exceder tokens
-_CTX_SPLITTER = RecursiveCharacterTextSplitter(
-    chunk_size=1200, chunk_overlap=100, separators=["\n\n", "\n", ". ", " ", ""]
-)
+# Memoria simple por sesión (historial breve para el RAG), en el almacén acotado de sesiones
+_RAG_HISTORY_MESSAGES = 6
+_RAG_PREVIEW_CHARS = 300       # preview de las fuentes que devuelve /rag (más corto que el de /chat)
+_rag_sessions = get_store("rag")
 
 SYSTEM_PROMPT = """Eres "AlfaTech", asistente para análisis de riesgo de PYMEs en Ecuador.
 Responde con tono formal, claro y empático. Usa SOLO el contexto proporcionado.
@@ -20,44 +17,33 @@ Si la respuesta no está en el contexto, di: "No encuentro esa información en l
 Cuando corresponda, incluye un breve "Próximos pasos". Evita inventar datos."""
 
 def _format_context(docs) -> str:
-    # Une los top-k fragmentos y (opcional) recorta si son muy largos
-    parts = []
-    for i, d in enumerate(docs, start=1):
-        txt = d.page_content
-        # “sanitizar” largo
-        chunks = _CTX_SPLITTER.split_text(txt)
-        merged = "\n".join(chunks[:2])  # 2 sub-chunks por doc como tope suave
-        src = d.metadata.get("source", f"doc_{i}")
-        parts.append(f"[Fuente: {src}]\n{merged}")
-    return "\n\n".join(parts)
+    # Une los top-k fragmentos; el extracto de cada uno va acotado para no exceder tokens (chunk_excerpt)
+    return "\n\n".join(
+        f"[Fuente: {d.metadata.get('source', f'doc_{i}')}]\n{chunk_excerpt(d)}"
+        for i, d in enumerate(docs, start=1)
+    )
 
 def rag_answer(
     session_id: str,
     question: str,
     collection: str = "cursos",
     k: int = 3,
+    mode: Optional[str] = None,
 ) -> dict:
     """
     Recupera top-k del VS, construye prompt con contexto + historial corto y responde.
     Devuelve la respuesta y las fuentes.
     """
     # 1) Recuperación
-    vs = _get_vs(collection)
-    docs = vs.similarity_search(question, k=k)
+    docs = [doc for doc, _ in search_with_scores(collection, question, k=k, mode=mode)]
 
     context = _format_context(docs) if docs else ""
 
-    # 2) Modelo de chat
-    llm = ChatOpenAI(
-        model=settings.MODEL_NAME,
-        openai_api_key=settings.OPENAI_API_KEY,
-        temperature=settings.TEMPERATURE,
-    )
-
-    # 3) Historial por sesión (opcional, breve)
-    history = _rag_history.get(session_id, [])[-6:]  # últimos 6 mensajes
+    # 2) Historial por sesión (opcional, breve)
+    state = _rag_sessions.load(session_id)
+    history = messages_from_dict(state["messages"]) if state else []  # últimos 6 mensajes
 
-    # 4) Construcción de mensajes
+    # 3) Construcción de mensajes
     messages = [SystemMessage(content=SYSTEM_PROMPT)]
 
     # Inyecta historial
@@ -72,22 +58,24 @@ def rag_answer(
     )
     messages.append(HumanMessage(content=human_text))
 
-    # 5) Invocación
-    ai = llm.invoke(messages)
+    # 4) Invocación
+    with stage("llm.rag"):
+        ai = _llm.invoke(messages)
 
-    # 6) Actualiza historial
-    history = _rag_history.get(session_id, [])
-    history.append(HumanMessage(content=question))
-    history.append(AIMessage(content=ai.content))
-    _rag_history[session_id] = history
+    # 5) Actualiza historial (solo se usan los últimos mensajes: no se guarda más que eso).
+    #    Sobre el estado vigente, atómico: otro request de la misma sesión pudo escribir mientras tanto
+    turn = messages_to_dict([HumanMessage(content=question), AIMessage(content=ai.content)])
+    _rag_sessions.update(session_id, lambda current: {
+        "messages": ((current or {}).get("messages", []) + turn)[-_RAG_HISTORY_MESSAGES:]
+    })
 
-    # 7) Empaqueta fuentes
+    # 6) Empaqueta fuentes
     sources = []
     for d in docs:
         sources.append({
             "source": d.metadata.get("source"),
-            "meta": {k: v for k, v in d.metadata.items() if k != "source"},
-            "preview": d.page_content[:300] + ("..." if len(d.page_content) > 300 else "")
+            "meta": {k: v for k, v in d.metadata.items() if k != "source" and k not in SNIPPET_KEYS},
+            "preview": chunk_preview(d, _RAG_PREVIEW_CHARS)
         })
 
     return {
@@ -98,4 +86,4 @@ def rag_answer(
     }
 
 def rag_reset(session_id: str) -> None:
-    _rag_history.pop(session_id, None)
+    _rag_sessions.delete(session_id)
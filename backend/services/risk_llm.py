@@ -1,11 +1,50 @@
 # services/risk_llm.py
-import json, re
-from typing import Dict, Any, Optional
-from services.ai_analyzer import chat as chat_with_kb
+from typing import Dict, Any, Optional, List
+from pydantic import BaseModel, Field, field_validator
+from langchain_openai import ChatOpenAI
+from langchain_core.messages import SystemMessage, HumanMessage
 
-_JSON = re.compile(r"\{[\s\S]*\}", re.MULTILINE)
+from config.settings import settings
+from services.ai_analyzer import _retrieve_with_scores
+from services.timing import stage
 
-def llm_assessment_with_ai_analyzer(
+# ---------- Esquema de salida ----------
+class ResumenRiesgo(BaseModel):
+    parrafo_1: str = Field("", description="Máx ~120 palabras: monto sugerido, nivel de riesgo y sustento cuantitativo")
+    parrafo_2: str = Field("", description="Máx ~120 palabras: factores de riesgo y próximos pasos")
+
+    @field_validator("parrafo_1", "parrafo_2")
+    @classmethod
+    def _recorta(cls, v: str) -> str:
+        return (v or "").strip()[:1200]
+
+class NarrativaRiesgo(BaseModel):
+    top_5: List[str] = Field(default_factory=list, description="Las 5 razones principales de riesgo crediticio")
+    resumen: ResumenRiesgo = Field(default_factory=ResumenRiesgo)
+    justificacion: Optional[List[str]] = Field(
+        None, description="Bullets que justifican el riesgo con el CONTEXTO; citar [Fuente] y discrepancias. Null si no hay contexto."
+    )
+
+    @field_validator("top_5")
+    @classmethod
+    def _limpia_top5(cls, v: List[str]) -> List[str]:
+        return [s.strip(" -•\t") for s in v if s and s.strip()][:5]
+
+_VACIO = NarrativaRiesgo()
+
+SYSTEM_PROMPT = """Eres un analista de crédito para PYMEs en Ecuador.
+Prioriza razones cuantitativas y de riesgo crediticio real. Responde en español.
+Si se entrega CONTEXTO de la base de conocimiento, úsalo para `justificacion` y cita la fuente;
+si no hay contexto, deja `justificacion` en null. No inventes datos."""
+
+# Una sola llamada con salida estructurada (validada contra NarrativaRiesgo)
+_llm = ChatOpenAI(
+    model=settings.MODEL_NAME,
+    openai_api_key=settings.OPENAI_API_KEY,
+    temperature=settings.TEMPERATURE,
+).with_structured_output(NarrativaRiesgo)
+
+def llm_risk_narrative(
     *,
     empresa: Dict[str, Any],
     finanzas,                   # pydantic FinanceMetrics
@@ -14,20 +53,28 @@ def llm_assessment_with_ai_analyzer(
     use_kb: bool,
     collection: Optional[str],
     k: int,
-    session_id: str
+    tenant: Optional[str] = None
 ) -> Dict[str, Any]:
+    """
+    Genera top_5 + resumen (y, si hay KB, la justificación con fuentes) en UNA llamada al LLM.
+    Stateless: no usa ni escribe memoria de sesión.
+    """
     sig = signals or {}
     ms = scoring.get("monto_sugerido", {})
-    prompt = f"""
-        Eres un analista de crédito. Devuelve SOLO JSON válido con este formato:
-        {{
-        "top_5": ["<razon 1>", "<razon 2>", "<razon 3>", "<razon 4>", "<razon 5>"],
-        "resumen": {{
-            "parrafo_1": "<máx ~120 palabras>",
-            "parrafo_2": "<máx ~120 palabras>"
-        }}
-        }}
 
+    context_block, sources = "", None
+    if use_kb and collection:
+        q = (
+            f"ventas={finanzas.ventas_anuales}, margen={finanzas.margen_bruto}, "
+            f"razon_corriente={finanzas.razon_corriente}, deuda_activos={finanzas.deuda_total_activos}, "
+            f"flujo_operativo={finanzas.flujo_caja_operativo}. Riesgo, liquidez, apalancamiento, ingresos."
+        )
+        try:
+            context_block, sources, _ = _retrieve_with_scores(q, collection, k, tenant=tenant)
+        except Exception as e:
+            print(f"[LOG] KB no disponible para narrativa ({collection}): {e}")
+
+    human = f"""
         Base de análisis (estructura):
         - Empresa: {empresa.get('razon_social')} / {empresa.get('nombre_comercial')}
         - Ventas anuales: {finanzas.ventas_anuales}
@@ -39,34 +86,25 @@ def llm_assessment_with_ai_analyzer(
         - Score interno: {scoring.get('score')} ({scoring.get('riesgo')})
         - Monto sugerido (máx): {ms.get('max')}
 
-        Instrucciones:
-        1) Prioriza razones cuantitativas y de riesgo crediticio real.
-        2) Nada de texto fuera del JSON.
+        CONTEXTO (si hay):
+        {context_block or '(sin contexto)'}
         """.strip()
 
-    res = chat_with_kb(
-        session_id=session_id,
-        message=prompt,
-        use_kb=use_kb,                # si True, usará la KB y fuentes
-        collection=collection or "empresas",
-        k=k
-    )
-    content = res.get("answer", "")
-
-    m = _JSON.search(content)
-    if not m:
-        return {"top_5": [], "resumen": {"parrafo_1": "", "parrafo_2": ""}}
-
     try:
-        data = json.loads(m.group(0))
-        top_5 = list(data.get("top_5", []))[:5]
-        resumen = data.get("resumen", {}) or {}
-        return {
-            "top_5": top_5,
-            "resumen": {
-                "parrafo_1": (resumen.get("parrafo_1") or "")[:1200],
-                "parrafo_2": (resumen.get("parrafo_2") or "")[:1200],
-            }
-        }
-    except Exception:
-        return {"top_5": [], "resumen": {"parrafo_1": "", "parrafo_2": ""}}
+        with stage("llm.narrative"):
+            out = _llm.invoke([SystemMessage(content=SYSTEM_PROMPT), HumanMessage(content=human)])
+        if not isinstance(out, NarrativaRiesgo):
+            out = NarrativaRiesgo.model_validate(out or {})
+    except Exception as e:
+        print(f"[LOG] Error en narrativa de riesgo: {e}")
+        out = _VACIO
+
+    result = {
+        "top_5": out.top_5,
+        "resumen": out.resumen.model_dump(),
+    }
+    if sources:
+        # sin chunks recuperados el prompt pide `justificacion` en null: no se reporta bloque de KB
+        result["justificacion"] = out.justificacion or []
+        result["sources"] = sources
+    return result
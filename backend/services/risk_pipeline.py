@@ -0,0 +1,293 @@
+# services/risk_pipeline.py
+"""
+Pipeline de evaluación de riesgo por etapas, compartido por `/risk/evaluate` y su variante streaming.
+
+`evaluate_stages` es un generador asíncrono que emite `(evento, datos)` en cuanto cada etapa termina:
+    signals      -> señales digitales recolectadas (corre en paralelo con el parseo de archivos)
+    file_parsed  -> un archivo financiero procesado (uno por archivo)
+    metrics      -> métricas financieras consolidadas
+    score        -> score, nivel de riesgo, monto sugerido y estadísticas
+    narrative    -> top_5 + resumen del LLM
+    decision     -> respuesta final (mismo formato que /risk/evaluate)
+Las etapas bloqueantes corren en hilos (`asyncio.to_thread`); si el consumidor deja de iterar
+(p.ej. el cliente se desconecta), las tareas pendientes se cancelan y no se ejecutan etapas posteriores.
+"""
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+import asyncio
+import re
+
+from services.document_processor import pdf_to_rich_text
+from services.financial_extractor import extract_financial_metrics_from_text
+from services.scoring_service import FinanceMetrics, Reference, ScorePayload, compute_score
+from services.knowledge_base import KB_TENANCY, ingest_texts
+from services.scraping_service import collect_public_signals_existing
+from services.risk_llm import llm_risk_narrative
+
+VALORES_MAXIMOS_REF = {
+    "ventas_anuales": 50_000_000.0,        # máximo esperado anual en USD
+    "margen_bruto": 1.0,                   # 100%
+    "razon_corriente": 5.0,                # ratio máximo razonable
+    "deuda_total_activos": 1.0,            # 100%
+    "flujo_caja_operativo": 10_000_000.0   # máximo esperado anual en USD
+}
+
+def _slug(s: str) -> str:
+    s = s.lower()
+    s = re.sub(r"[^a-z0-9]+", "-", s)
+    return re.sub(r"-+", "-", s).strip("-")
+
+def _safe_collection_name(base: str, slug: str) -> str:
+    name = f"{base}.{slug}"
+    # Solo [a-z0-9._-]
+    name = re.sub(r"[^a-z0-9._-]", "-", name.lower())
+    # Quita separadores al inicio/fin para cumplir “start/end alnum”
+    name = re.sub(r"^[^a-z0-9]+", "", name)
+    name = re.sub(r"[^a-z0-9]+$", "", name)
+    # Asegura longitud mínima
+    if len(name) < 3:
+        name = (name + "-xxx")[:3]
+    return name
+
+def kb_target(base: str, razon_social: str) -> Tuple[str, Optional[str]]:
+    """(colección, empresa) de la KB de una empresa según KB_TENANCY."""
+    slug = _slug(razon_social)
+    if KB_TENANCY == "shared":
+        return _safe_collection_name(base, ""), slug
+    return _safe_collection_name(base, slug), None
+
+def _default_metrics() -> FinanceMetrics:
+    return FinanceMetrics(
+        ventas_anuales=0.0,
+        margen_bruto=0.22,
+        razon_corriente=1.2,
+        deuda_total_activos=0.6,
+        flujo_caja_operativo=0.0
+    )
+
+# -------------------- Etapas (síncronas) --------------------
+
+def parse_financial_file(
+    filename: str, file_bytes: bytes, kb_collection: Optional[str] = None, kb_tenant: Optional[str] = None
+) -> Dict[str, Any]:
+    """PDF → texto (nativo+OCR) → métricas del archivo. Ingresa el texto a la KB si se indica colección."""
+    try:
+        parsed = pdf_to_rich_text(file_bytes)
+        text = parsed.get("combined_text", "")
+
+        # Ingesta opcional a KB reutilizando el texto ya extraído (sin volver a parsear/OCR)
+        if kb_collection and text.strip():
+            ingest_texts(
+                kb_collection, [text], sources=[filename],
+                meta=[{"native_chars": parsed.get("native_chars"), "ocr_chars": parsed.get("ocr_chars")}],
+                tenant=kb_tenant
+            )
+
+        print(f"\n[LOG] Procesando archivo: {filename}")
+        metrics, debug = extract_financial_metrics_from_text(text)
+        return {
+            "filename": filename,
+            "ok": True,
+            "text": text,
+            "native_chars": parsed.get("native_chars"),
+            "ocr_chars": parsed.get("ocr_chars"),
+            "metrics": metrics,
+            "debug": debug,
+        }
+    except Exception as fe:
+        print(f"[LOG] Error al procesar archivo {filename}: {str(fe)}")
+        return {"filename": filename, "ok": False, "error": str(fe)}
+
+def combine_financials(parsed_files: List[Dict[str, Any]]) -> Tuple[FinanceMetrics, Dict[str, Any]]:
+    """Extrae métricas del texto combinado; si no hay señal, usa el archivo individual con mayor confianza."""
+    extraction_debug: Dict[str, Any] = {"confidence": 0.0, "per_file": [], "notes": []}
+    ok_files = [p for p in parsed_files if p.get("ok")]
+    for p in parsed_files:
+        if p.get("ok"):
+            extraction_debug["per_file"].append({
+                "filename": p["filename"], "native_chars": p.get("native_chars"), "ocr_chars": p.get("ocr_chars")
+            })
+        else:
+            extraction_debug["per_file"].append({"filename": p["filename"], "error": p.get("error")})
+
+    if not parsed_files:
+        return _default_metrics(), extraction_debug
+
+    # Combinar todo el texto para un análisis completo
+    combined_text = "\n\n".join(p["text"] for p in ok_files)
+    print("\n[LOG] Procesando texto combinado de todos los archivos")
+    fin_metrics, debug_all = extract_financial_metrics_from_text(combined_text)
+
+    # Si no se encontraron métricas en el texto combinado, usar las mejores métricas individuales
+    if fin_metrics.ventas_anuales == 0 and fin_metrics.razon_corriente == 1.2 and ok_files:
+        print("\n[LOG] Usando las mejores métricas individuales de los archivos")
+        best = max(ok_files, key=lambda p: p["debug"].get("confidence", 0))
+        fin_metrics, debug_all = best["metrics"], best["debug"]
+
+    extraction_debug["confidence"] = debug_all.get("confidence", 0.0)
+    extraction_debug["log"] = debug_all.get("log", {})
+    extraction_debug["raw_values"] = debug_all.get("raw_values", {})
+    extraction_debug["notes"].append(debug_all.get("notes"))
+    extraction_debug["processed_files"] = [{"filename": p["filename"], "chars": len(p["text"])} for p in ok_files]
+    return fin_metrics, extraction_debug
+
+def build_references(filenames: List[str]) -> List[Reference]:
+    # Referencias (simplificado)
+    return [
+        Reference(nombre=name, tipo="proveedor", antiguedad_meses=18, pago_prom_dias=7, monto_prom_mensual=1200.0)
+        for name in filenames[:3]
+    ]
+
+def score_company(fin_metrics: FinanceMetrics, digital_rating: Optional[float], refs: List[Reference]) -> Dict[str, Any]:
+    payload = ScorePayload(
+        sector="Comercio",
+        antiguedad_meses=36,
+        digital_rating=digital_rating,
+        referencias=refs or None,
+        finanzas=fin_metrics
+    )
+    return compute_score(payload)
+
+def build_estadisticas(fin_metrics: FinanceMetrics) -> Dict[str, Dict[str, Any]]:
+    return {
+        k: {"value": getattr(fin_metrics, k, None), "max": VALORES_MAXIMOS_REF.get(k)}
+        for k in VALORES_MAXIMOS_REF.keys()
+    }
+
+def build_decision(
+    empresa: Dict[str, Any],
+    scoring: Dict[str, Any],
+    estadisticas: Dict[str, Any],
+    llm_out: Dict[str, Any],
+    company_collection: Optional[str],
+    company_tenant: Optional[str] = None
+) -> Dict[str, Any]:
+    # Ya validado por el esquema de la narrativa: lista plana de strings (máx 5)
+    top5 = llm_out.get("top_5", [])[:5]
+    decision = {
+        "empresa": {"razon_social": empresa["razon_social"], "nombre_comercial": empresa["nombre_comercial"]},
+        "credito_sugerido": {
+            "monto": scoring.get("monto_sugerido", {}).get("max", 0),
+            "moneda": "USD"
+        },
+        "estadisticas": estadisticas,
+        "nivel_riesgo": scoring.get("riesgo"),
+        "factores_clave_riesgo": {
+            "top_5": [top5]
+        },
+        "resumen": llm_out.get("resumen", {
+            "parrafo_1": "", "parrafo_2": ""
+        })
+    }
+    if "justificacion" in llm_out:
+        decision["justificacion_kb"] = {
+            "collection": company_collection,
+            **({"company": company_tenant} if company_tenant else {}),
+            "bullets": llm_out["justificacion"],
+            "sources": llm_out.get("sources")
+        }
+    return decision
+
+# -------------------- Orquestación por eventos --------------------
+
+def _file_event(p: Dict[str, Any]) -> Dict[str, Any]:
+    if not p.get("ok"):
+        return {"filename": p["filename"], "ok": False, "error": p.get("error")}
+    return {
+        "filename": p["filename"],
+        "ok": True,
+        "chars": len(p["text"]),
+        "native_chars": p.get("native_chars"),
+        "ocr_chars": p.get("ocr_chars"),
+        "confidence": p["debug"].get("confidence"),
+    }
+
+async def evaluate_stages(
+    empresa: Dict[str, Any],
+    *,
+    instagram_url: Optional[str] = None,
+    facebook_url: Optional[str] = None,
+    tiktok_url: Optional[str] = None,
+    financieros: Optional[List[Tuple[str, bytes]]] = None,
+    referencias: Optional[List[str]] = None,
+    kb_ingest: bool = False,
+    use_kb: bool = False,
+    collection: str = "empresas",
+    k: int = 3,
+    collect_signals: Callable[..., Dict[str, Any]] = collect_public_signals_existing
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    razon_social = empresa["razon_social"]
+    company_collection, company_tenant = kb_target(collection, razon_social)
+    financieros = financieros or []
+
+    # 1) Señales digitales y 2) archivos financieros, en paralelo
+    signals_task = asyncio.ensure_future(asyncio.to_thread(
+        collect_signals,
+        business_name=empresa.get("nombre_comercial") or razon_social,
+        city=empresa.get("ciudad"),
+        instagram=instagram_url,
+        facebook=facebook_url,
+        tiktok=tiktok_url,
+        google_maps_url=None,
+        country=empresa.get("pais")
+    ))
+    pending: Dict[asyncio.Future, Optional[int]] = {signals_task: None}
+    for i, (filename, data) in enumerate(financieros):
+        task = asyncio.ensure_future(asyncio.to_thread(
+            parse_financial_file, filename, data, company_collection if kb_ingest else None, company_tenant
+        ))
+        pending[task] = i
+
+    signals: Dict[str, Any] = {}
+    parsed: List[Optional[Dict[str, Any]]] = [None] * len(financieros)
+    try:
+        while pending:
+            done, _ = await asyncio.wait(list(pending), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                idx = pending.pop(task)
+                if idx is None:
+                    signals = task.result()
+                    yield "signals", {
+                        "digital_rating": signals.get("digital_rating"),
+                        "platforms": signals.get("platforms", {}),
+                    }
+                else:
+                    parsed[idx] = task.result()
+                    yield "file_parsed", _file_event(parsed[idx])
+    finally:
+        for task in pending:
+            task.cancel()
+
+    # 3) Métricas consolidadas (en el orden original de los archivos)
+    fin_metrics, extraction_debug = await asyncio.to_thread(combine_financials, [p for p in parsed if p])
+    yield "metrics", {"finanzas": fin_metrics.model_dump(), "confidence": extraction_debug.get("confidence", 0.0)}
+
+    # 4) Score
+    refs = build_references(referencias or [])
+    scoring = score_company(fin_metrics, signals.get("digital_rating"), refs)
+    estadisticas = build_estadisticas(fin_metrics)
+    yield "score", {
+        "score": scoring.get("score"),
+        "nivel_riesgo": scoring.get("riesgo"),
+        "credito_sugerido": {"monto": scoring.get("monto_sugerido", {}).get("max", 0), "moneda": "USD"},
+        "estadisticas": estadisticas,
+    }
+
+    # 5) Narrativa (una sola llamada estructurada)
+    llm_out = await asyncio.to_thread(
+        llm_risk_narrative,
+        empresa={"razon_social": razon_social, "nombre_comercial": empresa.get("nombre_comercial")},
+        finanzas=fin_metrics,
+        signals=signals,
+        scoring=scoring,
+        collection=company_collection if use_kb else None,
+        tenant=company_tenant,
+        use_kb=use_kb,
+        k=k
+    )
+    yield "narrative", {"top_5": llm_out.get("top_5", []), "resumen": llm_out.get("resumen")}
+
+    # 6) Decisión final
+    decision = build_decision(
+        empresa, scoring, estadisticas, llm_out, company_collection if use_kb else None, company_tenant
+    )
+    yield "decision", {"decision": decision}
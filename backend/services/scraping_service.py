@@ -1,9 +1,48 @@
-from typing import Optional, Dict, Any, List
-import io, re, os, contextlib, urllib.parse
+from typing import Optional, Dict, Any, List, Callable
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import re, os, contextvars, threading, time, urllib.parse
 
 from services.facebook_scraping import get_facebook_stats as fb_get_stats
+from services.instagram_scraping import get_instagram_stats as ig_get_stats
 from services.google_scraping import get_google_maps_rating as gm_get_rating
-from services.tiktok_scraping import TikTokScraper
+from services.tiktok_scraping import TikTokScraper, build_chrome_driver
+from services.timing import stage
+from services.webdriver_pool import WebDriverPool
+from services.signal_cache import cached_fetch
+
+TIKTOK_TIMEOUT = float(os.getenv("TIKTOK_TIMEOUT", "15"))
+
+# Deadlines (segundos) por plataforma y global para la recolección en paralelo
+PLATFORM_DEADLINES: Dict[str, float] = {
+    "google_maps": float(os.getenv("SIGNALS_DEADLINE_GOOGLE_MAPS", "8")),
+    "facebook": float(os.getenv("SIGNALS_DEADLINE_FACEBOOK", "8")),
+    "instagram": float(os.getenv("SIGNALS_DEADLINE_INSTAGRAM", "8")),
+    "tiktok": float(os.getenv("SIGNALS_DEADLINE_TIKTOK", str(TIKTOK_TIMEOUT + 2))),
+}
+SIGNALS_GLOBAL_DEADLINE = float(os.getenv("SIGNALS_GLOBAL_DEADLINE", "20"))
+_DEADLINE_MARGIN = 0.25
+
+# Pool compartido para el fan-out de plataformas (acotado: protege al proceso bajo carga)
+_signals_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SIGNALS_WORKERS", "16")), thread_name_prefix="signals"
+)
+
+# Pools de WebDrivers pre-calentados (uno por modo headless), creados bajo demanda
+_tiktok_pools: Dict[bool, WebDriverPool] = {}
+_tiktok_pools_lock = threading.Lock()
+
+def get_tiktok_pool(headless: bool = True) -> WebDriverPool:
+    with _tiktok_pools_lock:
+        if headless not in _tiktok_pools:
+            _tiktok_pools[headless] = WebDriverPool(lambda: build_chrome_driver(headless))
+        return _tiktok_pools[headless]
+
+def close_tiktok_pools() -> None:
+    with _tiktok_pools_lock:
+        for pool in _tiktok_pools.values():
+            pool.close()
+        _tiktok_pools.clear()
 
 
 # -------------------- URL helpers --------------------
@@ -51,12 +90,27 @@ def _guess_business_from_url(url: str) -> Optional[str]:
 
 # -------------------- Parsers utilitarios --------------------
 
-def _find_int(text: str, pattern: str) -> Optional[int]:
-    m = re.search(pattern, text, flags=re.IGNORECASE)
+_COUNT_RX = re.compile(r"^\s*([\d.,]+)\s*([KMB])?\s*$", re.IGNORECASE)
+_COUNT_MULT = {"K": 1_000, "M": 1_000_000, "B": 1_000_000_000}
+
+def _parse_count(value: Any) -> Optional[int]:
+    """'2,345' / '1.234' / '1.2K' / '3M' / 5678 -> int (None si no se reconoce)."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    m = _COUNT_RX.match(str(value))
     if not m:
         return None
-    s = m.group(1).replace(".", "").replace(",", "")
-    return int(s) if s.isdigit() else None
+    num, suffix = m.group(1), (m.group(2) or "").upper()
+    if suffix:
+        # con sufijo el separador es decimal: '1.2K', '1,2K'
+        try:
+            return int(float(num.replace(",", ".")) * _COUNT_MULT[suffix])
+        except ValueError:
+            return None
+    digits = num.replace(".", "").replace(",", "")
+    return int(digits) if digits.isdigit() else None
 
 def _log_scale_5(n: int) -> float:
     import math
@@ -66,16 +120,7 @@ def _log_scale_5(n: int) -> float:
 
 # -------------------- Wrappers a tus scrapers --------------------
 
-def fetch_google_maps_existing(
-    business_name: Optional[str] = None,
-    location: Optional[str] = None,              # se ignora para evitar 'll'
-    google_maps_url: Optional[str] = None,
-    country: Optional[str] = None                # <-- nuevo
-) -> Dict[str, Any]:
-    api_key = os.getenv("SERPAPI_API_KEY")
-    if not api_key:
-        return {"platform": "google_maps", "ok": False, "error": "SERPAPI_API_KEY missing"}
-    
+def _google_maps_query(business_name: Optional[str], google_maps_url: Optional[str], country: Optional[str]) -> str:
     parts = []
     if google_maps_url:
         hint = _guess_business_from_url(google_maps_url)
@@ -86,8 +131,19 @@ def fetch_google_maps_existing(
         parts.append(country)
 
     seen = set()
-    query = " ".join([p for p in parts if not (p in seen or seen.add(p))]).strip()
+    return " ".join([p for p in parts if not (p in seen or seen.add(p))]).strip()
 
+def fetch_google_maps_existing(
+    business_name: Optional[str] = None,
+    location: Optional[str] = None,              # se ignora para evitar 'll'
+    google_maps_url: Optional[str] = None,
+    country: Optional[str] = None                # <-- nuevo
+) -> Dict[str, Any]:
+    api_key = os.getenv("SERPAPI_API_KEY")
+    if not api_key:
+        return {"platform": "google_maps", "ok": False, "error": "SERPAPI_API_KEY missing"}
+
+    query = _google_maps_query(business_name, google_maps_url, country)
     if not query:
         return {"platform": "google_maps", "ok": False, "error": "no query"}
 
@@ -104,55 +160,161 @@ def fetch_google_maps_existing(
     except Exception as e:
         return {"platform": "google_maps", "ok": False, "error": str(e), "query_used": query}
 
-def fetch_facebook_existing(username_or_url: str) -> Dict[str, Any]:
+class PlatformFetcher(ABC):
     """
-    Tu función imprime a stdout. Capturamos y parseamos.
-    Acepta username o URL completa.
+    Interfaz común para las plataformas cuyo scraper devuelve un dict `{"stats": {...}}`.
+    El scraper se consume directo (sin capturar stdout), así que es seguro en hilos paralelos.
+    Las subclases definen `platform`, `fields`, `username()` y `scrape()`.
     """
-    try:
-        username = _facebook_username_from_url(username_or_url)
-        buf = io.StringIO()
-        with contextlib.redirect_stdout(buf):
-            fb_get_stats(username)
-        out = buf.getvalue()
-
-        followers = _find_int(out, r"Followers count for .*?:\s*([\d\.]+)")
-        likes     = _find_int(out, r"Liked count for .*?:\s*([\d\.]+)")
-        posts     = _find_int(out, r"Total posts for .*?:\s*([\d\.]+)")
-
-        ok = any([followers, likes, posts])
-        return {"platform": "facebook", "ok": ok, "followers": followers, "likes": likes, "posts": posts, "username_used": username}
-    except Exception as e:
-        return {"platform": "facebook", "ok": False, "error": str(e)}
+    platform: str = ""
+    fields: tuple = ("followers", "likes", "posts")
+
+    def username(self, username_or_url: str) -> str:
+        return _last_path_segment(username_or_url) if username_or_url.startswith("http") else username_or_url
+
+    @abstractmethod
+    def scrape(self, username: str) -> Optional[Dict[str, Any]]:
+        """Stats crudas de la plataforma para `username` (`{"stats": {...}}`) o None."""
+
+    def fetch(self, username_or_url: str) -> Dict[str, Any]:
+        try:
+            username = self.username(username_or_url)
+            result = self.scrape(username) or {}
+            stats = result.get("stats") or {}
+            out: Dict[str, Any] = {"platform": self.platform}
+            for k in self.fields:
+                out[k] = _parse_count(stats.get(k))
+            out["ok"] = any(out[k] for k in self.fields)
+            out["username_used"] = username
+            return out
+        except Exception as e:
+            return {"platform": self.platform, "ok": False, "error": str(e)}
+
+class FacebookFetcher(PlatformFetcher):
+    platform = "facebook"
+
+    def username(self, username_or_url: str) -> str:
+        return _facebook_username_from_url(username_or_url)
+
+    def scrape(self, username: str) -> Optional[Dict[str, Any]]:
+        return fb_get_stats(username)
+
+class InstagramFetcher(PlatformFetcher):
+    platform = "instagram"
+    fields = ("followers", "posts")
+
+    def username(self, username_or_url: str) -> str:
+        return super().username(username_or_url).lstrip("@")
+
+    def scrape(self, username: str) -> Optional[Dict[str, Any]]:
+        return ig_get_stats(username)
+
+FETCHERS: Dict[str, PlatformFetcher] = {f.platform: f for f in (FacebookFetcher(), InstagramFetcher())}
+
+def fetch_facebook_existing(username_or_url: str) -> Dict[str, Any]:
+    """Acepta username o URL completa."""
+    return FETCHERS["facebook"].fetch(username_or_url)
+
+def fetch_instagram_existing(username_or_url: str) -> Dict[str, Any]:
+    """Acepta username o URL completa."""
+    return FETCHERS["instagram"].fetch(username_or_url)
 
-def fetch_tiktok_existing(username_or_url: str, headless: bool = True) -> Dict[str, Any]:
+def _tiktok_payload(stats: Dict[str, Any], username: str) -> Dict[str, Any]:
+    out = {"platform": "tiktok", "ok": bool(stats.get("followers") or stats.get("likes"))}
+    for k in ("followers", "following", "likes"):
+        if k in stats: out[k] = stats[k]
+    out["username_used"] = username
+    return out
+
+def fetch_tiktok_existing(username_or_url: str, headless: bool = True, deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Primero intenta por HTTP (estado JSON embebido en el perfil, sin navegador). Solo si eso falla
+    usa un WebDriver del pool (sin arranque en frío de Chrome). Todo el recorrido (HTTP, espera de un
+    driver libre, render y hard kill) cabe en `deadline` (reloj `time.monotonic()`; por defecto
+    SIGNALS_DEADLINE_TIKTOK desde ahora): cada etapa usa solo lo que queda. Si Selenium no termina a
+    tiempo, el driver se mata (desbloquea al hilo) y su cupo se libera; si no, vuelve al pool.
+    """
+    if deadline is None:
+        deadline = time.monotonic() + PLATFORM_DEADLINES["tiktok"]
+    # margen para devolver el resultado antes de que el fan-out dé la plataforma por vencida
+    end = deadline - _DEADLINE_MARGIN
     try:
         username = _tiktok_username_from_url(username_or_url)
-        scraper = TikTokScraper(use_selenium=True, headless=headless)
-        try:
-            import threading
-            result = {}
-            def _run():
-                nonlocal result
-                result = scraper.get_tiktok_stats(username) or {}
-            t = threading.Thread(target=_run, daemon=True)
-            t.start(); t.join(15)  # 15s máx
-            stats = result if not t.is_alive() else {}
-        finally:
-            scraper.close()
+        with stage("tiktok.http"):
+            result = TikTokScraper(use_selenium=False).get_tiktok_stats_http(username, deadline=end)
+        if result.get("stats"):
+            return _tiktok_payload(result["stats"], username)
+
+        if end - time.monotonic() <= 0:
+            return {"platform": "tiktok", "ok": False, "error": "timeout", "username_used": username}
+        pool = get_tiktok_pool(headless)
+        driver = pool.checkout(timeout=end - time.monotonic())
+        scraper = TikTokScraper(driver=driver)
+        remaining = min(TIKTOK_TIMEOUT, end - time.monotonic())
+
+        def _run():
+            nonlocal result
+            result = scraper.get_tiktok_stats_selenium(username, render_wait=max(remaining - 1.0, 0.5)) or {}
+        t = threading.Thread(target=_run, daemon=True)
+        t.start(); t.join(max(remaining, 0.0))
+        if t.is_alive():
+            pool.kill(driver)
+            return {"platform": "tiktok", "ok": False, "error": "timeout", "username_used": username}
+        pool.checkin(driver)
+
+        stats = result.get("stats") or {}
         if not stats:
-            return {"platform": "tiktok", "ok": False, "error": "timeout/no stats", "username_used": username}
-        out = {"platform": "tiktok", "ok": bool(stats.get("found", False))}
-        for k in ("followers", "likes", "bio", "url"):
-            if k in stats: out[k] = stats[k]
-        out["username_used"] = username
-        return out
+            return {"platform": "tiktok", "ok": False, "error": result.get("error", "no stats"), "username_used": username}
+        return _tiktok_payload(stats, username)
     except Exception as e:
         return {"platform": "tiktok", "ok": False, "error": str(e)}
 
 
 # -------------------- Facade principal --------------------
 
+def _run_platform(platform: str, fn: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    with stage(f"signals.{platform}"):
+        return fn()
+
+def _fan_out(jobs: Dict[str, Callable[[], Dict[str, Any]]], global_deadline: float):
+    """
+    Ejecuta los fetchers en paralelo. Cada plataforma tiene su deadline (acotado por el global);
+    al vencer, se devuelve lo que haya terminado y las demás se reportan como faltantes.
+    Los hilos vencidos no se interrumpen: terminan solos (cada fetcher tiene sus propios timeouts).
+    """
+    t0 = time.monotonic()
+    end = t0 + global_deadline
+    futures = {}
+    for platform, fn in jobs.items():
+        # copy_context: las etapas se siguen registrando en el colector del request
+        fut = _signals_executor.submit(contextvars.copy_context().run, _run_platform, platform, fn)
+        futures[fut] = (platform, min(t0 + PLATFORM_DEADLINES.get(platform, global_deadline), end))
+
+    results: Dict[str, Dict[str, Any]] = {}
+    missing: List[str] = []
+    pending = set(futures)
+    while pending:
+        now = time.monotonic()
+        for fut in [f for f in pending if futures[f][1] <= now]:
+            pending.discard(fut)
+            fut.cancel()
+            missing.append(futures[fut][0])
+        if not pending:
+            break
+        next_deadline = min(futures[f][1] for f in pending)
+        done, pending = wait(pending, timeout=max(0.0, next_deadline - now), return_when=FIRST_COMPLETED)
+        for fut in done:
+            platform = futures[fut][0]
+            try:
+                results[platform] = fut.result()
+            except Exception as e:
+                results[platform] = {"platform": platform, "ok": False, "error": str(e)}
+
+    for platform in missing:
+        results[platform] = {"platform": platform, "ok": False, "error": "deadline exceeded"}
+    # mismo orden en que se pidieron
+    return {p: results[p] for p in jobs}, missing
+
 def collect_public_signals_existing(
     business_name: Optional[str],
     city: Optional[str],
@@ -160,28 +322,55 @@ def collect_public_signals_existing(
     facebook: Optional[str],
     tiktok: Optional[str],
     google_maps_url: Optional[str] = None,
-    country: Optional[str] = None
+    country: Optional[str] = None,
+    deadline: Optional[float] = None,
+    force_refresh: bool = False
 ) -> Dict[str, Any]:
     """
     Orquesta: usa URL si viene; si no, cae al modo por nombre.
-    Calcula digital_rating 0..5 con pesos.
+    Las plataformas se consultan en paralelo con deadline por plataforma y global (`deadline`,
+    por defecto SIGNALS_GLOBAL_DEADLINE); la latencia es la de la plataforma más lenta, no la suma.
+    Calcula digital_rating 0..5 con pesos sobre las plataformas que respondieron a tiempo
+    y lista en `missing_platforms` las que no alcanzaron.
+    Cada plataforma pasa por la caché de señales (TTL + stale-while-revalidate); `force_refresh`
+    ignora la caché y la reescribe. La antigüedad del dato va en `platforms[<p>]["cache"]`.
     """
-    platforms: Dict[str, Any] = {}
+    jobs: Dict[str, Callable[[], Dict[str, Any]]] = {}
 
     # Google Maps: URL primero, si no -> nombre
     if business_name or google_maps_url:
-        platforms["google_maps"] = fetch_google_maps_existing(
-            business_name=business_name,
-            location=None,                   # ← ignorado a propósito
-            google_maps_url=google_maps_url,
-            country=country                  # ← aquí
+        jobs["google_maps"] = lambda: cached_fetch(
+            "google_maps",
+            _google_maps_query(business_name, google_maps_url, country),
+            lambda: fetch_google_maps_existing(
+                business_name=business_name,
+                location=None,                   # ← ignorado a propósito
+                google_maps_url=google_maps_url,
+                country=country                  # ← aquí
+            ),
+            force_refresh=force_refresh
         )
 
-    if facebook:
-        platforms["facebook"] = fetch_facebook_existing(facebook)
+    # Facebook / Instagram: mismo contrato vía PlatformFetcher
+    for platform, value in (("facebook", facebook), ("instagram", instagram)):
+        if value:
+            fetcher = FETCHERS[platform]
+            jobs[platform] = (lambda f=fetcher, v=value: cached_fetch(
+                f.platform, f.username(v), lambda: f.fetch(v), force_refresh=force_refresh
+            ))
 
+    global_deadline = deadline or SIGNALS_GLOBAL_DEADLINE
     if tiktok:
-        platforms["tiktok"] = fetch_tiktok_existing(tiktok, headless=True)
+        # mismo presupuesto que le asigna _fan_out a la plataforma, contado desde que arranca cada scraping:
+        # el refresco en segundo plano de cached_fetch reutiliza esta función y necesita su propio deadline
+        tiktok_budget = min(PLATFORM_DEADLINES["tiktok"], global_deadline)
+        jobs["tiktok"] = lambda: cached_fetch(
+            "tiktok", _tiktok_username_from_url(tiktok),
+            lambda: fetch_tiktok_existing(tiktok, headless=True, deadline=time.monotonic() + tiktok_budget),
+            force_refresh=force_refresh
+        )
+
+    platforms, missing = _fan_out(jobs, global_deadline)
 
     scores: List[float] = []
     weights: List[float] = []
@@ -190,6 +379,7 @@ def collect_public_signals_existing(
     if gm and gm.get("ok") and gm.get("rating") is not None:
         scores.append(float(gm["rating"])); weights.append(3.0)
 
+    # Instagram se recolecta y se reporta en `platforms`, pero no entra al digital_rating (fórmula base)
     fb = platforms.get("facebook")
     if fb and fb.get("ok") and fb.get("followers"):
         scores.append(_log_scale_5(fb["followers"])); weights.append(1.0)
@@ -204,4 +394,4 @@ def collect_public_signals_existing(
     else:
         digital_rating = None
 
-    return {"platforms": platforms, "digital_rating": digital_rating}
+    return {"platforms": platforms, "digital_rating": digital_rating, "missing_platforms": missing}
@@ -0,0 +1,203 @@
+# services/serpapi_client.py
+"""
+Cliente de SerpAPI protegido para ráfagas de carga y degradación del upstream.
+
+- Token bucket: como máximo SERPAPI_RATE requests/s (ráfagas de hasta SERPAPI_BURST). Si no hay
+  token dentro de SERPAPI_QUEUE_TIMEOUT se falla con `RateLimitedError` en lugar de encolar sin fin.
+- Circuit breaker: con al menos SERPAPI_BREAKER_MIN_CALLS en la ventana y una tasa de error
+  >= SERPAPI_BREAKER_RATIO el circuito se abre y las llamadas fallan al instante (`CircuitOpenError`)
+  durante SERPAPI_BREAKER_COOLDOWN segundos; luego deja pasar una sola llamada de prueba (half-open).
+- Coalescing: consultas idénticas concurrentes (mismos parámetros, sin contar api_key) comparten
+  una única llamada al upstream.
+- Sin reintentos en la capa HTTP: `stats["upstream"]` es el número real de requests enviados.
+
+Para pruebas locales: `SERPAPI_URL` apuntando a `services/fake_upstream.py`.
+"""
+from typing import Any, Deque, Dict, Optional, Tuple
+from collections import deque
+from concurrent.futures import Future
+import os
+import threading
+import time
+
+from services import http_client
+
+SERPAPI_URL = os.getenv("SERPAPI_URL", "https://serpapi.com/search")
+SERPAPI_RATE = float(os.getenv("SERPAPI_RATE", "5"))
+SERPAPI_BURST = int(os.getenv("SERPAPI_BURST", "10"))
+SERPAPI_QUEUE_TIMEOUT = float(os.getenv("SERPAPI_QUEUE_TIMEOUT", "2"))
+SERPAPI_BREAKER_WINDOW = float(os.getenv("SERPAPI_BREAKER_WINDOW", "30"))
+SERPAPI_BREAKER_MIN_CALLS = int(os.getenv("SERPAPI_BREAKER_MIN_CALLS", "5"))
+SERPAPI_BREAKER_RATIO = float(os.getenv("SERPAPI_BREAKER_RATIO", "0.5"))
+SERPAPI_BREAKER_COOLDOWN = float(os.getenv("SERPAPI_BREAKER_COOLDOWN", "30"))
+
+
+class SerpApiError(Exception):
+    pass
+
+class RateLimitedError(SerpApiError):
+    pass
+
+class CircuitOpenError(SerpApiError):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate: float = SERPAPI_RATE, burst: int = SERPAPI_BURST):
+        self.rate = max(rate, 1e-6)
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float = SERPAPI_QUEUE_TIMEOUT) -> bool:
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        window: float = SERPAPI_BREAKER_WINDOW,
+        min_calls: int = SERPAPI_BREAKER_MIN_CALLS,
+        ratio: float = SERPAPI_BREAKER_RATIO,
+        cooldown: float = SERPAPI_BREAKER_COOLDOWN,
+    ):
+        self.window, self.min_calls, self.ratio, self.cooldown = window, min_calls, ratio, cooldown
+        self._calls: Deque[Tuple[float, bool]] = deque()
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "open" if now - self._opened_at < self.cooldown else "half_open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True      # una sola llamada de prueba
+                return True
+            return False
+
+    def release(self) -> None:
+        """La llamada permitida no llegó a salir (p.ej. sin token): libera el cupo de prueba."""
+        with self._lock:
+            self._probing = False
+
+    def record(self, success: bool) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self._opened_at is not None:
+                # resultado de la llamada de prueba: cierra o vuelve a abrir
+                self._probing = False
+                self._calls.clear()
+                self._opened_at = None if success else now
+                return
+            self._calls.append((now, success))
+            while self._calls and now - self._calls[0][0] > self.window:
+                self._calls.popleft()
+            failures = sum(1 for _, ok in self._calls if not ok)
+            if len(self._calls) >= self.min_calls and failures / len(self._calls) >= self.ratio:
+                self._opened_at = now
+
+
+class SerpApiClient:
+    def __init__(self, url: str = SERPAPI_URL, bucket: Optional[TokenBucket] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.url = url
+        self.bucket = bucket or TokenBucket()
+        self.breaker = breaker or CircuitBreaker()
+        self._inflight: Dict[Tuple, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"upstream": 0, "coalesced": 0, "rate_limited": 0, "short_circuited": 0, "errors": 0}
+
+    def search(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """GET a SerpAPI con rate limit, circuit breaker y coalescing. Lanza `SerpApiError` si falla."""
+        key = tuple(sorted((k, str(v)) for k, v in params.items() if k != "api_key"))
+        with self._lock:
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._inflight[key] = Future()
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            return fut.result()
+
+        try:
+            fut.set_result(self._call(params))
+        except BaseException as e:
+            fut.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return fut.result()
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _call(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError("SerpAPI degradado: circuito abierto")
+        if not self.bucket.acquire():
+            self._count("rate_limited")
+            self.breaker.release()
+            raise RateLimitedError("Límite de requests a SerpAPI alcanzado")
+
+        # sin reintentos en la capa HTTP: cada intento pasa por el token bucket y el breaker
+        self._count("upstream")
+        try:
+            response = http_client.get(self.url, params=params, retries=0)
+        except Exception as e:
+            self._count("errors")
+            self.breaker.record(False)
+            raise SerpApiError(f"Error de red con SerpAPI: {e}") from e
+
+        # 429/5xx cuentan para el breaker; otros 4xx son errores de la consulta, no del upstream
+        upstream_failed = response.status_code == 429 or response.status_code >= 500
+        self.breaker.record(not upstream_failed)
+        if response.status_code != 200:
+            self._count("errors")
+            raise SerpApiError(f"SerpAPI respondió HTTP {response.status_code}")
+        data = response.json()
+        if data.get("error"):
+            raise SerpApiError(str(data["error"]))
+        return data
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "breaker": self.breaker.state, "inflight": len(self._inflight)}
+
+
+_client: Optional[SerpApiClient] = None
+_client_lock = threading.Lock()
+
+def get_client() -> SerpApiClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = SerpApiClient(os.getenv("SERPAPI_URL", SERPAPI_URL))
+        return _client
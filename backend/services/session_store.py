@@ -0,0 +1,296 @@
+# services/session_store.py
+"""
+Almacén acotado del estado de las sesiones de chat (historial, resúmenes).
+
+- El estado de cada sesión es un dict JSON-serializable; se guarda serializado, así el tamaño
+  contabilizado (`bytes`) es el real y ambos backends se comportan igual.
+- Límite de sesiones (`SESSION_MAX`): al superarlo se desaloja la usada hace más tiempo (LRU).
+- TTL de inactividad (`SESSION_TTL`): una sesión sin uso por más de ese tiempo expira.
+- Backends (`SESSION_STORE`):
+    memory -> en el proceso (por defecto).
+    sqlite -> archivo `SESSION_STORE_PATH` compartido por varios workers de uvicorn.
+- Un mismo almacén físico sirve a varios espacios de nombres (`chat`, `rag`).
+- `update` es un leer-modificar-escribir atómico (en SQLite, una transacción `BEGIN IMMEDIATE`), para
+  que dos workers que agregan mensajes a la misma sesión no se pisen.
+"""
+from typing import Any, Callable, Dict, Optional
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "./sessions.sqlite3")
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(2 * 3600)))
+_SWEEP_EVERY = 100     # escrituras entre barridos de expiradas/excedentes (SQLite)
+
+
+class SessionStore(ABC):
+    """Interfaz: `load` / `save` / `delete` por session_id, más `stats()`."""
+
+    backend = ""
+
+    def __init__(self, namespace: str, max_sessions: int = SESSION_MAX, ttl: float = SESSION_TTL):
+        self.namespace = namespace
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+
+    @abstractmethod
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Estado de la sesión (o None si no existe o expiró); cuenta como uso para LRU/TTL."""
+
+    @abstractmethod
+    def save(self, session_id: str, state: Dict[str, Any]) -> None:
+        """Reemplaza el estado de la sesión."""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Borra la sesión; True si existía."""
+
+    @abstractmethod
+    def update(self, session_id: str, fn: Callable[[Optional[Dict[str, Any]]], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        Aplica `fn(estado_actual)` y guarda lo que devuelva, de forma atómica (nadie escribe la sesión en
+        medio). Si `fn` devuelve None no se escribe nada. Devuelve el estado guardado (o None).
+        `fn` debe ser rápida: se ejecuta con la sesión bloqueada.
+        """
+
+    @abstractmethod
+    def _usage(self) -> Dict[str, int]:
+        """`sessions` y `bytes` vigentes."""
+
+    @abstractmethod
+    def _counters(self) -> Dict[str, int]:
+        """Totales de `evicted` / `expired`."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._usage(),
+            **self._counters(),
+            "max_sessions": self.max_sessions,
+            "ttl_s": self.ttl,
+            "backend": self.backend,
+        }
+
+
+class InMemorySessionStore(SessionStore):
+    backend = "memory"
+
+    def __init__(self, namespace: str, max_sessions: int = SESSION_MAX, ttl: float = SESSION_TTL):
+        super().__init__(namespace, max_sessions, ttl)
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()     # session_id -> (usada_en, json)
+        self._bytes = 0
+        self._stats = {"evicted": 0, "expired": 0}
+
+    def _drop(self, session_id: str) -> None:
+        _, payload = self._items.pop(session_id)
+        self._bytes -= len(payload)
+
+    def _expire(self, now: float) -> None:
+        # el OrderedDict está en orden de uso: las expiradas están al principio
+        while self._items:
+            session_id, (used_at, _) = next(iter(self._items.items()))
+            if now - used_at <= self.ttl:
+                break
+            self._drop(session_id)
+            self._stats["expired"] += 1
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            item = self._items.get(session_id)
+            if item is None:
+                return None
+            self._items[session_id] = (now, item[1])
+            self._items.move_to_end(session_id)
+            return json.loads(item[1])
+
+    def _put(self, session_id: str, state: Dict[str, Any], now: float) -> None:
+        payload = json.dumps(state, ensure_ascii=False)
+        if session_id in self._items:
+            self._drop(session_id)
+        self._items[session_id] = (now, payload)
+        self._bytes += len(payload)
+        self._expire(now)
+        while len(self._items) > self.max_sessions:
+            self._drop(next(iter(self._items)))
+            self._stats["evicted"] += 1
+
+    def save(self, session_id: str, state: Dict[str, Any]) -> None:
+        with self._lock:
+            self._put(session_id, state, time.time())
+
+    def update(self, session_id: str, fn: Callable[[Optional[Dict[str, Any]]], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            item = self._items.get(session_id)
+            state = fn(json.loads(item[1]) if item else None)
+            if state is not None:
+                self._put(session_id, state, now)
+            return state
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            if session_id not in self._items:
+                return False
+            self._drop(session_id)
+            return True
+
+    def _usage(self) -> Dict[str, int]:
+        with self._lock:
+            self._expire(time.time())
+            return {"sessions": len(self._items), "bytes": self._bytes}
+
+    def _counters(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Las sesiones viven en SQLite (WAL), visibles para todos los workers. Las expiradas no se devuelven
+    nunca; el límite de sesiones se aplica en barridos cada `_SWEEP_EVERY` escrituras (y en `stats()`).
+    Los contadores de desalojos/expiraciones se guardan en la misma base (`session_counters`), en la
+    transacción del barrido: son totales de todos los workers.
+    """
+    backend = "sqlite"
+
+    def __init__(self, namespace: str, path: str = SESSION_STORE_PATH,
+                 max_sessions: int = SESSION_MAX, ttl: float = SESSION_TTL):
+        super().__init__(namespace, max_sessions, ttl)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " namespace TEXT NOT NULL, session_id TEXT NOT NULL, state TEXT NOT NULL, bytes INTEGER NOT NULL,"
+            " used_at REAL NOT NULL, PRIMARY KEY (namespace, session_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_used_at ON sessions (namespace, used_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_counters ("
+            " namespace TEXT NOT NULL, name TEXT NOT NULL, value INTEGER NOT NULL, PRIMARY KEY (namespace, name))"
+        )
+        self._conn.commit()
+        self._writes = 0
+
+    def _sweep(self, now: float) -> None:
+        cur = self._conn.execute(
+            "DELETE FROM sessions WHERE namespace=? AND used_at < ?", (self.namespace, now - self.ttl)
+        )
+        self._count("expired", cur.rowcount)
+        (count,) = self._conn.execute(
+            "SELECT COUNT(*) FROM sessions WHERE namespace=?", (self.namespace,)
+        ).fetchone()
+        excess = count - self.max_sessions
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM sessions WHERE namespace=? AND session_id IN ("
+                " SELECT session_id FROM sessions WHERE namespace=? ORDER BY used_at LIMIT ?)",
+                (self.namespace, self.namespace, excess)
+            )
+            self._count("evicted", excess)
+
+    def _count(self, name: str, n: int) -> None:
+        if n > 0:
+            self._conn.execute(
+                "INSERT INTO session_counters (namespace, name, value) VALUES (?, ?, ?)"
+                " ON CONFLICT (namespace, name) DO UPDATE SET value = value + excluded.value",
+                (self.namespace, name, n)
+            )
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state FROM sessions WHERE namespace=? AND session_id=? AND used_at >= ?",
+                (self.namespace, session_id, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE sessions SET used_at=? WHERE namespace=? AND session_id=?", (now, self.namespace, session_id)
+            )
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def _put(self, session_id: str, state: Dict[str, Any], now: float) -> None:
+        payload = json.dumps(state, ensure_ascii=False)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sessions (namespace, session_id, state, bytes, used_at) VALUES (?, ?, ?, ?, ?)",
+            (self.namespace, session_id, payload, len(payload), now)
+        )
+        self._writes += 1
+        if self._writes >= _SWEEP_EVERY:
+            self._writes = 0
+            self._sweep(now)
+
+    def save(self, session_id: str, state: Dict[str, Any]) -> None:
+        with self._lock:
+            self._put(session_id, state, time.time())
+            self._conn.commit()
+
+    def update(self, session_id: str, fn: Callable[[Optional[Dict[str, Any]]], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE toma el lock de escritura de la base: otro proceso espera hasta el commit
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT state FROM sessions WHERE namespace=? AND session_id=? AND used_at >= ?",
+                    (self.namespace, session_id, now - self.ttl)
+                ).fetchone()
+                state = fn(json.loads(row[0]) if row else None)
+                if state is not None:
+                    self._put(session_id, state, now)
+                self._conn.commit()
+                return state
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM sessions WHERE namespace=? AND session_id=?", (self.namespace, session_id)
+            )
+            self._conn.commit()
+            return cur.rowcount > 0
+
+    def _usage(self) -> Dict[str, int]:
+        with self._lock:
+            self._sweep(time.time())
+            self._conn.commit()
+            sessions, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM sessions WHERE namespace=?", (self.namespace,)
+            ).fetchone()
+        return {"sessions": sessions, "bytes": size}
+
+    def _counters(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, value FROM session_counters WHERE namespace=?", (self.namespace,)
+            ).fetchall()
+        return {"evicted": 0, "expired": 0, **dict(rows)}
+
+
+_stores: Dict[str, SessionStore] = {}
+_stores_lock = threading.Lock()
+
+def get_store(namespace: str) -> SessionStore:
+    with _stores_lock:
+        if namespace not in _stores:
+            if SESSION_STORE == "sqlite":
+                _stores[namespace] = SQLiteSessionStore(namespace)
+            elif SESSION_STORE == "memory":
+                _stores[namespace] = InMemorySessionStore(namespace)
+            else:
+                raise ValueError(f"SESSION_STORE no soportado: {SESSION_STORE} (usa memory o sqlite)")
+        return _stores[namespace]
@@ -0,0 +1,185 @@
+# services/signal_cache.py
+"""
+Caché persistente (SQLite) de señales digitales por plataforma.
+
+- Clave: plataforma + usuario/consulta normalizados.
+- TTL por plataforma (SIGNAL_TTL_<PLATAFORMA>, segundos). Dentro del TTL se sirve sin scrapear.
+- stale-while-revalidate: vencido el TTL pero dentro de SIGNAL_MAX_STALE se sirve el valor cacheado
+  al instante y se refresca en segundo plano (un solo refresco en vuelo por clave).
+- stale-if-error: si el scraping falla y hay un valor previo, se sirve el previo.
+- Solo se guardan respuestas `ok`; los fallos se reintentan en la siguiente evaluación.
+Cada payload servido lleva `cache = {"hit", "age_s", "stale"}`.
+
+La misma base guarda la cartera monitoreada (`monitored`): parámetros de scraping por empresa y el
+último resultado agregado, que refresca en segundo plano `services/signal_scheduler.py`.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+SIGNAL_CACHE_PATH = os.getenv("SIGNAL_CACHE_PATH", "./signal_cache.sqlite3")
+SIGNAL_MAX_STALE = float(os.getenv("SIGNAL_MAX_STALE", str(7 * 24 * 3600)))
+SIGNAL_TTLS: Dict[str, float] = {
+    "google_maps": float(os.getenv("SIGNAL_TTL_GOOGLE_MAPS", str(24 * 3600))),
+    "facebook": float(os.getenv("SIGNAL_TTL_FACEBOOK", str(12 * 3600))),
+    "instagram": float(os.getenv("SIGNAL_TTL_INSTAGRAM", str(12 * 3600))),
+    "tiktok": float(os.getenv("SIGNAL_TTL_TIKTOK", str(12 * 3600))),
+}
+DEFAULT_TTL = 12 * 3600
+
+def normalize_key(value: Optional[str]) -> str:
+    v = unicodedata.normalize("NFKD", value or "").encode("ascii", "ignore").decode("ascii")
+    v = v.strip().lower().lstrip("@").rstrip("/")
+    return re.sub(r"\s+", " ", v)
+
+
+class SignalCache:
+    def __init__(self, path: str = SIGNAL_CACHE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS signals ("
+            " platform TEXT NOT NULL, key TEXT NOT NULL, payload TEXT NOT NULL, fetched_at REAL NOT NULL,"
+            " PRIMARY KEY (platform, key))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS monitored ("
+            " company_id TEXT PRIMARY KEY, params TEXT NOT NULL, added_at REAL NOT NULL,"
+            " refreshed_at REAL, result TEXT, error TEXT)"
+        )
+        self._conn.commit()
+
+    def get(self, platform: str, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, fetched_at FROM signals WHERE platform=? AND key=?", (platform, key)
+            ).fetchone()
+        if not row:
+            return None
+        return json.loads(row[0]), time.time() - row[1]
+
+    def put(self, platform: str, key: str, payload: Dict[str, Any]) -> None:
+        data = {k: v for k, v in payload.items() if k != "cache"}
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO signals (platform, key, payload, fetched_at) VALUES (?, ?, ?, ?)",
+                (platform, key, json.dumps(data, ensure_ascii=False, default=str), time.time())
+            )
+            self._conn.commit()
+
+    # ---------- cartera monitoreada ----------
+
+    def add_monitored(self, company_id: str, params: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO monitored (company_id, params, added_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(company_id) DO UPDATE SET params=excluded.params",
+                (company_id, json.dumps(params, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+
+    def remove_monitored(self, company_id: str) -> bool:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM monitored WHERE company_id=?", (company_id,))
+            self._conn.commit()
+        return cur.rowcount > 0
+
+    def _monitored(self, where: str = "", args: Tuple = ()) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT company_id, params, added_at, refreshed_at, result, error FROM monitored"
+                f"{where} ORDER BY refreshed_at IS NOT NULL, refreshed_at", args
+            ).fetchall()
+        return [{
+            "company_id": r[0],
+            "params": json.loads(r[1]),
+            "added_at": r[2],
+            "refreshed_at": r[3],
+            "result": json.loads(r[4]) if r[4] else None,
+            "error": r[5],
+        } for r in rows]
+
+    def list_monitored(self, due_before: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Empresas monitoreadas (las más atrasadas primero); con `due_before`, solo las no refrescadas desde ese instante."""
+        if due_before is None:
+            return self._monitored()
+        return self._monitored(" WHERE refreshed_at IS NULL OR refreshed_at < ?", (due_before,))
+
+    def get_monitored(self, company_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._monitored(" WHERE company_id=?", (company_id,))
+        return rows[0] if rows else None
+
+    def save_refresh(self, company_id: str, result: Optional[Dict[str, Any]], error: Optional[str] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE monitored SET refreshed_at=?, result=COALESCE(?, result), error=? WHERE company_id=?",
+                (time.time(), json.dumps(result, ensure_ascii=False, default=str) if result else None,
+                 error, company_id)
+            )
+            self._conn.commit()
+
+
+_cache: Optional[SignalCache] = None
+_cache_lock = threading.Lock()
+_refreshing: set = set()
+_refresh_executor = ThreadPoolExecutor(max_workers=int(os.getenv("SIGNAL_REFRESH_WORKERS", "4")),
+                                       thread_name_prefix="signal-refresh")
+
+def get_cache() -> SignalCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SignalCache()
+        return _cache
+
+def _with_cache_info(payload: Dict[str, Any], hit: bool, age: float, stale: bool) -> Dict[str, Any]:
+    return {**payload, "cache": {"hit": hit, "age_s": round(age, 1), "stale": stale}}
+
+def _refresh(platform: str, key: str, fetch: Callable[[], Dict[str, Any]]) -> None:
+    try:
+        fresh = fetch()
+        if fresh.get("ok"):
+            get_cache().put(platform, key, fresh)
+    except Exception as e:
+        print(f"[LOG] Error refrescando señal {platform}:{key}: {e}")
+    finally:
+        with _cache_lock:
+            _refreshing.discard((platform, key))
+
+def cached_fetch(platform: str, key: str, fetch: Callable[[], Dict[str, Any]],
+                 force_refresh: bool = False) -> Dict[str, Any]:
+    key = normalize_key(key)
+    if not key:
+        return fetch()
+    cache = get_cache()
+    entry = None if force_refresh else cache.get(platform, key)
+
+    if entry:
+        payload, age = entry
+        if age < SIGNAL_TTLS.get(platform, DEFAULT_TTL):
+            return _with_cache_info(payload, True, age, False)
+        if age < SIGNAL_MAX_STALE:
+            with _cache_lock:
+                schedule = (platform, key) not in _refreshing
+                if schedule:
+                    _refreshing.add((platform, key))
+            if schedule:
+                _refresh_executor.submit(_refresh, platform, key, fetch)
+            return _with_cache_info(payload, True, age, True)
+
+    fresh = fetch()
+    if fresh.get("ok"):
+        cache.put(platform, key, fresh)
+        return _with_cache_info(fresh, False, 0.0, False)
+    if entry:
+        # stale-if-error: mejor un dato viejo que ninguno
+        payload, age = entry
+        return _with_cache_info(payload, True, age, True)
+    return fresh
@@ -0,0 +1,173 @@
+# services/signal_scheduler.py
+"""
+Refresco periódico en segundo plano de las señales digitales de la cartera monitoreada.
+
+- Cada `SIGNAL_REFRESH_TICK` segundos revisa qué empresas no se refrescan hace más de
+  `SIGNAL_REFRESH_INTERVAL` y las vuelve a scrapear con `collect_public_signals_existing(force_refresh=True)`:
+  los resultados por plataforma quedan en la caché de señales (las evaluaciones los leen sin scrapear)
+  y el agregado (digital_rating, plataformas faltantes) se guarda en la tabla `monitored`.
+- Concurrencia acotada (`SIGNAL_REFRESH_CONCURRENCY` empresas a la vez) y jitter aleatorio antes de cada
+  refresco, para no disparar ráfagas contra las plataformas ni contra SerpAPI.
+
+El intervalo debe ser menor que los TTL de `signal_cache` para que las evaluaciones encuentren datos frescos.
+"""
+from typing import Any, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import random
+import threading
+import time
+
+from services.scraping_service import collect_public_signals_existing
+from services.signal_cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+SIGNAL_REFRESH_INTERVAL = float(os.getenv("SIGNAL_REFRESH_INTERVAL", str(6 * 3600)))
+SIGNAL_REFRESH_TICK = float(os.getenv("SIGNAL_REFRESH_TICK", "60"))
+SIGNAL_REFRESH_CONCURRENCY = int(os.getenv("SIGNAL_REFRESH_CONCURRENCY", "2"))
+SIGNAL_REFRESH_JITTER = float(os.getenv("SIGNAL_REFRESH_JITTER", "5"))
+
+
+def refresh_company(company_id: str) -> Dict[str, Any]:
+    """Refresca ya (sin caché) las señales de una empresa monitoreada y guarda el agregado."""
+    cache = get_cache()
+    entry = cache.get_monitored(company_id)
+    if entry is None:
+        raise KeyError(company_id)
+    try:
+        p = entry["params"]
+        result = collect_public_signals_existing(
+            business_name=p.get("business_name"),
+            city=p.get("city"),
+            instagram=p.get("instagram"),
+            facebook=p.get("facebook"),
+            tiktok=p.get("tiktok"),
+            google_maps_url=p.get("google_maps_url"),
+            country=p.get("country"),
+            force_refresh=True
+        )
+    except Exception as e:
+        cache.save_refresh(company_id, None, str(e))
+        raise
+    error = None
+    if result.get("missing_platforms"):
+        error = "sin respuesta: " + ", ".join(result["missing_platforms"])
+    cache.save_refresh(company_id, result, error)
+    return result
+
+
+class SignalRefreshScheduler:
+    def __init__(
+        self,
+        interval: float = SIGNAL_REFRESH_INTERVAL,
+        tick: float = SIGNAL_REFRESH_TICK,
+        concurrency: int = SIGNAL_REFRESH_CONCURRENCY,
+        jitter: float = SIGNAL_REFRESH_JITTER,
+    ):
+        self.interval = interval
+        self.tick = tick
+        self.jitter = jitter
+        self.concurrency = max(1, concurrency)
+        self._executor: Optional[ThreadPoolExecutor] = None      # se crea en start(): stop() lo apaga
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._queued: set = set()
+        self._lock = threading.Lock()
+        self.stats = {"runs": 0, "refreshed": 0, "errors": 0, "last_tick": None}     # bajo _lock
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _refresh(self, company_id: str) -> None:
+        try:
+            # jitter: reparte los refrescos en el tiempo en lugar de lanzarlos todos juntos
+            if self._stop.wait(random.uniform(0, self.jitter)):
+                return
+            refresh_company(company_id)
+            self._count("refreshed")
+        except KeyError:
+            pass          # la empresa dejó de monitorearse mientras esperaba
+        except Exception as e:
+            self._count("errors")
+            logger.error(f"Error refrescando señales de {company_id}: {e}")
+        finally:
+            with self._lock:
+                self._queued.discard(company_id)
+
+    def run_once(self) -> int:
+        """Encola las empresas vencidas que no estén ya en cola. Devuelve cuántas encoló."""
+        executor = self._executor
+        if executor is None:
+            raise RuntimeError("El scheduler de señales no está iniciado")
+        with self._lock:
+            self.stats["runs"] += 1
+            self.stats["last_tick"] = time.time()
+        due = get_cache().list_monitored(due_before=time.time() - self.interval)
+        queued = 0
+        for entry in due:
+            company_id = entry["company_id"]
+            with self._lock:
+                if company_id in self._queued:
+                    continue
+                self._queued.add(company_id)
+            executor.submit(self._refresh, company_id)
+            queued += 1
+        return queued
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Error en el scheduler de señales: {e}")
+            self._stop.wait(self.tick)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="signal-scheduler")
+        self._thread = threading.Thread(target=self._loop, name="signal-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        with self._lock:
+            self._queued.clear()      # los refrescos cancelados no vuelven a marcarse como terminados
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            queued = len(self._queued)
+            stats = dict(self.stats)
+        return {
+            **stats,
+            "running": bool(self._thread and self._thread.is_alive()),
+            "queued": queued,
+            "interval_s": self.interval,
+        }
+
+
+_scheduler: Optional[SignalRefreshScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> SignalRefreshScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = SignalRefreshScheduler()
+        return _scheduler
+
+def stop_scheduler() -> None:
+    """Detiene el scheduler si se llegó a crear (no lo construye solo para apagarlo)."""
+    with _scheduler_lock:
+        scheduler = _scheduler
+    if scheduler is not None:
+        scheduler.stop()
@@ -1,4 +1,3 @@
-import requests
 from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -6,16 +5,32 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-import time
 import json
 import re
 import logging
 import os
 
+from services import http_client
+
 # Configurar logging para mostrar solo advertencias y errores
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Timeouts del camino HTTP (cortos: si falla, todavía queda tiempo para el fallback con Selenium)
+TIKTOK_HTTP_TIMEOUT = (http_client.CONNECT_TIMEOUT, float(os.getenv("TIKTOK_HTTP_READ_TIMEOUT", "5")))
+# Espera máxima (explícita) a que el perfil renderice en Selenium
+TIKTOK_RENDER_WAIT = float(os.getenv("TIKTOK_RENDER_WAIT", "8"))
+
+# Estado que TikTok embebe en el HTML del perfil (formato actual y formato anterior)
+_STATE_RX = re.compile(
+    r'<script[^>]+id="(?:__UNIVERSAL_DATA_FOR_REHYDRATION__|SIGI_STATE)"[^>]*>(.*?)</script>',
+    re.DOTALL,
+)
+_RENDERED_XPATH = (
+    "//strong[@data-e2e='followers-count']"
+    " | //script[@id='__UNIVERSAL_DATA_FOR_REHYDRATION__' or @id='SIGI_STATE']"
+)
+
 
 def get_tiktok_stats(business_name):
     """
@@ -27,6 +42,11 @@ def get_tiktok_stats(business_name):
         :return: 
             Dictionary with information about a specific company's Tiktok statistics.
     """
+    # Camino rápido por HTTP; el navegador solo se levanta si el HTML no trae las estadísticas
+    stats = TikTokScraper(use_selenium=False).get_tiktok_stats_http(business_name)
+    if stats.get("stats"):
+        return stats
+
     scraper = TikTokScraper(use_selenium=True, headless=True)
     try:
         stats = scraper.get_scraping_tiktok_stats(business_name)
@@ -38,65 +58,74 @@ def get_tiktok_stats(business_name):
     finally:
         scraper.close()
 
+def build_chrome_driver(headless=True):
+    """Crea un Chrome configurado para scraping (usado por TikTokScraper y por el pool de WebDrivers)."""
+    from selenium.webdriver.chrome.service import Service
+
+    chrome_options = Options()
+    if headless:
+        chrome_options.add_argument("--headless=new")
+
+    # Opciones para evitar detección y mejorar estabilidad
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+
+    # Opciones para suprimir logs de la consola
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation", "enable-logging"])
+    chrome_options.add_argument("--log-level=3")
+    chrome_options.add_argument('--silent')
+
+    # Preferencias para notificaciones
+    chrome_options.add_experimental_option("prefs", {"profile.default_content_setting_values": {"notifications": 2}})
+    
+    # Configuración del servicio de ChromeDriver para que no muestre logs. En POSIX arranca en su propia
+    # sesión: Chrome y sus hijos quedan en el grupo de procesos de chromedriver y WebDriverPool.kill
+    # puede matarlos juntos con os.killpg.
+    popen_kw = {"start_new_session": True} if os.name != 'nt' else {}
+    service = Service(service_args=['--log-level=OFF'], popen_kw=popen_kw)
+    
+    # Ocultar la ventana de la consola del driver en Windows
+    if os.name == 'nt':
+        service.creation_flags = 0x08000000 # CREATE_NO_WINDOW
+
+    try:
+        driver = webdriver.Chrome(service=service, options=chrome_options)
+        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    except Exception as e:
+        logger.error(f"Error configurando Selenium: {e}. Intentando fallback.")
+        try:
+            # Fallback sin servicio personalizado
+            driver = webdriver.Chrome(options=chrome_options)
+            driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        except Exception as e2:
+            logger.error(f"Error en fallback de Selenium: {e2}")
+            raise
+    return driver
+
 class TikTokScraper:
-    def __init__(self, use_selenium=True, headless=True):
+    def __init__(self, use_selenium=True, headless=True, driver=None):
         self.use_selenium = use_selenium
         self.session = None
         self.driver = None
-        if use_selenium:
+        # Si se entrega un driver (p.ej. del pool), no se crea ni se cierra aquí
+        self._owns_driver = driver is None
+        if driver is not None:
+            self.driver = driver
+        elif use_selenium:
             self._setup_selenium(headless)
         else:
             self._setup_session()
 
     def _setup_selenium(self, headless=True):
-        from selenium.webdriver.chrome.service import Service
-
-        chrome_options = Options()
-        if headless:
-            chrome_options.add_argument("--headless=new")
-
-        # Opciones para evitar detección y mejorar estabilidad
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-
-        # Opciones para suprimir logs de la consola
-        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation", "enable-logging"])
-        chrome_options.add_argument("--log-level=3")
-        chrome_options.add_argument('--silent')
-
-        # Preferencias para notificaciones
-        chrome_options.add_experimental_option("prefs", {"profile.default_content_setting_values": {"notifications": 2}})
-        
-        # Configuración del servicio de ChromeDriver para que no muestre logs
-        service = Service(service_args=['--log-level=OFF'])
-        
-        # Ocultar la ventana de la consola del driver en Windows
-        if os.name == 'nt':
-            service.creation_flags = 0x08000000 # CREATE_NO_WINDOW
-
-        try:
-            self.driver = webdriver.Chrome(service=service, options=chrome_options)
-            self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-        except Exception as e:
-            logger.error(f"Error configurando Selenium: {e}. Intentando fallback.")
-            try:
-                # Fallback sin servicio personalizado
-                self.driver = webdriver.Chrome(options=chrome_options)
-                self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-            except Exception as e2:
-                logger.error(f"Error en fallback de Selenium: {e2}")
-                raise
+        self.driver = build_chrome_driver(headless)
 
     def _setup_session(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept-Language': 'en-US,en;q=0.5',
-        })
+        # Session del hilo sobre el pool de conexiones compartido (keep-alive, reintentos)
+        self.session = http_client.session()
 
     def _find_element_text(self, selectors, wait_time=3):
         for selector in selectors:
@@ -109,21 +138,61 @@ class TikTokScraper:
                 continue
         return None
 
-    def get_tiktok_stats_selenium(self, business_name):
+    def _profile_url(self, business_name):
+        base_url = os.getenv("TIKTOK_BASE_URL", "https://www.tiktok.com")
+        return f"{base_url}/@{business_name}"
+
+    def _extract_from_html(self, html):
+        stats = {}
+        for raw in _STATE_RX.findall(html or ""):
+            try:
+                if self._extract_from_json(json.loads(raw), stats):
+                    return stats
+            except json.JSONDecodeError:
+                continue
+        return {}
+
+    def get_tiktok_stats_http(self, business_name, deadline=None):
+        """
+        Camino rápido: descarga el perfil por HTTP (sin navegador) y lee las estadísticas del estado
+        JSON embebido. Devuelve `stats` vacío si la página no lo trae (bloqueo, captcha, etc.).
+        Un solo intento (el fallback es Selenium), acotado por `deadline` (reloj `time.monotonic()`).
+        """
+        business_name = business_name.replace('@', '').strip()
+        url = self._profile_url(business_name)
+        try:
+            response = http_client.get(url, timeout=TIKTOK_HTTP_TIMEOUT, retries=0, deadline=deadline)
+            if response.status_code != 200:
+                return {"source": "tiktok", "business_name": business_name, "stats": {},
+                        "error": f"HTTP {response.status_code}"}
+            return {"source": "tiktok", "business_name": business_name,
+                    "stats": self._extract_from_html(response.text)}
+        except Exception as e:
+            logger.warning(f"Error HTTP en TikTok para @{business_name}: {e}")
+            return {"source": "tiktok", "business_name": business_name, "stats": {}, "error": str(e)}
+
+    def get_tiktok_stats_selenium(self, business_name, render_wait=TIKTOK_RENDER_WAIT):
         if not self.driver:
             logger.error("Driver de Selenium no está configurado.")
             return None
 
         business_name = business_name.replace('@', '').strip()
-        base_url = os.getenv("TIKTOK_BASE_URL", "https://www.tiktok.com")
-        url = f"{base_url}/@{business_name}"
+        url = self._profile_url(business_name)
         logger.info(f"Accediendo a: {url}")
 
         try:
             self.driver.get(url)
-            time.sleep(5)
+            # Espera explícita: continúa apenas aparece el contador o el estado embebido
+            try:
+                WebDriverWait(self.driver, render_wait).until(
+                    EC.presence_of_element_located((By.XPATH, _RENDERED_XPATH))
+                )
+            except TimeoutException:
+                logger.warning(f"El perfil @{business_name} no terminó de renderizar")
 
-            stats = {}
+            stats = self._extract_from_html(self.driver.page_source)
+            if stats:
+                return {"source": "tiktok", "business_name": business_name, "stats": stats}
 
             followers_count = self._find_element_text([
                 "//strong[@data-e2e='followers-count']",
@@ -187,13 +256,23 @@ class TikTokScraper:
             return {}
 
     def _extract_from_json(self, data, stats):
+        """
+        Busca en profundidad el bloque de estadísticas del usuario: `userStats` (formato antiguo),
+        `userInfo.stats` (__UNIVERSAL_DATA_FOR_REHYDRATION__) o `UserModule.stats.<usuario>` (SIGI_STATE).
+        """
         if isinstance(data, dict):
-            user_stats = data.get('userStats', {})
-            stats['followers'] = user_stats.get('followerCount')
-            stats['following'] = user_stats.get('followingCount')
-            stats['likes'] = user_stats.get('heartCount')
-            return any([stats['followers'], stats['following'], stats['likes']])
-        return False
+            if 'followerCount' in data:
+                stats['followers'] = data.get('followerCount')
+                stats['following'] = data.get('followingCount')
+                stats['likes'] = data.get('heartCount', data.get('heart'))
+                if any([stats['followers'], stats['following'], stats['likes']]):
+                    return True
+            children = data.values()
+        elif isinstance(data, list):
+            children = data
+        else:
+            return False
+        return any(self._extract_from_json(child, stats) for child in children)
 
     def _parse_count(self, count_str):
         if not count_str: return 0
@@ -210,6 +289,8 @@ class TikTokScraper:
     def get_scraping_tiktok_stats(self, business_name):
         if self.use_selenium and self.driver:
             return self.get_tiktok_stats_selenium(business_name)
+        elif self.session is not None:
+            return self.get_tiktok_stats_http(business_name)
         else:
             return {
                 "source": "tiktok",
@@ -218,5 +299,5 @@ class TikTokScraper:
             }
 
     def close(self):
-        if self.driver:
+        if self.driver and self._owns_driver:
             self.driver.quit()
\ No newline at end of file
@@ -0,0 +1,178 @@
+# services/timing.py
+"""
+Instrumentación de latencia por etapa.
+
+- `stage("nombre")` / `record("nombre", segundos)` registran la duración de una etapa
+  (scraping por plataforma, render/OCR por página, extracción, embeddings, consultas KB, LLM).
+- Cada request HTTP tiene su propio `TimingCollector` (vía contextvars) que se expone como
+  cabecera `Server-Timing`.
+- Todas las duraciones alimentan además histogramas globales del proceso, expuestos en
+  formato Prometheus en `/metrics` (y p50/p95 por etapa en `/metrics/stages`).
+"""
+from typing import Dict, List, Optional, Tuple
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+import functools
+import re
+import threading
+import time
+
+# Buckets en segundos (similares a los de prometheus_client, extendidos para scraping/LLM)
+BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0, 60.0)
+
+_METRIC = "alfatech_stage_duration_seconds"
+
+
+# -------------------- Colector por request --------------------
+
+class TimingCollector:
+    """Acumula las etapas de un request (thread-safe: los servicios pueden registrar desde hilos)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, List[float]] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._stages.setdefault(name, []).append(seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                name: {"count": len(durs), "total_ms": round(sum(durs) * 1000.0, 1)}
+                for name, durs in self._stages.items()
+            }
+
+    def server_timing(self) -> str:
+        # Una entrada por etapa: duración sumada y nº de llamadas en `desc`
+        parts = []
+        for name, s in self.summary().items():
+            token = re.sub(r"[^A-Za-z0-9_.\-]", "_", name)
+            parts.append(f'{token};dur={s["total_ms"]};desc="x{s["count"]}"')
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[TimingCollector]] = ContextVar("timing_collector", default=None)
+
+def begin_request() -> Tuple[TimingCollector, Token]:
+    collector = TimingCollector()
+    return collector, _current.set(collector)
+
+def end_request(token: Token) -> None:
+    _current.reset(token)
+
+def current() -> Optional[TimingCollector]:
+    return _current.get()
+
+
+# -------------------- Histogramas del proceso --------------------
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)   # último = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        # Interpolación lineal dentro del bucket (mismo criterio que histogram_quantile de PromQL)
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cum = 0
+        for i, c in enumerate(self.counts):
+            if cum + c >= rank and c > 0:
+                if i == len(BUCKETS):
+                    return BUCKETS[-1]
+                lo = BUCKETS[i - 1] if i > 0 else 0.0
+                hi = BUCKETS[i]
+                return lo + (hi - lo) * ((rank - cum) / c)
+            cum += c
+        return BUCKETS[-1]
+
+
+_hist_lock = threading.Lock()
+_histograms: Dict[str, _Histogram] = {}
+
+def _observe(name: str, seconds: float) -> None:
+    with _hist_lock:
+        h = _histograms.get(name)
+        if h is None:
+            h = _histograms[name] = _Histogram()
+        h.observe(seconds)
+
+
+# -------------------- API para los servicios --------------------
+
+def record(name: str, seconds: float) -> None:
+    _observe(name, seconds)
+    collector = _current.get()
+    if collector is not None:
+        collector.add(name, seconds)
+
+@contextmanager
+def stage(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - t0)
+
+def timed(name: str):
+    """Decorador equivalente a envolver la función en `stage(name)`."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+# -------------------- Exposición --------------------
+
+def _fmt(v: float) -> str:
+    return repr(float(v)) if v != float("inf") else "+Inf"
+
+def render_prometheus() -> str:
+    with _hist_lock:
+        snapshot = {n: (list(h.counts), h.sum, h.count) for n, h in _histograms.items()}
+
+    lines = [
+        f"# HELP {_METRIC} Latencia por etapa del pipeline (scraping, OCR, KB, LLM).",
+        f"# TYPE {_METRIC} histogram",
+    ]
+    for name in sorted(snapshot):
+        counts, total, count = snapshot[name]
+        label = name.replace("\\", "\\\\").replace('"', '\\"')
+        cum = 0
+        for le, c in zip(list(BUCKETS) + [float("inf")], counts):
+            cum += c
+            lines.append(f'{_METRIC}_bucket{{stage="{label}",le="{_fmt(le)}"}} {cum}')
+        lines.append(f'{_METRIC}_sum{{stage="{label}"}} {total}')
+        lines.append(f'{_METRIC}_count{{stage="{label}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+def stage_percentiles() -> Dict[str, Dict[str, Optional[float]]]:
+    def _ms(v: Optional[float]) -> Optional[float]:
+        return round(v * 1000.0, 1) if v is not None else None
+
+    with _hist_lock:
+        return {
+            name: {
+                "count": h.count,
+                "p50_ms": _ms(h.quantile(0.50)),
+                "p95_ms": _ms(h.quantile(0.95)),
+                "mean_ms": _ms(h.sum / h.count) if h.count else None,
+            }
+            for name, h in sorted(_histograms.items())
+        }
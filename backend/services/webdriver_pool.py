@@ -0,0 +1,193 @@
+# services/webdriver_pool.py
+"""
+Pool acotado de WebDrivers de Chrome pre-calentados y reutilizables.
+
+- checkout/checkin: `with pool.driver(timeout=...) as driver:` (o `checkout()` / `checkin()` explícitos).
+- Health check al hacer checkout: un driver que no responde se descarta y se reemplaza.
+- Reciclaje: tras `max_uses` usos el driver se cierra y se crea uno nuevo (evita fugas de memoria de Chrome).
+- Hard kill: `kill(driver)` mata chromedriver junto con Chrome y sus procesos hijos (el grupo de
+  procesos que abre `build_chrome_driver`); se usa cuando una operación excede su deadline,
+  desbloqueando al hilo que quedó esperando en el driver.
+- `close()` descarta los drivers libres y marca el pool como cerrado: los que vuelvan después con
+  `checkin` se cierran en vez de quedar en la cola.
+"""
+from typing import Callable, Dict, Optional
+from contextlib import contextmanager
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.getenv("WEBDRIVER_POOL_SIZE", "2"))
+MAX_USES = int(os.getenv("WEBDRIVER_MAX_USES", "50"))
+CHECKOUT_TIMEOUT = float(os.getenv("WEBDRIVER_CHECKOUT_TIMEOUT", "10"))
+
+
+def _kill_process_tree(proc) -> None:
+    """
+    Mata chromedriver y todo lo que lanzó. `build_chrome_driver` lo arranca en su propia sesión, así
+    Chrome y sus renderers comparten su grupo de procesos; si no es líder de grupo (p. ej. el driver
+    del fallback sin servicio propio) solo se mata el proceso, para no alcanzar al grupo del servidor.
+    """
+    if os.name != "nt":
+        try:
+            if os.getpgid(proc.pid) == proc.pid:
+                os.killpg(proc.pid, signal.SIGKILL)
+                return
+        except (ProcessLookupError, PermissionError):
+            pass
+    proc.kill()
+
+
+class WebDriverPool:
+    def __init__(self, factory: Callable[[], object], size: int = POOL_SIZE, max_uses: int = MAX_USES):
+        self._factory = factory
+        self._size = max(1, size)
+        self._max_uses = max(1, max_uses)
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()   # LIFO: reutiliza el driver más "caliente"
+        self._uses: Dict[int, int] = {}
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"created": 0, "recycled": 0, "killed": 0, "unhealthy": 0}
+
+    # ---------- ciclo de vida ----------
+
+    def _new_driver(self):
+        driver = self._factory()
+        with self._lock:
+            self._uses[id(driver)] = 0
+            self.stats["created"] += 1
+        return driver
+
+    def _discard(self, driver) -> None:
+        # Idempotente: un driver matado por timeout puede volver a descartarse desde el hilo que lo usaba
+        with self._lock:
+            if self._uses.pop(id(driver), None) is None:
+                return
+            self._created -= 1
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def warm(self, n: Optional[int] = None) -> None:
+        """Pre-crea drivers hasta `n` (por defecto el tamaño del pool)."""
+        for _ in range(min(n or self._size, self._size)):
+            with self._lock:
+                if self._created >= self._size:
+                    return
+                self._created += 1
+            try:
+                self._idle.put(self._new_driver())
+            except Exception as e:
+                with self._lock:
+                    self._created -= 1
+                logger.error(f"No se pudo pre-calentar WebDriver: {e}")
+                return
+
+    @staticmethod
+    def healthy(driver) -> bool:
+        try:
+            return driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    # ---------- checkout / checkin ----------
+
+    def checkout(self, timeout: float = CHECKOUT_TIMEOUT):
+        """Driver sano del pool; espera como máximo `timeout` segundos (en total) a que se libere uno."""
+        end = time.monotonic() + max(timeout, 0.0)
+        while True:
+            if self._closed:
+                raise RuntimeError("El pool de WebDrivers está cerrado")
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = None
+                with self._lock:
+                    can_create = self._created < self._size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        driver = self._new_driver()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                else:
+                    try:
+                        driver = self._idle.get(timeout=max(end - time.monotonic(), 0.001))
+                    except queue.Empty:
+                        raise TimeoutError("No hay WebDrivers disponibles en el pool")
+
+            if self.healthy(driver):
+                with self._lock:
+                    self._uses[id(driver)] = self._uses.get(id(driver), 0) + 1
+                return driver
+            with self._lock:
+                self.stats["unhealthy"] += 1
+            self._discard(driver)
+
+    def checkin(self, driver) -> None:
+        with self._lock:
+            uses = self._uses.get(id(driver))
+            closed = self._closed
+        if uses is None:
+            return          # ya descartado (p.ej. matado por timeout)
+        if closed:
+            self._discard(driver)
+            return
+        if uses >= self._max_uses:
+            with self._lock:
+                self.stats["recycled"] += 1
+            self._discard(driver)
+            return
+        try:
+            driver.delete_all_cookies()
+            driver.get("about:blank")
+        except Exception:
+            self._discard(driver)
+            return
+        self._idle.put(driver)
+
+    def kill(self, driver) -> None:
+        """Mata el proceso del driver sin esperar (para operaciones colgadas) y libera su cupo."""
+        with self._lock:
+            self.stats["killed"] += 1
+        try:
+            proc = driver.service.process
+            if proc and proc.poll() is None:
+                _kill_process_tree(proc)
+        except Exception as e:
+            logger.error(f"Error matando WebDriver: {e}")
+        self._discard(driver)
+
+    @contextmanager
+    def driver(self, timeout: float = CHECKOUT_TIMEOUT):
+        d = self.checkout(timeout)
+        try:
+            yield d
+        except Exception:
+            self._discard(d)
+            raise
+        else:
+            self.checkin(d)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.stats, "size": self._size, "alive": self._created, "idle": self._idle.qsize()}
@@ -0,0 +1,42 @@
+# tests/conftest.py
+"""
+Configuración común de las pruebas: corren desde `backend/` sin red ni claves reales.
+
+- Embeddings por hashing (`EMBEDDING_MODEL=hashing:384`) y base vectorial / cachés (embeddings, señales)
+  en un directorio temporal.
+- `upstream`: servidor falso de plataformas (`services/fake_upstream.py`), limpio en cada prueba.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp(prefix="alfatech-tests-")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ["EMBEDDING_MODEL"] = "hashing:384"
+os.environ["VECTOR_DIR"] = os.path.join(_tmp, "vectorstore")
+os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(_tmp, "embedding_cache.sqlite3")
+os.environ["SESSION_STORE"] = "memory"
+os.environ["SIGNAL_CACHE_PATH"] = os.path.join(_tmp, "signal_cache.sqlite3")
+os.makedirs(os.environ["VECTOR_DIR"], exist_ok=True)
+
+from services.fake_upstream import start_fake_upstream  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def _upstream_server():
+    server, _ = start_fake_upstream()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def upstream(_upstream_server):
+    server = _upstream_server
+    with server.lock:
+        server.hits.clear()
+        server.delay, server.fail_status, server.retry_after = 0.0, None, None
+    return server
@@ -0,0 +1,41 @@
+import pytest
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import main
+from services import timing
+
+
+@pytest.fixture(scope="module")
+def _stream_route():
+    async def lines():
+        for i in range(3):
+            yield f'{{"i": {i}}}\n'
+
+    main.app.add_api_route("/_test/stream", lambda: StreamingResponse(lines(), media_type="application/x-ndjson"))
+
+
+def test_lifespan_arranca_y_apaga_los_servicios(monkeypatch):
+    calls = []
+    monkeypatch.setenv("SIGNAL_REFRESH_ON_START", "true")
+    monkeypatch.setattr(main, "get_scheduler", lambda: type("S", (), {"start": lambda self: calls.append("start")})())
+    monkeypatch.setattr(main, "stop_scheduler", lambda: calls.append("stop"))
+    monkeypatch.setattr(main, "close_tiktok_pools", lambda: calls.append("close"))
+    with TestClient(main.app) as client:
+        assert client.get("/health").json() == {"status": "ok"}
+        assert calls == ["start"]
+    assert calls == ["start", "stop", "close"]
+
+
+def test_respuesta_con_content_length_lleva_server_timing():
+    response = TestClient(main.app).get("/health")
+    assert "total;dur=" in response.headers["Server-Timing"]
+    assert timing.stage_percentiles()["http:/health"]["count"] >= 1
+
+
+def test_streaming_sin_server_timing_pero_registra_la_latencia(_stream_route):
+    before = timing.stage_percentiles().get("http:/_test/stream", {}).get("count", 0)
+    response = TestClient(main.app).get("/_test/stream")
+    assert response.text.splitlines() == ['{"i": 0}', '{"i": 1}', '{"i": 2}']
+    assert "Server-Timing" not in response.headers
+    assert timing.stage_percentiles()["http:/_test/stream"]["count"] == before + 1
@@ -0,0 +1,108 @@
+import threading
+
+import pytest
+from langchain_core.messages import AIMessage, SystemMessage
+
+from services.chat_memory import TokenBudgetMemory, count_tokens, truncate_tokens
+from services.session_store import InMemorySessionStore
+
+
+class FakeSummarizer:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+        self.release = threading.Event()
+        self.release.set()
+
+    def invoke(self, messages):
+        self.calls.append(messages)
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("LLM caído")
+        return AIMessage(content=f"resumen {len(self.calls)}")
+
+
+def _memory(budget=200, **kwargs):
+    return TokenBudgetMemory(InMemorySessionStore("chat"), kwargs.pop("summarizer", FakeSummarizer()),
+                             budget=budget, **kwargs)
+
+
+def _wait_summary(memory):
+    memory._executor.shutdown(wait=True)
+
+
+def _tokens(messages):
+    return sum(count_tokens(m.content) + 4 for m in messages)
+
+
+def test_truncate_tokens():
+    text = "palabra " * 200
+    assert truncate_tokens("corto", 50) == "corto"
+    cut = truncate_tokens(text, 20)
+    assert cut.endswith("…") and count_tokens(cut) <= 21
+
+
+def test_ventana_respeta_el_presupuesto_aunque_falle_el_resumen():
+    memory = _memory(budget=200, summarizer=FakeSummarizer(fail=True))
+    for i in range(30):
+        memory.record("s", f"Pregunta número {i} sobre la empresa", f"Respuesta número {i} con cifras")
+    history = memory.history("s")
+    assert _tokens(history) <= 200
+    assert history[-1].content == "Respuesta número 29 con cifras"
+
+
+def test_desborde_se_integra_al_resumen():
+    summarizer = FakeSummarizer()
+    memory = _memory(budget=120, summarizer=summarizer)
+    for i in range(10):
+        memory.record("s", f"Pregunta {i} " + "detalle " * 5, f"Respuesta {i} " + "dato " * 5)
+    _wait_summary(memory)
+    state = memory.store.load("s")
+    assert state["summary"].startswith("resumen")
+    assert memory.stats()["summaries"] >= 1
+    history = memory.history("s")
+    assert isinstance(history[0], SystemMessage) and state["summary"] in history[0].content
+    assert _tokens(history) <= 120
+
+
+def test_un_solo_resumen_en_vuelo_por_sesion():
+    summarizer = FakeSummarizer()
+    summarizer.release.clear()
+    memory = _memory(budget=60, summarizer=summarizer)
+    for i in range(6):
+        memory.record("s", f"Pregunta {i} " + "x " * 20, f"Respuesta {i} " + "y " * 20)
+    summarizer.release.set()
+    _wait_summary(memory)
+    assert len(summarizer.calls) == 1
+
+
+def test_resumen_descartado_si_la_sesion_cambio():
+    summarizer = FakeSummarizer()
+    summarizer.release.clear()
+    memory = _memory(budget=60, summarizer=summarizer)
+    for i in range(4):
+        memory.record("s", f"Pregunta {i} " + "x " * 20, f"Respuesta {i} " + "y " * 20)
+    memory.store.delete("s")                 # la sesión se reinicia mientras se resume
+    memory.record("s", "Nueva", "Conversación")
+    summarizer.release.set()
+    _wait_summary(memory)
+    assert memory.store.load("s")["summary"] == ""
+    assert memory.stats()["summaries"] == 0
+
+
+def test_error_del_resumen_se_cuenta_y_no_pierde_mensajes():
+    memory = _memory(budget=60, summarizer=FakeSummarizer(fail=True))
+    for i in range(4):
+        memory.record("s", f"Pregunta {i} " + "x " * 20, f"Respuesta {i} " + "y " * 20)
+    _wait_summary(memory)
+    assert memory.stats()["summary_errors"] >= 1
+    assert len(memory.store.load("s")["messages"]) == 8
+
+
+@pytest.mark.parametrize("size", [50, 2000])
+def test_ultimo_turno_siempre_llega_recortado_si_hace_falta(size):
+    memory = _memory(budget=100)
+    memory.record("s", "pregunta " * size, "respuesta " * size)
+    history = memory.history("s")
+    assert len(history) == 2 and history[0].content.startswith("pregunta")
+    assert _tokens(history) <= 100
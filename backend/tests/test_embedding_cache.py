@@ -0,0 +1,60 @@
+import pytest
+
+from services import embedding_cache
+from services.embedding_cache import CachedEmbeddings
+from services.embeddings import HashingEmbeddings
+
+
+class CountingEmbeddings(HashingEmbeddings):
+    def __init__(self):
+        super().__init__(16)
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.batches.append([text])
+        return super().embed_query(text)
+
+
+@pytest.fixture
+def inner():
+    return CountingEmbeddings()
+
+
+def _cache(tmp_path, inner, model="hashing:16", **kwargs):
+    return CachedEmbeddings(inner, model, path=str(tmp_path / "emb.sqlite3"), **kwargs)
+
+
+def test_solo_embebe_los_textos_que_faltan_en_un_lote(tmp_path, inner):
+    cache = _cache(tmp_path, inner)
+    first = cache.embed_documents(["a", "b", "a"])
+    second = cache.embed_documents(["b", "c", "a"])
+    assert inner.batches == [["a", "b"], ["c"]]
+    assert second[0] == first[1] and second[2] == first[0]
+    assert cache.embed_query("c") == second[1]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (3, 3, 3)
+
+
+def test_persiste_entre_instancias_y_separa_por_modelo(tmp_path, inner):
+    _cache(tmp_path, inner).embed_documents(["a"])
+    _cache(tmp_path, inner).embed_documents(["a"])
+    assert inner.batches == [["a"]]
+    _cache(tmp_path, inner, model="otro").embed_documents(["a"])
+    assert inner.batches == [["a"], ["a"]]
+
+
+def test_desaloja_las_menos_usadas(tmp_path, inner, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "_EVICT_EVERY", 1)
+    cache = _cache(tmp_path, inner, max_entries=2)
+    cache.embed_documents(["a"])
+    cache.embed_documents(["b"])
+    cache.embed_query("a")            # "a" pasa a ser la más reciente
+    cache.embed_documents(["c"])
+    assert cache.stats()["evicted"] == 1 and cache.stats()["entries"] == 2
+    inner.batches.clear()
+    cache.embed_documents(["a", "b", "c"])
+    assert inner.batches == [["b"]]
@@ -0,0 +1,58 @@
+import importlib.util
+import math
+
+import pytest
+
+from services import knowledge_base as kb
+from services.embeddings import HashingEmbeddings, build_embeddings
+from services.flat_index import FlatVectorStore
+
+
+def test_hashing_determinista_y_normalizado():
+    emb, tag = build_embeddings("hashing:64")
+    assert isinstance(emb, HashingEmbeddings) and tag == "hashing:64"
+    a, b = emb.embed_documents(["Flujo de caja", "flujo  de CAJA"])
+    assert a == b and len(a) == 64
+    assert math.isclose(sum(v * v for v in a), 1.0, rel_tol=1e-9)
+    assert emb.embed_query("Flujo de caja") == a
+    assert emb.embed_query("") == [0.0] * 64
+
+
+@pytest.mark.parametrize("spec, tag", [
+    ("text-embedding-3-small", "text-embedding-3-small"),
+    ("openai:text-embedding-3-large", "text-embedding-3-large"),
+])
+def test_openai_conserva_la_etiqueta_anterior(spec, tag):
+    pytest.importorskip("langchain_openai")
+    assert build_embeddings(spec, "sk-test")[1] == tag
+
+
+def test_backend_no_soportado():
+    with pytest.raises(ValueError):
+        build_embeddings("cohere:embed-v3")
+
+
+@pytest.mark.skipif(importlib.util.find_spec("sentence_transformers") is not None,
+                    reason="sentence-transformers instalado")
+def test_sentence_transformers_sin_paquete_explica_que_instalar():
+    with pytest.raises(RuntimeError, match="sentence-transformers"):
+        build_embeddings("st:all-MiniLM-L6-v2")
+
+
+def test_coleccion_de_otro_modelo_se_rechaza(tmp_path):
+    store = FlatVectorStore(str(tmp_path / "flat"), HashingEmbeddings(8))
+    store.modify({"embedding_model": "text-embedding-3-small"})
+    with pytest.raises(kb.EmbeddingModelMismatch):
+        kb._check_embedding_tag("otra", store)
+
+
+def test_coleccion_sin_etiqueta_se_etiqueta(tmp_path):
+    empty = FlatVectorStore(str(tmp_path / "vacia"), HashingEmbeddings(8))
+    kb._check_embedding_tag("vacia", empty)
+    assert empty.metadata["embedding_model"] == kb.EMBEDDING_TAG
+
+    legacy = FlatVectorStore(str(tmp_path / "vieja"), HashingEmbeddings(8))
+    legacy.upsert(ids=["c0"], embeddings=[[1.0] * 8], documents=["x"], metadatas=[{}])
+    with pytest.raises(kb.EmbeddingModelMismatch):
+        kb._check_embedding_tag("vieja", legacy)        # con datos y sin etiqueta: modelo anterior
+    assert legacy.metadata["embedding_model"] == kb.LEGACY_EMBEDDING_MODEL
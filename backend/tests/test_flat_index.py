@@ -0,0 +1,101 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from services.embeddings import HashingEmbeddings
+from services.flat_index import FlatVectorStore
+
+_EMB = HashingEmbeddings(64)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FlatVectorStore(str(tmp_path / "flat"), _EMB)
+
+
+def _upsert(store, texts, prefix="c"):
+    store.upsert(
+        ids=[f"{prefix}{i}" for i in range(len(texts))],
+        embeddings=_EMB.embed_documents(texts),
+        documents=texts,
+        metadatas=[{"n": i} for i in range(len(texts))],
+    )
+
+
+def _versions(store):
+    return sorted(d for d in os.listdir(store.path) if d.isdigit())
+
+
+def test_cada_escritura_publica_una_version_y_limpia_las_viejas(store):
+    _upsert(store, ["uno", "dos"])
+    _upsert(store, ["tres"], prefix="d")
+    store.delete(["c0"])
+    with open(os.path.join(store.path, "CURRENT")) as fh:
+        assert fh.read().strip() == "00000003"
+    assert _versions(store) == ["00000002", "00000003"]
+    assert store.get()["ids"] == ["c1", "d0"]
+
+
+def test_upsert_que_solo_agrega_comparte_el_archivo_de_vectores(store):
+    _upsert(store, ["uno", "dos"])
+    _upsert(store, ["tres"], prefix="d")
+    first, second = (os.path.join(store.path, v, "vectors.f32") for v in _versions(store))
+    assert os.stat(first).st_ino == os.stat(second).st_ino
+    # la versión anterior sigue leyendo solo sus filas
+    with open(os.path.join(store.path, "00000001", "rows.json")) as fh:
+        assert json.load(fh)["shape"] == [2, 64]
+    assert store.count() == 3
+
+
+def test_actualizar_una_fila_reescribe_la_matriz(store):
+    _upsert(store, ["uno", "dos"])
+    store.upsert(ids=["c0"], embeddings=_EMB.embed_documents(["otro"]), documents=["otro"], metadatas=[{}])
+    first, second = (os.path.join(store.path, v, "vectors.f32") for v in _versions(store))
+    assert os.stat(first).st_ino != os.stat(second).st_ino
+    assert store.get(ids=["c0"])["documents"] == ["otro"]
+    assert store.similarity_search("otro", k=1)[0].page_content == "otro"
+
+
+def test_otra_instancia_ve_la_version_nueva(store):
+    other = FlatVectorStore(store.path, _EMB)
+    _upsert(store, ["uno"])
+    assert other.count() == 1
+    _upsert(store, ["dos"], prefix="d")
+    assert other.count() == 2
+    store.drop()
+    assert not FlatVectorStore.exists(store.path)
+
+
+def test_busqueda_con_filtro_y_por_lotes(store):
+    _upsert(store, ["balance general", "estado de resultados", "flujo de caja"])
+    hits = store.similarity_search_with_relevance_scores("flujo de caja", k=3, filter={"n": 0})
+    assert [d.metadata["n"] for d, _ in hits] == [0]
+    batch = store.similarity_search_batch(["balance general", "flujo de caja"], k=1)
+    assert [r[0][0].page_content for r in batch] == ["balance general", "flujo de caja"]
+    assert all(r[0][1] == pytest.approx(1.0, abs=1e-5) for r in batch)
+
+
+def test_documentos_salen_de_la_misma_instantanea_que_los_indices(store):
+    _upsert(store, ["uno", "dos", "tres"])
+    q = np.asarray([_EMB.embed_query("tres")], dtype=np.float32)
+    results, rows = store.search_vectors(q, 1)
+    # una escritura concurrente reordena las filas entre la búsqueda y la lectura de documentos
+    store.delete(["c0"])
+    assert store._documents(results[0], rows)[0][0].page_content == "tres"
+
+
+def test_formato_anterior_se_convierte_en_la_primera_escritura(tmp_path):
+    path = tmp_path / "legacy"
+    path.mkdir()
+    vectors = np.asarray(_EMB.embed_documents(["viejo"]), dtype=np.float32)
+    np.save(path / "vectors.npy", vectors)
+    (path / "rows.json").write_text(json.dumps(
+        {"ids": ["v0"], "documents": ["viejo"], "metadatas": [{}], "metadata": {}}
+    ))
+    store = FlatVectorStore(str(path), _EMB)
+    assert store.get()["ids"] == ["v0"]
+    _upsert(store, ["nuevo"], prefix="n")
+    assert store.get()["ids"] == ["v0", "n0"]
+    assert not (path / "vectors.npy").exists()
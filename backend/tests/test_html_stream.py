@@ -0,0 +1,57 @@
+import re
+
+from services.facebook_scraping import get_facebook_stats
+from services.html_stream import scan_html_stream
+
+
+class FakeResponse:
+    def __init__(self, html, content_type="text/html", encoding="ISO-8859-1"):
+        self.data = html.encode("utf-8")
+        self.headers = {"content-type": content_type}
+        self.encoding = encoding
+        self.chunks = 0
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.data), chunk_size):
+            self.chunks += 1
+            yield self.data[i:i + chunk_size]
+
+
+_PAGE = (
+    '<html><head><meta property="og:description" content="Panadería Ñandú · 1.234 Me gusta" />'
+    '<meta name="description" content="otra" /></head><body><p>5.678 seguidores</p>'
+    + "<span>relleno</span>" * 20000 + "</body></html>"
+)
+_FOLLOWERS = {"followers": re.compile(r"([\d.]+) seguidores")}
+
+
+def test_corta_la_descarga_al_encontrar_todo():
+    response = FakeResponse(_PAGE)
+    meta, found, read = scan_html_stream(response, ("og:description",), _FOLLOWERS, chunk_size=1024)
+    assert meta == {"og:description": "Panadería Ñandú · 1.234 Me gusta"}     # UTF-8 sin charset declarado
+    assert found == {"followers": "5.678"}
+    assert read < 2048 and response.chunks <= 2
+
+
+def test_coincidencia_partida_entre_chunks():
+    html = "<html><head></head><body>" + "x" * 1000 + "<p>12.345 seguidores</p></body></html>"
+    for size in (7, 64, 1013):
+        _, found, _ = scan_html_stream(FakeResponse(html), body_patterns=_FOLLOWERS, chunk_size=size)
+        assert found == {"followers": "12.345"}, size
+
+
+def test_patrones_solo_en_el_body():
+    html = '<html><head><title>999 seguidores</title></head><body><p>7 seguidores</p></body></html>'
+    _, found, _ = scan_html_stream(FakeResponse(html), body_patterns=_FOLLOWERS, chunk_size=16)
+    assert found == {"followers": "7"}
+
+
+def test_respeta_max_bytes_si_no_encuentra():
+    _, found, read = scan_html_stream(FakeResponse(_PAGE), ("og:image",), chunk_size=1024, max_bytes=4096)
+    assert found == {} and read == 4096
+
+
+def test_facebook_contra_upstream_falso(upstream, monkeypatch):
+    monkeypatch.setenv("FACEBOOK_BASE_URL", f"{upstream.base_url}/facebook")
+    result = get_facebook_stats("panaderia")
+    assert result["stats"] == {"likes": 1234, "posts": 56, "followers": 5678}
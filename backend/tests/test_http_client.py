@@ -0,0 +1,77 @@
+import time
+
+import pytest
+import requests
+
+from services import http_client
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_RETRIES", 2)
+    monkeypatch.setattr(http_client, "HTTP_BACKOFF", 0.05)
+    monkeypatch.setattr(http_client, "HTTP_RETRY_AFTER_MAX", 0.2)
+
+
+def test_reintenta_5xx_hasta_el_limite(upstream):
+    upstream.fail_status = 503
+    response = http_client.get(f"{upstream.base_url}/facebook/acme")
+    assert response.status_code == 503
+    assert upstream.hits["/facebook"] == 3            # 1 intento + HTTP_RETRIES
+
+
+def test_sin_reintentos_con_retries_cero(upstream):
+    upstream.fail_status = 503
+    http_client.get(f"{upstream.base_url}/facebook/acme", retries=0)
+    assert upstream.hits["/facebook"] == 1
+
+
+def test_no_reintenta_4xx(upstream):
+    response = http_client.get(f"{upstream.base_url}/facebook/missing-acme")
+    assert response.status_code == 404
+    assert upstream.hits["/facebook"] == 1
+
+
+def test_retry_after_acotado(upstream):
+    upstream.fail_status, upstream.retry_after = 429, "3600"
+    t0 = time.monotonic()
+    http_client.get(f"{upstream.base_url}/facebook/acme")
+    # dos esperas de como máximo HTTP_RETRY_AFTER_MAX, no de una hora
+    assert time.monotonic() - t0 < 1.5
+    assert upstream.hits["/facebook"] == 3
+
+
+def test_deadline_acota_intentos_y_esperas(upstream):
+    upstream.fail_status, upstream.delay = 503, 0.3
+    t0 = time.monotonic()
+    with pytest.raises(requests.Timeout):
+        http_client.get(f"{upstream.base_url}/facebook/acme", retries=5, deadline=time.monotonic() + 0.8)
+    assert time.monotonic() - t0 < 1.2
+
+
+def test_libera_el_cupo_del_host_durante_el_backoff(upstream, monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_BACKOFF", 0.5)
+    upstream.fail_status = 503
+    url = f"{upstream.base_url}/facebook/acme"
+    sem = http_client._host_semaphore(url)
+    free = sem._value
+    seen = []
+    real_sleep = time.sleep
+
+    def spy(seconds):
+        seen.append(sem._value)
+        real_sleep(0)
+    monkeypatch.setattr(http_client.time, "sleep", spy)
+    http_client.get(url)
+    assert seen and all(v == free for v in seen)
+    assert sem._value == free
+
+
+def test_stream_get_libera_el_cupo(upstream):
+    url = f"{upstream.base_url}/instagram/acme"
+    sem = http_client._host_semaphore(url)
+    free = sem._value
+    with http_client.stream_get(url) as response:
+        assert response.status_code == 200
+        assert sem._value == free - 1
+    assert sem._value == free
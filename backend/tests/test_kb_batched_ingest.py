@@ -0,0 +1,78 @@
+import threading
+import time
+import uuid
+
+import pytest
+from langchain_core.documents import Document
+
+from services import knowledge_base as kb
+
+
+@pytest.fixture
+def collection():
+    return f"test-{uuid.uuid4().hex[:8]}"
+
+
+class TrackingEmbeddings:
+    def __init__(self, inner, fail_on=None):
+        self.inner = inner
+        self.fail_on = fail_on
+        self.lock = threading.Lock()
+        self.active = self.peak = 0
+        self.batches = []
+
+    def embed_documents(self, texts):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.batches.append(len(texts))
+        try:
+            time.sleep(0.02)
+            if self.fail_on and any(self.fail_on in t for t in texts):
+                raise RuntimeError("API de embeddings caída")
+            return self.inner.embed_documents(texts)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def tracking(monkeypatch):
+    emb = TrackingEmbeddings(kb._embeddings)
+    monkeypatch.setattr(kb, "_embeddings", emb)
+    return emb
+
+
+def test_lotes_acotados_y_progreso(collection, tracking):
+    produced, events = [], []
+
+    def docs():
+        for i in range(10):
+            produced.append(i)
+            yield Document(page_content=f"Documento número {i}.", metadata={"source": f"d{i}.txt"})
+
+    result = kb.ingest_documents(collection, docs(), progress=lambda c: events.append((len(produced), c)),
+                                 batch_size=3, concurrency=2)
+    assert result["written"] == 10 and result["batches"] == 4 and result["ingested_docs"] == 10
+    assert tracking.batches == [3, 3, 3, 1] and tracking.peak <= 2
+    assert [c["written"] for _, c in events] == sorted(c["written"] for _, c in events)
+    # lectura perezosa: el primer lote se escribió antes de consumir todo el iterable
+    assert events[0][0] < 10
+    assert kb._get_store(collection).count() == 10
+
+
+def test_lote_sin_cambios_reporta_progreso_sin_embeber(collection, tracking):
+    texts = [f"Texto {i}." for i in range(4)]
+    kb.ingest_texts(collection, texts, sources=[f"t{i}.txt" for i in range(4)])
+    tracking.batches.clear()
+    events = []
+    result = kb.ingest_texts(collection, texts, sources=[f"t{i}.txt" for i in range(4)], progress=events.append)
+    assert tracking.batches == [] and result["skipped"] == 4 and events
+
+
+def test_error_de_embeddings_se_propaga(collection, monkeypatch):
+    monkeypatch.setattr(kb, "_embeddings", TrackingEmbeddings(kb._embeddings, fail_on="roto"))
+    docs = [Document(page_content=t, metadata={"source": f"{i}.txt"}) for i, t in enumerate(["bien", "roto"])]
+    with pytest.raises(RuntimeError):
+        kb.ingest_documents(collection, docs, batch_size=1, concurrency=1)
+    assert kb._get_store(collection).count() == 1
@@ -0,0 +1,62 @@
+import io
+import json
+import uuid
+
+import pytest
+
+from services import knowledge_base as kb
+
+
+@pytest.fixture
+def collection():
+    return f"test-{uuid.uuid4().hex[:8]}"
+
+
+def _ids(collection, **where):
+    store = kb._get_store(collection)
+    return set(store.get(where=where or None, include=[])["ids"])
+
+
+def test_reingesta_sin_cambios_no_reescribe(collection):
+    texts = ["Balance general 2023 de la empresa.", "Estado de resultados 2023."]
+    first = kb.ingest_texts(collection, texts, sources=["balance.txt", "resultados.txt"])
+    again = kb.ingest_texts(collection, texts, sources=["balance.txt", "resultados.txt"])
+    assert first["written"] == 2
+    assert again["written"] == 0 and again["skipped"] == 2 and again["deleted"] == 0
+    assert kb._get_store(collection).count() == 2
+
+
+def test_chunks_duplicados_en_un_lote_se_escriben_una_vez(collection):
+    result = kb.ingest_texts(collection, ["Mismo texto."] * 3, sources=["a.txt"] * 3)
+    assert result["written"] == 1
+    assert kb._get_store(collection).count() == 1
+
+
+def test_reingesta_de_un_origen_borra_sus_chunks_viejos(collection):
+    kb.ingest_texts(collection, ["Versión 1 del informe."], sources=["informe.txt"])
+    kb.ingest_texts(collection, ["Otro documento."], sources=["otro.txt"])
+    old = _ids(collection, source="informe.txt")
+    result = kb.ingest_texts(collection, ["Versión 2 del informe."], sources=["informe.txt"])
+    assert result["deleted"] == 1
+    assert _ids(collection, source="informe.txt").isdisjoint(old)
+    assert len(_ids(collection, source="otro.txt")) == 1
+    hits = kb.query(collection, "informe", k=5, mode="lexical")["matches"]
+    assert [m["text"] for m in hits] == ["Versión 2 del informe."]
+
+
+def test_jsonl_sin_source_no_borra_otra_carga(collection):
+    from api.routes.kb import _jsonl_documents
+
+    def upload(rows):
+        fh = io.StringIO("\n".join(json.dumps({"text": t}) for t in rows))
+        return kb.ingest_documents(collection, _jsonl_documents(fh))
+
+    upload([f"Documento A número {i}" for i in range(3)])
+    second = upload([f"Documento B número {i}" for i in range(3)])
+    assert second["deleted"] == 0
+    assert kb._get_store(collection).count() == 6
+
+
+def test_pdf_sin_nombre_toma_origen_del_contenido():
+    assert kb.content_source(b"pdf uno", "pdf") != kb.content_source(b"pdf dos", "pdf")
+    assert kb.content_source(b"pdf uno", "pdf") == kb.content_source(b"pdf uno", "pdf")
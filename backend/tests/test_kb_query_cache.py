@@ -0,0 +1,66 @@
+import uuid
+
+import pytest
+
+from services import knowledge_base as kb
+
+
+@pytest.fixture
+def collection():
+    return f"test-{uuid.uuid4().hex[:8]}"
+
+
+@pytest.fixture
+def searches(monkeypatch):
+    calls = []
+    real = kb._SEARCHERS["vector"]
+
+    def counting(collection, q, k, tenant):
+        calls.append(q)
+        return real(collection, q, k, tenant)
+
+    monkeypatch.setitem(kb._SEARCHERS, "vector", counting)
+    return calls
+
+
+def test_consulta_repetida_sale_de_la_cache(collection, searches):
+    kb.ingest_texts(collection, ["Flujo de caja operativo positivo."], sources=["flujo.txt"])
+    first = kb.search_with_scores(collection, "flujo de caja", k=2, mode="vector")
+    again = kb.search_with_scores(collection, "  Flujo   de CAJA ", k=2, mode="vector")
+    assert searches == ["flujo de caja"]
+    assert [d.page_content for d, _ in again] == [d.page_content for d, _ in first]
+    kb.search_with_scores(collection, "flujo de caja", k=3, mode="vector")
+    assert len(searches) == 2          # k distinto, otra clave
+
+
+def test_ingesta_invalida_los_resultados_de_su_coleccion(collection, searches):
+    kb.ingest_texts(collection, ["Versión 1."], sources=["a.txt"])
+    kb.search_with_scores(collection, "versión", mode="vector")
+    generation = kb.query_cache_stats()["generations"][collection]
+    kb.ingest_texts(collection, ["Versión 2."], sources=["b.txt"])
+    assert kb.query_cache_stats()["generations"][collection] > generation
+    hits = kb.search_with_scores(collection, "versión", k=5, mode="vector")
+    assert len(searches) == 2 and len(hits) == 2
+
+
+def test_ttl_vencido_vuelve_a_buscar(collection, searches, monkeypatch):
+    monkeypatch.setattr(kb, "KB_QUERY_CACHE_TTL", -1)
+    kb.ingest_texts(collection, ["Texto."], sources=["a.txt"])
+    kb.search_with_scores(collection, "texto", mode="vector")
+    kb.search_with_scores(collection, "texto", mode="vector")
+    assert len(searches) == 2
+
+
+def test_lru_acotado(collection, searches, monkeypatch):
+    monkeypatch.setattr(kb, "KB_QUERY_CACHE_SIZE", 2)
+    kb.ingest_texts(collection, ["Texto."], sources=["a.txt"])
+    for q in ("uno", "dos", "uno", "tres", "uno", "dos"):
+        kb.search_with_scores(collection, q, mode="vector")
+    # "dos" salió al entrar "tres"; "uno" se mantuvo por ser el más reciente
+    assert searches == ["uno", "dos", "tres", "dos"]
+    assert kb.query_cache_stats()["entries"] <= 2
+
+
+def test_modo_invalido():
+    with pytest.raises(ValueError):
+        kb.search_with_scores("x", "q", mode="magia")
@@ -0,0 +1,69 @@
+import uuid
+
+import pytest
+
+from services import knowledge_base as kb
+from services.lexical_index import LexicalIndex, _match_expression
+
+
+@pytest.fixture
+def collection():
+    return f"test-{uuid.uuid4().hex[:8]}"
+
+
+@pytest.fixture
+def index(tmp_path):
+    return LexicalIndex(str(tmp_path / "lexical.sqlite3"))
+
+
+def test_expresion_fts_por_frases():
+    assert _match_expression("cuenta 1.01.02") == '"cuenta" OR "1 01 02"'
+    assert _match_expression("  ¿? ") is None
+
+
+def test_bm25_ordena_y_separa_colecciones(index):
+    index.upsert("a", ["c1", "c2"], ["Activo corriente 1.01.02 caja", "Pasivo no corriente"], [{"n": 1}, {}])
+    index.upsert("b", ["c1"], ["Activo corriente 1.01.02"], [{}])
+    rows = index.search("a", "1.01.02 caja", 5)
+    assert [r[0] for r in rows] == ["c1"] and rows[0][2] == {"n": 1} and rows[0][3] > 0
+    assert index.search("a", "1.02.01", 5) == []              # la frase exige las partes contiguas
+    index.upsert("a", ["c3"], ["Línea de crédito"], [{}])
+    assert [r[0] for r in index.search("a", "credito linea", 5)] == ["c3"]     # sin tildes
+
+
+def test_upsert_reemplaza_delete_y_drop(index):
+    index.upsert("a", ["c1"], ["texto viejo"], [{}])
+    index.upsert("a", ["c1"], ["texto nuevo"], [{}])
+    assert index.count("a") == 1 and index.search("a", "viejo", 5) == []
+    index.delete("a", ["c1"])
+    assert index.count("a") == 0
+    index.upsert("a", ["c1", "c2"], ["uno", "dos"], [{}, {}])
+    index.drop("a")
+    assert index.count("a") == 0 and index.search("a", "uno", 5) == []
+
+
+def test_modos_lexical_e_hibrido(collection):
+    kb.ingest_texts(
+        collection,
+        ["Código de cuenta 1.01.02 efectivo y equivalentes.", "Ventas anuales de la empresa.", "Gastos de personal."],
+        sources=["plan.txt", "ventas.txt", "gastos.txt"],
+    )
+    lexical = kb.search_with_scores(collection, "1.01.02", k=3, mode="lexical")
+    assert [d.metadata["source"] for d, _ in lexical] == ["plan.txt"]
+    assert lexical[0][1] == 1.0                                   # relativo a la mejor coincidencia
+
+    hybrid = kb.search_with_scores(collection, "1.01.02 efectivo", k=3, mode="hybrid")
+    assert hybrid[0][0].metadata["source"] == "plan.txt"
+    assert 0.0 < hybrid[0][1] <= 1.0
+    assert len({d.metadata["source"] for d, _ in hybrid}) == len(hybrid)    # sin duplicados
+
+
+def test_coleccion_previa_al_indice_lexico_se_rellena(collection):
+    kb.ingest_texts(collection, ["Informe de auditoría externa."], sources=["auditoria.txt"])
+    scope = kb._scope(collection, None)
+    kb._lexical().drop(scope)
+    with kb._lexical_ready_lock:
+        kb._lexical_ready.discard(scope)
+    hits = kb.search_with_scores(collection, "auditoría", mode="lexical")
+    assert [d.metadata["source"] for d, _ in hits] == ["auditoria.txt"]
+    assert kb._lexical().count(scope) == 1
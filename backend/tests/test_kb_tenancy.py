@@ -0,0 +1,36 @@
+import uuid
+
+import pytest
+
+from services import knowledge_base as kb
+
+
+@pytest.fixture
+def shared():
+    name = f"shared-{uuid.uuid4().hex[:8]}"
+    kb.ingest_texts(name, ["Ventas de AlfaTech en Quito, RUC 1790012345001."], sources=["perfil.txt"], tenant="alfa")
+    kb.ingest_texts(name, ["Ventas de BetaCorp en Guayaquil, RUC 0990098765001."], sources=["perfil.txt"], tenant="beta")
+    return name
+
+
+@pytest.mark.parametrize("mode", ["vector", "lexical", "hybrid"])
+def test_busqueda_filtrada_por_empresa(shared, mode):
+    for tenant, other in (("alfa", "BetaCorp"), ("beta", "AlfaTech")):
+        matches = kb.query(shared, "ventas RUC", k=5, mode=mode, tenant=tenant)["matches"]
+        assert matches
+        assert all(m["metadata"]["company"] == tenant for m in matches)
+        assert all(other not in m["text"] for m in matches)
+
+
+def test_mismo_origen_en_dos_empresas_no_se_pisa(shared):
+    store = kb._get_store(shared)
+    assert store.count() == 2
+    # re-ingestar el origen de una empresa no toca los chunks de la otra
+    result = kb.ingest_texts(shared, ["Ventas de AlfaTech actualizadas."], sources=["perfil.txt"], tenant="alfa")
+    assert result["deleted"] == 1
+    beta = kb.query(shared, "Guayaquil", k=5, mode="lexical", tenant="beta")["matches"]
+    assert [m["text"] for m in beta] == ["Ventas de BetaCorp en Guayaquil, RUC 0990098765001."]
+
+
+def test_ids_de_chunk_distintos_por_empresa():
+    assert kb.chunk_id("perfil.txt", "texto", "alfa") != kb.chunk_id("perfil.txt", "texto", "beta")
@@ -0,0 +1,22 @@
+import time
+
+from services import scraping_service
+
+
+def test_refresco_en_segundo_plano_de_tiktok_tiene_su_propio_deadline(monkeypatch):
+    fetches, deadlines = [], []
+    monkeypatch.setattr(scraping_service, "cached_fetch",
+                        lambda platform, key, fetch, force_refresh=False: fetches.append(fetch) or {"ok": False})
+    monkeypatch.setattr(scraping_service, "fetch_tiktok_existing",
+                        lambda value, headless=True, deadline=None: deadlines.append(deadline) or {"ok": False})
+
+    scraping_service.collect_public_signals_existing(
+        None, None, None, None, "https://www.tiktok.com/@empresa", deadline=5
+    )
+    budget = min(scraping_service.PLATFORM_DEADLINES["tiktok"], 5)
+
+    # cached_fetch vuelve a llamar a la misma función al refrescar en segundo plano, más tarde
+    time.sleep(0.3)
+    before = time.monotonic()
+    fetches[0]()
+    assert deadlines[-1] >= before + budget
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+from services.serpapi_client import (
+    CircuitBreaker, CircuitOpenError, RateLimitedError, SerpApiClient, SerpApiError, TokenBucket,
+)
+
+
+def _client(upstream, **breaker):
+    return SerpApiClient(
+        f"{upstream.base_url}/serpapi/search",
+        bucket=TokenBucket(rate=1000, burst=1000),
+        breaker=CircuitBreaker(**{"window": 30, "min_calls": 5, "ratio": 0.5, "cooldown": 0.3, **breaker}),
+    )
+
+
+def test_un_request_por_busqueda_sin_reintentos(upstream):
+    upstream.fail_status = 503
+    client = _client(upstream, min_calls=100)
+    for i in range(5):
+        with pytest.raises(SerpApiError):
+            client.search({"q": f"negocio {i}"})
+    assert upstream.hits["/serpapi/search"] == 5
+    assert client.snapshot()["upstream"] == 5
+
+
+def test_breaker_se_abre_y_corta_sin_llamar_al_upstream(upstream):
+    upstream.fail_status = 503
+    client = _client(upstream)
+    for i in range(5):
+        with pytest.raises(SerpApiError):
+            client.search({"q": f"negocio {i}"})
+    assert client.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        client.search({"q": "otro"})
+    assert upstream.hits["/serpapi/search"] == 5
+    assert client.snapshot()["short_circuited"] == 1
+
+
+def test_half_open_deja_pasar_una_prueba_y_cierra(upstream):
+    upstream.fail_status = 503
+    client = _client(upstream)
+    for i in range(5):
+        with pytest.raises(SerpApiError):
+            client.search({"q": f"negocio {i}"})
+    time.sleep(0.35)
+    assert client.breaker.state == "half_open"
+    upstream.fail_status = None
+    assert client.search({"q": "prueba"})["place_results"]["title"] == "prueba"
+    assert client.breaker.state == "closed"
+
+
+def test_half_open_fallida_vuelve_a_abrir(upstream):
+    upstream.fail_status = 503
+    client = _client(upstream)
+    for i in range(5):
+        with pytest.raises(SerpApiError):
+            client.search({"q": f"negocio {i}"})
+    time.sleep(0.35)
+    with pytest.raises(SerpApiError):
+        client.search({"q": "prueba"})
+    assert client.breaker.state == "open"
+
+
+def test_consultas_identicas_concurrentes_se_unifican(upstream):
+    upstream.delay = 0.3
+    client = _client(upstream)
+    results = []
+
+    def worker(key):
+        results.append(client.search({"q": "AlfaTech", "api_key": key}))
+    threads = [threading.Thread(target=worker, args=(f"k{i}",)) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(results) == 6
+    assert upstream.hits["/serpapi/search"] == 1
+    assert client.snapshot()["coalesced"] == 5
+
+
+def test_sin_token_falla_rapido(upstream):
+    client = SerpApiClient(
+        f"{upstream.base_url}/serpapi/search", bucket=TokenBucket(rate=0.01, burst=1), breaker=CircuitBreaker()
+    )
+    client.search({"q": "uno"})
+    t0 = time.monotonic()
+    with pytest.raises(RateLimitedError):
+        client.search({"q": "dos"})
+    assert time.monotonic() - t0 < 3
+    assert upstream.hits["/serpapi/search"] == 1
@@ -0,0 +1,80 @@
+import multiprocessing
+import time
+
+import pytest
+
+from services.session_store import InMemorySessionStore, SQLiteSessionStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(namespace="chat", **kwargs):
+        if request.param == "sqlite":
+            return SQLiteSessionStore(namespace, path=str(tmp_path / "sessions.sqlite3"), **kwargs)
+        return InMemorySessionStore(namespace, **kwargs)
+    return make
+
+
+def test_guardar_cargar_borrar(make_store):
+    store = make_store()
+    store.save("s1", {"messages": ["hola"]})
+    assert store.load("s1") == {"messages": ["hola"]}
+    assert store.stats()["bytes"] == len('{"messages": ["hola"]}')
+    assert store.delete("s1") and not store.delete("s1")
+    assert store.load("s1") is None
+
+
+def test_lru_desaloja_la_usada_hace_mas_tiempo(make_store):
+    store = make_store(max_sessions=2)
+    store.save("a", {"n": 1})
+    time.sleep(0.01)
+    store.save("b", {"n": 2})
+    time.sleep(0.01)
+    store.load("a")                 # "a" pasa a ser la más reciente
+    time.sleep(0.01)
+    store.save("c", {"n": 3})
+    stats = store.stats()
+    assert stats["sessions"] == 2 and stats["evicted"] == 1
+    assert store.load("b") is None and store.load("a") == {"n": 1}
+
+
+def test_ttl_de_inactividad(make_store):
+    store = make_store(ttl=0.1)
+    store.save("a", {"n": 1})
+    time.sleep(0.2)
+    assert store.load("a") is None
+    assert store.update("a", lambda state: state) is None
+    stats = store.stats()
+    assert stats["sessions"] == 0 and stats["expired"] == 1
+
+
+def test_update_atomico_y_sin_escritura_si_devuelve_none(make_store):
+    store = make_store()
+    assert store.update("a", lambda state: None) is None
+    assert store.load("a") is None
+    store.update("a", lambda state: {"n": (state or {"n": 0})["n"] + 1})
+    store.update("a", lambda state: {"n": state["n"] + 1})
+    assert store.load("a") == {"n": 2}
+
+
+def test_espacios_de_nombres_separados(make_store):
+    chat, rag = make_store("chat"), make_store("rag")
+    chat.save("s", {"de": "chat"})
+    assert rag.load("s") is None
+
+
+def _append_many(path, n):
+    store = SQLiteSessionStore("chat", path=path)
+    for _ in range(n):
+        store.update("compartida", lambda state: {"n": (state or {"n": 0})["n"] + 1})
+
+
+def test_sqlite_update_entre_procesos_no_pierde_escrituras(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    SQLiteSessionStore("chat", path=path)          # crea el esquema antes de lanzar los procesos
+    procs = [multiprocessing.Process(target=_append_many, args=(path, 25)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(30)
+    assert SQLiteSessionStore("chat", path=path).load("compartida") == {"n": 100}
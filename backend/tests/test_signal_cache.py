@@ -0,0 +1,94 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+from services import signal_cache
+from services.signal_cache import cached_fetch, get_cache, normalize_key
+
+
+@pytest.fixture
+def key():
+    return f"empresa-{uuid.uuid4().hex[:8]}"
+
+
+class Fetcher:
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+        self.done = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        result = self.results.pop(0) if len(self.results) > 1 else self.results[0]
+        self.done.set()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def _age(platform, key, seconds):
+    # envejece la entrada moviendo fetched_at hacia atrás
+    cache = get_cache()
+    with cache._lock:
+        cache._conn.execute("UPDATE signals SET fetched_at = fetched_at - ? WHERE platform=? AND key=?",
+                            (seconds, platform, normalize_key(key)))
+        cache._conn.commit()
+
+
+def _cached_followers(platform, key):
+    entry = get_cache().get(platform, normalize_key(key))
+    return entry[0].get("followers") if entry else None
+
+
+def test_normaliza_la_clave():
+    assert normalize_key("  @Pañadería/ ") == "panaderia"
+
+
+def test_dentro_del_ttl_no_vuelve_a_scrapear(key):
+    fetch = Fetcher({"ok": True, "followers": 10})
+    first = cached_fetch("facebook", key, fetch)
+    second = cached_fetch("facebook", key.upper(), fetch)
+    assert fetch.calls == 1
+    assert first["cache"]["hit"] is False
+    assert second["cache"]["hit"] is True and second["cache"]["stale"] is False
+    assert second["followers"] == 10
+
+
+def test_vencido_sirve_el_viejo_y_refresca_en_segundo_plano(key, monkeypatch):
+    monkeypatch.setitem(signal_cache.SIGNAL_TTLS, "facebook", 60)
+    cached_fetch("facebook", key, Fetcher({"ok": True, "followers": 10}))
+    _age("facebook", key, 120)
+
+    refresh = Fetcher({"ok": True, "followers": 20})
+    stale = cached_fetch("facebook", key, refresh)
+    assert stale["followers"] == 10 and stale["cache"]["stale"] is True
+    assert refresh.done.wait(5)
+    end = time.monotonic() + 5
+    while _cached_followers("facebook", key) != 20 and time.monotonic() < end:
+        time.sleep(0.02)
+    fresh = cached_fetch("facebook", key, Fetcher({"ok": True, "followers": 30}))
+    assert fresh["followers"] == 20 and fresh["cache"]["stale"] is False
+
+
+def test_fuera_de_max_stale_scrapea_en_linea(key, monkeypatch):
+    monkeypatch.setitem(signal_cache.SIGNAL_TTLS, "facebook", 60)
+    monkeypatch.setattr(signal_cache, "SIGNAL_MAX_STALE", 600)
+    cached_fetch("facebook", key, Fetcher({"ok": True, "followers": 10}))
+    _age("facebook", key, 3600)
+    result = cached_fetch("facebook", key, Fetcher({"ok": True, "followers": 20}))
+    assert result["followers"] == 20 and result["cache"]["hit"] is False
+
+
+def test_stale_if_error_y_fallos_no_se_guardan(key, monkeypatch):
+    monkeypatch.setitem(signal_cache.SIGNAL_TTLS, "facebook", 60)
+    monkeypatch.setattr(signal_cache, "SIGNAL_MAX_STALE", 600)
+    failed = {"ok": False, "error": "bloqueado"}
+    assert cached_fetch("facebook", key, Fetcher(failed)) == failed
+    assert _cached_followers("facebook", key) is None
+
+    cached_fetch("facebook", key, Fetcher({"ok": True, "followers": 10}))
+    _age("facebook", key, 3600)
+    result = cached_fetch("facebook", key, Fetcher(failed))
+    assert result["followers"] == 10 and result["cache"]["stale"] is True
@@ -0,0 +1,71 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+from services import signal_scheduler
+from services.signal_cache import get_cache
+from services.signal_scheduler import SignalRefreshScheduler
+
+
+@pytest.fixture
+def companies():
+    cache = get_cache()
+    ids = [f"emp-{uuid.uuid4().hex[:8]}" for _ in range(6)]
+    for company_id in ids:
+        cache.add_monitored(company_id, {"business_name": company_id})
+    yield ids
+    for company_id in ids:
+        cache.remove_monitored(company_id)
+
+
+def _wait(predicate, timeout=5.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_refresca_vencidas_con_concurrencia_acotada(monkeypatch, companies):
+    lock, active, peak = threading.Lock(), [0], [0]
+
+    def collect(business_name=None, force_refresh=False, **kwargs):
+        assert force_refresh
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        if business_name == companies[0]:
+            raise RuntimeError("plataforma caída")
+        missing = ["tiktok"] if business_name == companies[1] else []
+        return {"platforms": {}, "digital_rating": 3.0, "missing_platforms": missing}
+
+    monkeypatch.setattr(signal_scheduler, "collect_public_signals_existing", collect)
+    scheduler = SignalRefreshScheduler(interval=3600, tick=3600, concurrency=2, jitter=0)
+    scheduler.start()
+    try:
+        assert _wait(lambda: scheduler.snapshot()["refreshed"] + scheduler.snapshot()["errors"] >= len(companies))
+        # todas refrescadas: el siguiente tick no encola ninguna de estas
+        assert not set(companies) & {e["company_id"] for e in get_cache().list_monitored(
+            due_before=time.time() - scheduler.interval)}
+    finally:
+        scheduler.stop()
+
+    stats = scheduler.snapshot()
+    assert stats["errors"] == 1 and stats["refreshed"] == len(companies) - 1
+    assert stats["runs"] >= 1 and not stats["running"] and stats["queued"] == 0
+    assert peak[0] <= 2
+    cache = get_cache()
+    assert cache.get_monitored(companies[0])["error"] == "plataforma caída"
+    assert cache.get_monitored(companies[1])["error"] == "sin respuesta: tiktok"
+    assert cache.get_monitored(companies[2])["result"]["digital_rating"] == 3.0
+
+
+def test_run_once_sin_iniciar_falla():
+    with pytest.raises(RuntimeError):
+        SignalRefreshScheduler().run_once()
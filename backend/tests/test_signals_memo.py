@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+from services import bulk_evaluation
+from services.bulk_evaluation import SignalsMemo
+
+_OK = {"platforms": {"facebook": {"ok": True, "followers": 10}}, "digital_rating": 1.0, "missing_platforms": []}
+
+
+@pytest.fixture
+def collect(monkeypatch):
+    calls, results = [], []
+
+    def fake(**kwargs):
+        calls.append(kwargs)
+        result = results.pop(0) if results else _OK
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(bulk_evaluation, "collect_public_signals_existing", fake)
+    return calls, results
+
+
+def test_mismo_negocio_se_recolecta_una_vez(collect):
+    calls, _ = collect
+    memo = SignalsMemo()
+    memo(business_name="Acme ", facebook="https://fb.com/acme/")
+    memo(business_name="acme", facebook="https://fb.com/acme")
+    assert len(calls) == 1 and memo.hits == 1
+
+
+def test_filas_concurrentes_esperan_la_misma_recoleccion(monkeypatch):
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    def slow(**kwargs):
+        calls.append(kwargs)
+        started.set()
+        release.wait(5)
+        return _OK
+
+    monkeypatch.setattr(bulk_evaluation, "collect_public_signals_existing", slow)
+    memo = SignalsMemo()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(memo(business_name="acme"))) for _ in range(3)]
+    threads[0].start()
+    started.wait(5)
+    for t in threads[1:]:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert len(calls) == 1 and results == [_OK] * 3
+
+
+@pytest.mark.parametrize("failed", [
+    RuntimeError("boom"),
+    {"platforms": {"facebook": {"ok": False}}, "digital_rating": None, "missing_platforms": []},
+    {"platforms": {"facebook": {"ok": True}}, "digital_rating": 1.0, "missing_platforms": ["tiktok"]},
+])
+def test_recoleccion_fallida_no_se_memoiza(collect, failed):
+    calls, results = collect
+    results.append(failed)
+    memo = SignalsMemo()
+    if isinstance(failed, Exception):
+        with pytest.raises(RuntimeError):
+            memo(business_name="acme")
+    else:
+        assert memo(business_name="acme") is failed
+    assert memo(business_name="acme") is _OK
+    assert len(calls) == 2
+
+
+def test_lru_acotado(collect):
+    calls, _ = collect
+    memo = SignalsMemo(max_entries=2)
+    for name in ("a", "b", "c", "a"):
+        memo(business_name=name)
+    assert len(calls) == 4
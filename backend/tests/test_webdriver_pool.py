@@ -0,0 +1,102 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from services.webdriver_pool import WebDriverPool
+
+
+class FakeDriver:
+    def __init__(self, process=None):
+        self.alive = True
+        self.quits = 0
+        self.service = type("Service", (), {"process": process})()
+
+    def execute_script(self, script):
+        if not self.alive:
+            raise RuntimeError("driver muerto")
+        return 1
+
+    def delete_all_cookies(self):
+        pass
+
+    def get(self, url):
+        pass
+
+    def quit(self):
+        self.quits += 1
+        self.alive = False
+
+
+def _pool(size=1, max_uses=50):
+    drivers = []
+
+    def factory():
+        drivers.append(FakeDriver())
+        return drivers[-1]
+
+    return WebDriverPool(factory, size=size, max_uses=max_uses), drivers
+
+
+def test_reutiliza_y_recicla_tras_max_usos():
+    pool, drivers = _pool(max_uses=2)
+    for _ in range(3):
+        with pool.driver():
+            pass
+    assert len(drivers) == 2 and drivers[0].quits == 1
+    assert pool.snapshot()["recycled"] == 1
+
+
+def test_checkout_espera_con_deadline_total():
+    pool, _ = _pool(size=1)
+    held = pool.checkout()
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        pool.checkout(timeout=0.2)
+    assert time.monotonic() - start < 1.0
+    pool.checkin(held)
+
+
+def test_driver_no_sano_se_reemplaza():
+    pool, drivers = _pool(size=1)
+    pool.warm()
+    drivers[0].alive = False
+    assert pool.checkout() is drivers[1]
+    assert pool.snapshot()["unhealthy"] == 1
+
+
+def test_checkin_despues_de_close_descarta_el_driver():
+    pool, drivers = _pool(size=2)
+    held = pool.checkout()
+    with pool.driver():
+        pass
+    pool.close()
+    pool.checkin(held)
+    assert all(d.quits == 1 for d in drivers)
+    assert pool.snapshot()["alive"] == 0 and pool.snapshot()["idle"] == 0
+    with pytest.raises(RuntimeError):
+        pool.checkout()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="grupos de procesos POSIX")
+def test_kill_mata_el_arbol_de_procesos():
+    # "chromedriver" que lanza un hijo ("Chrome") y se queda esperando, en su propia sesión
+    script = "import subprocess, sys, time; p = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)']); print(p.pid, flush=True); time.sleep(60)"
+    proc = subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.PIPE, start_new_session=True)
+    child = int(proc.stdout.readline())
+    pool = WebDriverPool(lambda: FakeDriver(proc), size=1)
+    driver = pool.checkout()
+    pool.kill(driver)
+    proc.wait(timeout=5)
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            os.kill(child, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail("el proceso hijo sigue vivo")
+    assert pool.snapshot()["killed"] == 1 and pool.snapshot()["alive"] == 0
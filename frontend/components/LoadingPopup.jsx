@@ -13,7 +13,7 @@ const funnyMessages = [
     "Nuestros algoritmos están discutiendo sobre ti. Parecen contentos."
 ];
 
-const LoadingPopup = () => {
+const LoadingPopup = ({ stage }) => {
     const [message, setMessage] = useState(funnyMessages[0]);
 
     useEffect(() => {
@@ -27,6 +27,7 @@ const LoadingPopup = () => {
         <div className="fixed inset-0 bg-black bg-opacity-75 flex flex-col justify-center items-center z-50">
             <div className="loader ease-linear rounded-full border-8 border-t-8 border-gray-200 h-32 w-32 mb-4"></div>
             <h2 className="text-center text-white text-xl font-semibold">Analizando...</h2>
+            {stage && <p className="text-center text-blue-300 w-1/3 mt-2">{stage}</p>}
             <p className="text-center text-white w-1/3 mt-2">{message}</p>
         </div>
     );
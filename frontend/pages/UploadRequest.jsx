@@ -1,6 +1,6 @@
 import { useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { uploadRequest } from '../services/scoringAPI';
+import { uploadRequestStream } from '../services/scoringAPI';
 import LoadingPopup from '../components/LoadingPopup';
 import { 
     FaInstagram, FaFacebook, FaTiktok, FaBuilding, FaStore, 
@@ -35,6 +35,7 @@ const UploadRequest = () => {
   const [financialFiles, setFinancialFiles] = useState([]);
   const [error, setError] = useState('');
   const [loading, setLoading] = useState(false);
+  const [progress, setProgress] = useState('');
   const navigate = useNavigate();
 
   const handleSocialLinkChange = (platform, value) => {
@@ -85,7 +86,17 @@ const UploadRequest = () => {
     formData.append('k', 3);
 
     try {
-      const response = await uploadRequest(formData);
+      const stageMessages = {
+        signals: 'Señales digitales recolectadas',
+        file_parsed: 'Documento procesado',
+        metrics: 'Métricas financieras extraídas',
+        score: 'Score calculado, redactando resumen...',
+        narrative: 'Resumen listo',
+      };
+      const response = await uploadRequestStream(formData, (event, data) => {
+        const label = stageMessages[event];
+        if (label) setProgress(event === 'file_parsed' ? `${label}: ${data.filename}` : label);
+      });
       sessionStorage.setItem('scoringResult', JSON.stringify(response));
       sessionStorage.setItem('companyName', nombreComercial);
       navigate('/dashboard');
@@ -93,12 +104,13 @@ const UploadRequest = () => {
       setError(err);
     } finally {
       setLoading(false);
+      setProgress('');
     }
   };
 
   return (
     <div className="min-h-screen bg-gray-900 flex items-center justify-center p-4">
-      {loading && <LoadingPopup />}
+      {loading && <LoadingPopup stage={progress} />}
       <div className="max-w-2xl w-full bg-gray-800 rounded-xl shadow-lg p-8">
         <div className="mb-6">
           <h1 className="text-3xl font-bold text-white mb-2">Formulario de Solicitud</h1>
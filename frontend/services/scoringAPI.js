@@ -17,6 +17,39 @@ export const uploadRequest = async (formData) => {
   }
 };
 
+// Variante streaming (NDJSON): llama a onEvent(event, data) por cada etapa completada
+// y resuelve con la respuesta final ({ decision }) igual que uploadRequest.
+export const uploadRequestStream = async (formData, onEvent = () => {}, signal) => {
+  const response = await fetch(`${API_URL}/stream`, { method: 'POST', body: formData, signal });
+  if (!response.ok || !response.body) {
+    throw new Error(`Error ${response.status} al iniciar la evaluación`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let result = null;
+
+  const handleLine = (line) => {
+    if (!line.trim()) return;
+    const { event, data } = JSON.parse(line);
+    if (event === 'error') throw new Error(data.detail);
+    if (event === 'decision') result = data;
+    onEvent(event, data);
+  };
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+    lines.forEach(handleLine);
+  }
+  handleLine(buffer);
+  return result;
+};
+
 export const getScoringResult = () => {
   return {
     riskScore: 'Medio',